@@ -0,0 +1,42 @@
+"""
+Условный GET для списков: ETag без сборки ответа.
+
+Вьюшка отдаёт в `get_list_validators()` дешёвые значения, от которых зависит ответ
+(счётчики и время изменения из базы), ETag - хэш этих значений и формата ответа.
+Если клиент прислал совпадающий If-None-Match, возвращается 304 без выборки страницы
+и без сериализаторов. Last-Modified не отдаётся: HTTP-даты с точностью до секунды,
+и изменение в ту же секунду отдало бы клиенту 304 по If-Modified-Since.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+
+class ConditionalListMixin:
+
+    def get_list_validators(self, request: Request) -> object | None:
+        """Значения для ETag или None, если этот запрос условным GET не обслуживается."""
+        return None
+
+    def list(self, request: Request, *args, **kwargs):
+        key = self.get_list_validators(request)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+
+        digest = hashlib.blake2b(repr((key, request.accepted_renderer.format)).encode(), digest_size=16)
+        etag = quote_etag(digest.hexdigest())
+
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None and not_modified.status_code == status.HTTP_304_NOT_MODIFIED:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = super().list(request, *args, **kwargs)
+
+        response['ETag'] = etag
+        # Клиент может хранить ответ, но обязан каждый раз сверяться с сервером
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
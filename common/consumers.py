@@ -1,8 +1,9 @@
 import asyncio
-import json
 import logging
+import uuid
 from typing import Generator, cast
 
+import msgpack
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.layers import get_channel_layer
@@ -10,13 +11,29 @@ from channels_redis.core import RedisChannelLayer
 from django.conf import settings
 from redis.asyncio.client import Redis
 
+from common.events import encode_event, event_bytes
+from common.json import loads
 from text_channels.models import ChannelMembership
+from text_channels.read_state import mark_read, send_read_state
+from text_channels.serializers import ChannelReadSerializer
+from text_channels.typing_indicator import SEND_LATER, SEND_NOW, flush_typing, register_typing, typing_key
 from users.models import User
 
 logger = logging.getLogger(__name__)
 
 
 class MainConsumer(AsyncWebsocketConsumer):
+    """
+    Основной вебсокет ws/main/.
+
+    По умолчанию события уходят JSON в текстовых фреймах. Клиент может запросить
+    подпротокол `msgpack` (Sec-WebSocket-Protocol: msgpack), тогда все события уходят
+    MessagePack в бинарных фреймах, а команды клиента принимаются в обоих форматах.
+    Фреймы событий кодируются в JSON один раз отправителем (common.events.encode_event),
+    обработчики пересылают их как есть, в msgpack - через общее на процесс перекодирование (event_bytes).
+    """
+    MSGPACK_SUBPROTOCOL = 'msgpack'
+    use_msgpack = False
     MAX_CONNECTIONS_PER_USER = settings.WEBSOCKET_MAX_CONNECTIONS_PER_USER
     TOO_MANY_CONNECTION_CODE = 4001
     REDIS_ERROR_CODE = 4003
@@ -24,6 +41,9 @@ class MainConsumer(AsyncWebsocketConsumer):
 
     async def connect(self):
         self._is_connection_accepted = False  # Для обработки в self.disconnect()
+        self.user_channels = {}  # uuid -> pk каналов пользователя, заполняется при подписке
+        self.typing_tasks = set()  # Отложенные события typing (text_channels.typing_indicator.flush_typing)
+        self.use_msgpack = self.MSGPACK_SUBPROTOCOL in self.scope.get("subprotocols", [])
 
         user: User = self.scope["user"]
         self.user = user
@@ -60,12 +80,89 @@ class MainConsumer(AsyncWebsocketConsumer):
 
         await self._subscribe_to_user_channels()  # добавляем пользователя в группы websocket_channel_{channel.pk}
 
-        await self.accept()
+        await self.accept(subprotocol=self.MSGPACK_SUBPROTOCOL if self.use_msgpack else None)
 
     async def disconnect(self, close_code: int):
         if not self.user.is_anonymous and self._is_connection_accepted:
             await self._decrement_connections()
             await self._unsubscribe_from_user_channels()  # удаляем пользователя из групп websocket_channel_{channel.pk}
+            for task in self.typing_tasks:
+                task.cancel()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        """
+        Команды клиента: {"type": "channel_read", "data": {"channel": uuid, "number": int}}
+        и {"type": "typing", "data": {"channel": uuid}} (см. text_channels.typing_indicator).
+        Бинарные фреймы в подпротоколе msgpack разбираются как MessagePack, остальные - как JSON.
+        """
+        try:
+            if bytes_data is not None and self.use_msgpack:
+                content = msgpack.unpackb(bytes_data)
+            else:
+                content = loads(text_data or bytes_data or b'')
+        except ValueError:
+            logger.warning(f"User {self.user.pk} sent invalid {'MessagePack' if self.use_msgpack else 'JSON'}")
+            return
+        if not isinstance(content, dict):
+            return
+
+        if content.get("type") == "channel_read":
+            await self._channel_read(content.get("data") or {})
+        elif content.get("type") == "typing":
+            await self._typing(content.get("data") or {})
+
+    async def _channel_read(self, data: dict) -> None:
+        serializer = ChannelReadSerializer(data=data)
+        try:
+            channel_uuid = uuid.UUID(str(data.get("channel")))
+        except ValueError:
+            return
+        if not serializer.is_valid():
+            return
+
+        result = await database_sync_to_async(mark_read)(
+            self.user.pk, channel_uuid, serializer.validated_data["number"],
+        )
+        if result is None:
+            return
+        channel, last_read_number = result
+        if last_read_number is not None:
+            await send_read_state(self.user.pk, channel, last_read_number)
+
+    async def _typing(self, data: dict) -> None:
+        """Набор текста: канал ищется среди подписок соединения, база не используется."""
+        channel_uuid = str(data.get("channel"))
+        channel_pk = self.user_channels.get(channel_uuid)
+        if channel_pk is None:
+            return
+
+        try:
+            redis = await self.channel_layer.connection(self.channel_layer.consistent_hash(typing_key(channel_pk)))
+            status, value = await register_typing(redis, channel_pk, self.user.pk)
+        except Exception as e:
+            logger.error(f"Failed to register typing in channel {channel_pk}: {e}")
+            return
+
+        if status == SEND_NOW:
+            await self._send_typing(channel_pk, channel_uuid, value)
+        elif status == SEND_LATER:
+            task = asyncio.create_task(self._flush_typing(redis, channel_pk, channel_uuid, value))
+            self.typing_tasks.add(task)
+            task.add_done_callback(self.typing_tasks.discard)
+
+    async def _flush_typing(self, redis: Redis, channel_pk: int, channel_uuid: str, delay_ms: int) -> None:
+        try:
+            users = await flush_typing(redis, channel_pk, delay_ms)
+            if users:
+                await self._send_typing(channel_pk, channel_uuid, users)
+        except Exception as e:
+            logger.error(f"Failed to flush typing in channel {channel_pk}: {e}")
+
+    async def _send_typing(self, channel_pk: int, channel_uuid: str, users: list[int]) -> None:
+        await self.channel_layer.group_send(
+            f"websocket_channel_{channel_pk}",
+            encode_event("typing", {"channel": channel_uuid, "users": users}),
+        )
 
     async def _subscribe_to_user_channels(self):
         """Подписывает пользователя на сообщения из его каналов."""
@@ -129,51 +226,58 @@ class MainConsumer(AsyncWebsocketConsumer):
             await self.close(code=self.REDIS_ERROR_CODE)
 
     async def _get_channel_groups(self) -> Generator[str, None, None]:
-        channel_pks = await self.get_user_channels()
-        return (f"websocket_channel_{pk}" for pk in channel_pks)
+        self.user_channels = await self.get_user_channels()
+        return (f"websocket_channel_{pk}" for pk in self.user_channels.values())
 
     @database_sync_to_async
-    def get_user_channels(self) -> tuple[int]:
-        return tuple(
-            ChannelMembership.objects.filter(user=self.user)
-            .values_list("channel__pk", flat=True)
-        )
+    def get_user_channels(self) -> dict[str, int]:
+        """uuid канала -> pk, для команд клиента без обращения к базе."""
+        return {
+            str(channel_uuid): pk for pk, channel_uuid in
+            ChannelMembership.objects.filter(user=self.user).values_list("channel__pk", "channel__uuid")
+        }
+
+    async def send_encoded(self, event: dict) -> None:
+        """Отправка готового фрейма из common.events.encode_event в формате, выбранном при подключении."""
+        if self.use_msgpack:
+            await self.send(bytes_data=event_bytes(event))
+        else:
+            await self.send(text_data=event["text"])
 
     async def chat_message(self, event: dict) -> None:
-        """Метод для отправки MessageSerializer(Message).data всем пользователям в канале этого сообщения"""
-        message_data = event["message"]
-        channel_data = event["channel"]
-        await self.send(text_data=json.dumps({
-            "type": "chat_message",
-            "data": {
-                "message": message_data,
-                "channel": channel_data,
-            },
-        }))
+        """
+        Метод для отправки MessageSerializer(Message).data всем пользователям в канале этого сообщения.
+        Пачка сообщений (MessageView.batch_create) приходит одним событием с ключом "messages".
+        """
+        await self.send_encoded(event)
+
+    async def message_updated(self, event: dict) -> None:
+        """Изменение текста сообщения: номер, версия и изменённые поля."""
+        await self.send_encoded(event)
+
+    async def message_deleted(self, event: dict) -> None:
+        """Удаление сообщения: только номер и версия."""
+        await self.send_encoded(event)
+
+    async def channel_read(self, event: dict) -> None:
+        """Изменение прочитанности канала, приходит во все соединения пользователя."""
+        await self.send_encoded(event)
+
+    async def read_state(self, event: dict) -> None:
+        """Агрегированные отметки о прочтении участников канала за интервал сброса буфера."""
+        await self.send_encoded(event)
+
+    async def typing(self, event: dict) -> None:
+        """Кто сейчас печатает в канале, не чаще раза в TYPING_EVENT_INTERVAL."""
+        await self.send_encoded(event)
 
     async def chat_unsubscribe(self, event: dict) -> None:
         """Метод для отправки user.pk всем пользователям в канале откуда вышел user"""
-        user_data = event["user"]
-        channel_data = event["channel"]
-        await self.send(text_data=json.dumps({
-            "type": "chat_unsubscribe",
-            "data": {
-                "user": user_data,
-                "channel": channel_data,
-            },
-        }))
+        await self.send_encoded(event)
 
     async def chat_subscribe(self, event: dict) -> None:
         """Метод для отправки user.pk всем пользователям в канале куда зашёл user"""
-        user_data = event["user"]
-        channel_data = event["channel"]
-        await self.send(text_data=json.dumps({
-            "type": "chat_subscribe",
-            "data": {
-                "user": user_data,
-                "channel": channel_data,
-            },
-        }))
+        await self.send_encoded(event)
 
     async def unsubscribe_channel(self, event: dict) -> None:
         """
@@ -181,17 +285,11 @@ class MainConsumer(AsyncWebsocketConsumer):
         """
         channel_pk = event["channel_pk"]
         group_name = f"websocket_channel_{channel_pk}"
+        self.user_channels.pop(event.get("channel_uuid"), None)
         try:
             await self.channel_layer.group_discard(group_name, self.channel_name)
-            # Рассылаем данные о вышедшим пользователе остальным пользователям в канале
-            await self.channel_layer.group_send(
-                group_name,
-                {
-                    "type": 'chat_unsubscribe',
-                    "user": self.user.pk,
-                    "channel": channel_pk,
-                },
-            )
+            # Рассылаем данные о вышедшем пользователе остальным пользователям в канале (фрейм готов)
+            await self.channel_layer.group_send(group_name, event["notification"])
         except Exception as e:
             logger.error(f"Failed to unsubscribe {self.user.username} from {group_name}: {e}")
 
@@ -201,16 +299,11 @@ class MainConsumer(AsyncWebsocketConsumer):
         """
         channel_pk = event["channel_pk"]
         group_name = f"websocket_channel_{channel_pk}"
+        if event.get("channel_uuid"):
+            self.user_channels[event["channel_uuid"]] = channel_pk
         try:
             await self.channel_layer.group_add(group_name, self.channel_name)
-            # Рассылаем данные о зашедшим пользователе остальным пользователям в канале
-            await self.channel_layer.group_send(
-                group_name,
-                {
-                    "type": 'chat_subscribe',
-                    "user": self.user.pk,
-                    "channel": channel_pk,
-                },
-            )
+            # Рассылаем данные о зашедшем пользователе остальным пользователям в канале (фрейм готов)
+            await self.channel_layer.group_send(group_name, event["notification"])
         except Exception as e:
             logger.error(f"Failed to subscribe {self.user.username} from {group_name}: {e}")
@@ -0,0 +1,39 @@
+"""
+События для клиентов MainConsumer, рассылаемые через channel layer.
+
+Фрейм события {"type": ..., "data": ...} кодируется в JSON-текст один раз у отправителя,
+consumer отдаёт готовую строку как есть, без сборки словаря и сериализации на каждого получателя.
+Большинство клиентов читает JSON, поэтому MessagePack (подпротокол msgpack) в событие не кладётся:
+он удвоил бы каждую рассылку в Redis и работу channels_redis на каждого получателя.
+Соединения с msgpack перекодируют текст через `event_bytes`: по `id` события результат
+запоминается в процессе, и все такие соединения процесса делят одно перекодирование.
+"""
+import uuid
+from collections import OrderedDict
+
+import msgpack
+
+from .json import dumps_text, loads
+
+# Сколько последних событий помнит event_bytes
+MSGPACK_MEMO_SIZE = 256
+_msgpack_memo: OrderedDict[str, bytes] = OrderedDict()
+
+
+def encode_event(event_type: str, data: dict) -> dict:
+    """Событие channel layer: обработчик MainConsumer с именем `event_type`, id и готовый JSON-фрейм."""
+    return {
+        "type": event_type,
+        "id": uuid.uuid4().hex,
+        "text": dumps_text({"type": event_type, "data": data}),
+    }
+
+
+def event_bytes(event: dict) -> bytes:
+    """MessagePack-фрейм события из encode_event, один на процесс для всех получателей."""
+    frame = _msgpack_memo.get(event["id"])
+    if frame is None:
+        frame = _msgpack_memo[event["id"]] = msgpack.packb(loads(event["text"]))
+        if len(_msgpack_memo) > MSGPACK_MEMO_SIZE:
+            _msgpack_memo.popitem(last=False)
+    return frame
@@ -0,0 +1,84 @@
+"""
+JSON для ответов API и вебсокета.
+
+Бэкенд выбирается настройкой JSON_BACKEND: 'orjson' (по умолчанию) или 'json'.
+Если orjson не установлен, используется стандартный json. Вывод обоих бэкендов совпадает
+с JSONRenderer DRF без отступов: компактные разделители, UTF-8 без \\u-экранирования,
+экранированные \\u2028/\\u2029, UUID и даты в том же виде, что у rest_framework.utils.encoders.JSONEncoder.
+"""
+import json
+import logging
+from functools import lru_cache
+
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.json import strict_constant
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+_SEPARATORS = (',', ':')
+
+
+def _escape_line_separators(data: bytes) -> bytes:
+    """Как JSONRenderer: \\u2028 и \\u2029 экранируются, чтобы JSON оставался подмножеством JavaScript."""
+    if b'\xe2\x80\xa8' in data or b'\xe2\x80\xa9' in data:
+        data = data.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return data
+
+
+class StdlibBackend:
+    name = 'json'
+
+    @staticmethod
+    def dumps(data) -> bytes:
+        return _escape_line_separators(
+            json.dumps(data, cls=JSONEncoder, ensure_ascii=False, allow_nan=False, separators=_SEPARATORS).encode()
+        )
+
+    @staticmethod
+    def loads(data: bytes | str):
+        return json.loads(data, parse_constant=strict_constant)
+
+
+class OrjsonBackend:
+    name = 'orjson'
+    # Типы, которых нет в orjson (Decimal, ленивые строки, QuerySet и т.п.), разбирает JSONEncoder DRF
+    _default = JSONEncoder().default
+
+    @classmethod
+    def dumps(cls, data) -> bytes:
+        return _escape_line_separators(
+            orjson.dumps(data, default=cls._default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        )
+
+    @staticmethod
+    def loads(data: bytes | str):
+        return orjson.loads(data)
+
+
+@lru_cache
+def get_backend() -> type[StdlibBackend] | type[OrjsonBackend]:
+    if settings.JSON_BACKEND == OrjsonBackend.name:
+        if orjson is not None:
+            return OrjsonBackend
+        logger.info("orjson is not installed, using the standard json module")
+    return StdlibBackend
+
+
+def dumps(data) -> bytes:
+    return get_backend().dumps(data)
+
+
+def dumps_text(data) -> str:
+    """Для AsyncWebsocketConsumer.send(text_data=...)."""
+    return get_backend().dumps(data).decode()
+
+
+def loads(data: bytes | str):
+    """Разбор JSON, ValueError при ошибке (в том числе для NaN и Infinity)."""
+    return get_backend().loads(data)
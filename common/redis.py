@@ -0,0 +1,13 @@
+from functools import lru_cache
+
+from django.conf import settings
+from redis import Redis
+
+
+@lru_cache
+def get_redis() -> Redis:
+    """
+    Синхронный клиент Redis для буферов и кэшей приложения.
+    Вызывающий код сам решает, что делать при RedisError: как правило, идти в базу.
+    """
+    return Redis.from_url(settings.REDIS_URL, socket_timeout=settings.REDIS_SOCKET_TIMEOUT)
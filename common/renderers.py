@@ -0,0 +1,17 @@
+from rest_framework.renderers import JSONRenderer
+
+from . import json
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на бэкенде common.json, вывод совпадает со стандартным до байта.
+    Ответы с отступами (`Accept: application/json; indent=4`, браузерный API) рендерит стандартный JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        return json.dumps(data)
@@ -0,0 +1,201 @@
+import time
+
+import pytest
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+
+from text_channels.models import Channel, ChannelMembership
+from text_channels.tests.factories import ChannelFactory, ChannelMembershipFactory
+from text_messages.models import Message
+from text_messages.serializers import MessageSerializer
+from text_messages.tests.factories import MessageFactory
+from users.models import User
+from users.tests.factories import UserFactory
+
+
+@pytest.fixture(autouse=True)
+def disable_message_cache(settings):
+    settings.MESSAGE_CACHE_SIZE = 0
+
+
+@pytest.fixture
+def user() -> UserFactory:
+    return UserFactory()
+
+
+@pytest.fixture
+def channel(user: UserFactory) -> Channel:
+    channel = ChannelFactory(owner=user)
+    ChannelMembershipFactory(user=user, channel=channel, is_admin=True)
+    for _ in range(3):
+        MessageFactory(channel=channel, user=user)
+    return channel
+
+
+@pytest.fixture
+def client(user: UserFactory) -> APIClient:
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+def messages_url(channel: Channel) -> str:
+    return reverse("channel-messages-list", kwargs={"channel_uuid": channel.uuid})
+
+
+def assert_etag_changes(client: APIClient, url: str, change) -> None:
+    etag = client.get(url)['ETag']
+    change()
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+
+
+@pytest.mark.django_db
+class TestMessageListConditionalGet:
+    def test_validators(self, client: APIClient, channel: Channel) -> None:
+        response = client.get(messages_url(channel))
+
+        assert response.status_code == 200
+        assert response['ETag'].startswith('"')
+        assert 'Last-Modified' not in response
+        assert 'no-cache' in response['Cache-Control']
+        assert 'private' in response['Cache-Control']
+
+    def test_not_modified_without_serializers(
+        self, client: APIClient, channel: Channel, django_assert_num_queries, monkeypatch,
+    ) -> None:
+        url = messages_url(channel)
+        etag = client.get(url)['ETag']
+
+        def fail(*args, **kwargs):
+            raise AssertionError('serializer must not run')
+        monkeypatch.setattr(MessageSerializer, 'to_representation', fail)
+        # Канал и членство, без выборки страницы
+        with django_assert_num_queries(2):
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 304
+        assert response['ETag'] == etag
+        assert not response.content
+
+    def test_message_in_same_second(self, client: APIClient, channel: Channel, user: UserFactory) -> None:
+        url = messages_url(channel)
+        client.get(url)
+        MessageFactory(channel=channel, user=user)
+
+        # HTTP-дата с точностью до секунды не отличает новое сообщение от уже полученных
+        response = client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time()))
+
+        assert response.status_code == 200
+        assert len(response.data['results']) == 4
+
+    def test_new_message(self, client: APIClient, channel: Channel, user: UserFactory) -> None:
+        assert_etag_changes(client, messages_url(channel), lambda: MessageFactory(channel=channel, user=user))
+
+    def test_edit_and_delete(self, client: APIClient, channel: Channel) -> None:
+        message = Message.objects.filter(channel=channel).order_by('number').first()
+
+        assert_etag_changes(client, messages_url(channel), lambda: message.edit('Исправлено'))
+        assert_etag_changes(client, messages_url(channel), message.soft_delete)
+
+    def test_author_profile(self, client: APIClient, channel: Channel, user: UserFactory) -> None:
+        def rename():
+            user.username = 'renamed'
+            user.save()
+
+        def rename_deferred():
+            deferred = User.objects.only('pk').get(pk=user.pk)
+            deferred.username = 'renamed again'
+            deferred.save(update_fields=['username'])
+
+        assert_etag_changes(client, messages_url(channel), rename)
+        assert_etag_changes(client, messages_url(channel), rename_deferred)
+
+    def test_save_without_profile_changes(self, client: APIClient, channel: Channel, user: UserFactory) -> None:
+        url = messages_url(channel)
+        etag = client.get(url)['ETag']
+        updated_at = Channel.objects.get(pk=channel.pk).updated_at
+
+        user.email = 'new@example.com'
+        user.save()
+        User.objects.get(pk=user.pk).save()
+
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+        assert Channel.objects.get(pk=channel.pk).updated_at == updated_at
+
+    def test_other_pages_are_not_conditional(self, client: APIClient, channel: Channel) -> None:
+        for params in ({'before_number': 2}, {'read_state': 'true'}):
+            response = client.get(messages_url(channel), params)
+            assert response.status_code == 200
+            assert 'ETag' not in response
+
+    def test_page_size_and_format_in_etag(self, client: APIClient, channel: Channel) -> None:
+        url = messages_url(channel)
+        etag = client.get(url)['ETag']
+
+        assert client.get(url, {'limit': 2})['ETag'] != etag
+        assert client.get(url, {'format': 'api'})['ETag'] != etag
+
+
+@pytest.mark.django_db
+class TestChannelListConditionalGet:
+    def test_not_modified(self, client: APIClient, channel: Channel, monkeypatch) -> None:
+        url = reverse("channels-list")
+        response = client.get(url)
+
+        def fail(*args, **kwargs):
+            raise AssertionError('serializer must not run')
+        monkeypatch.setattr('text_channels.serializers.ChannelSerializer.to_representation', fail)
+        response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        assert response.status_code == 304
+
+    def test_only_requested_page(
+        self, client: APIClient, channel: Channel, user: UserFactory, django_assert_num_queries,
+    ) -> None:
+        url = reverse("channels-list")
+        # Вступление позже - канал выше в инбоксе, channel уходит на вторую страницу
+        ChannelMembershipFactory(user=user, channel=ChannelFactory())
+        etag = client.get(url, {'limit': 1})['ETag']
+
+        ChannelMembership.objects.filter(user=user, channel=channel).update(last_read_number=1)
+        with django_assert_num_queries(1):
+            response = client.get(url, {'limit': 1}, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 304
+
+    def test_etag_per_user(self, channel: Channel, user: UserFactory) -> None:
+        other = UserFactory()
+        ChannelMembershipFactory(user=other, channel=channel)
+        etags = set()
+        for member in (user, other):
+            client = APIClient()
+            client.force_authenticate(user=member)
+            etags.add(client.get(reverse("channels-list"))['ETag'])
+
+        assert len(etags) == 2
+
+    def test_changes(self, client: APIClient, channel: Channel, user: UserFactory) -> None:
+        url = reverse("channels-list")
+        membership = ChannelMembership.objects.get(user=user, channel=channel)
+        other = UserFactory()
+
+        def rename():
+            channel.name = 'Новое имя'
+            channel.save()
+
+        def rename_member():
+            other.username = 'renamed'
+            other.save()
+
+        assert_etag_changes(client, url, lambda: MessageFactory(channel=channel, user=user))
+        assert_etag_changes(client, url, rename)
+        assert_etag_changes(client, url, lambda: ChannelMembershipFactory(user=other, channel=channel))
+        assert_etag_changes(client, url, rename_member)
+        assert_etag_changes(
+            client, url, lambda: ChannelMembership.objects.filter(pk=membership.pk).update(last_read_number=1),
+        )
+        assert_etag_changes(client, url, lambda: ChannelMembershipFactory(user=user, channel=ChannelFactory()))
+        assert_etag_changes(client, url, lambda: ChannelMembership.objects.get(user=other).delete())
@@ -0,0 +1,118 @@
+from unittest.mock import AsyncMock, patch
+
+import msgpack
+import pytest
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+
+from common.consumers import MainConsumer
+from common.events import encode_event, event_bytes
+from common.json import dumps_text, loads
+from text_channels.tests.factories import ChannelFactory, ChannelMembershipFactory
+from users.tests.factories import UserFactory
+
+
+@pytest.fixture
+def user() -> UserFactory:
+    return UserFactory()
+
+
+def communicator_for(user, subprotocols: list[str] | None = None) -> WebsocketCommunicator:
+    communicator = WebsocketCommunicator(MainConsumer.as_asgi(), "/ws/main/", subprotocols=subprotocols)
+    communicator.scope["user"] = user
+    return communicator
+
+
+CHANNEL_UUID = "7d1c3b1e-8c4e-4a44-9d55-54f6b1b6c0a1"
+DATA = {"channel": CHANNEL_UUID, "message": {"number": 3, "version": 2}}
+EVENT = encode_event("message_deleted", DATA)
+EXPECTED = {"type": "message_deleted", "data": DATA}
+
+
+@pytest.mark.django_db(transaction=True)
+class TestMainConsumerSubprotocols:
+    async def test_json_by_default(self, user) -> None:
+        communicator = communicator_for(user)
+        connected, subprotocol = await communicator.connect()
+        assert connected
+        assert subprotocol is None
+
+        await get_channel_layer().group_send(f"websocket_user_{user.pk}", EVENT)
+        frame = await communicator.receive_output()
+
+        assert loads(frame["text"]) == EXPECTED
+        assert frame.get("bytes") is None
+        await communicator.disconnect()
+
+    async def test_msgpack_subprotocol(self, user) -> None:
+        communicator = communicator_for(user, subprotocols=["msgpack"])
+        connected, subprotocol = await communicator.connect()
+        assert connected
+        assert subprotocol == "msgpack"
+
+        await get_channel_layer().group_send(f"websocket_user_{user.pk}", EVENT)
+        frame = await communicator.receive_output()
+
+        assert msgpack.unpackb(frame["bytes"]) == EXPECTED
+        assert frame.get("text") is None
+        await communicator.disconnect()
+
+    async def test_event_carries_only_json(self) -> None:
+        assert set(EVENT) == {"type", "id", "text"}
+        assert event_bytes(EVENT) is event_bytes(dict(EVENT))
+        assert msgpack.unpackb(event_bytes(EVENT)) == EXPECTED
+
+    async def test_subscribe_channel_forwards_encoded_notification(self, user) -> None:
+        communicator = communicator_for(user, subprotocols=["msgpack"])
+        await communicator.connect()
+        notification = encode_event("chat_subscribe", {"user": user.pk, "channel": 10 ** 9})
+
+        await get_channel_layer().group_send(f"websocket_user_{user.pk}", {
+            "type": "subscribe_channel",
+            "channel_pk": 10 ** 9,
+            "channel_uuid": CHANNEL_UUID,
+            "notification": notification,
+        })
+        frame = await communicator.receive_output()
+
+        assert frame["bytes"] == event_bytes(notification)
+        await communicator.disconnect()
+
+    async def test_typing(self, user) -> None:
+        other = await database_sync_to_async(UserFactory)()
+        channel = await database_sync_to_async(ChannelFactory)()
+        for member in (user, other):
+            await database_sync_to_async(ChannelMembershipFactory)(user=member, channel=channel)
+        typist, reader = communicator_for(user), communicator_for(other)
+        await typist.connect()
+        await reader.connect()
+        command = dumps_text({"type": "typing", "data": {"channel": str(channel.uuid)}})
+
+        await typist.send_to(text_data=command)
+        frame = await reader.receive_output()
+        assert loads(frame["text"]) == {"type": "typing", "data": {"channel": str(channel.uuid), "users": [user.pk]}}
+        await typist.receive_output()
+        # Повтор в пределах TYPING_THROTTLE_INTERVAL и чужой канал событий не порождают
+        await typist.send_to(text_data=command)
+        await typist.send_to(text_data=dumps_text({"type": "typing", "data": {"channel": CHANNEL_UUID}}))
+        assert await reader.receive_nothing()
+
+        await typist.disconnect()
+        await reader.disconnect()
+
+
+class TestMainConsumerCommands:
+    @pytest.mark.parametrize("use_msgpack", [False, True])
+    async def test_channel_read_command(self, use_msgpack: bool) -> None:
+        consumer = MainConsumer()
+        consumer.use_msgpack = use_msgpack
+        command = {"type": "channel_read", "data": {"channel": CHANNEL_UUID, "number": 1}}
+
+        with patch.object(consumer, "_channel_read", AsyncMock()) as channel_read:
+            if use_msgpack:
+                await consumer.receive(bytes_data=msgpack.packb(command))
+            else:
+                await consumer.receive(text_data=dumps_text(command))
+
+        channel_read.assert_awaited_once_with(command["data"])
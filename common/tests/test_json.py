@@ -0,0 +1,99 @@
+import datetime
+import io
+import uuid
+from decimal import Decimal
+from unittest.mock import AsyncMock, patch
+from zoneinfo import ZoneInfo
+
+import pytest
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from common import json
+from common.consumers import MainConsumer
+from common.events import encode_event
+from common.parsers import FastJSONParser
+from common.renderers import FastJSONRenderer
+from text_channels.tests.factories import ChannelFactory, ChannelMembershipFactory
+from text_messages.tests.factories import MessageFactory
+from users.tests.factories import UserFactory
+
+DATA = {
+    'uuid': uuid.UUID('7d1c3b1e-8c4e-4a44-9d55-54f6b1b6c0a1'),
+    'utc': datetime.datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+    'zoneinfo_utc': datetime.datetime(2025, 1, 2, 3, 4, 5, tzinfo=ZoneInfo('UTC')),
+    'moscow': datetime.datetime(2025, 1, 2, 3, 4, 5, tzinfo=ZoneInfo('Europe/Moscow')),
+    'naive': datetime.datetime(2025, 1, 2, 3, 4, 5),
+    'date': datetime.date(2025, 1, 2),
+    'decimal': Decimal('1.50'),
+    'lazy': gettext_lazy('Пользователь'),
+    'text': 'Привет, "мир" \\ \u2028\u2029 </script>',
+    'numbers': [0, -1, 2 ** 53, 1.5, True, None],
+    1: 'ключ-число',
+}
+
+
+@pytest.fixture(params=[json.StdlibBackend, json.OrjsonBackend])
+def backend(request, settings):
+    settings.JSON_BACKEND = request.param.name
+    json.get_backend.cache_clear()
+    yield request.param
+    json.get_backend.cache_clear()
+
+
+class TestJSONBackends:
+    def test_output_matches_drf_renderer(self, backend) -> None:
+        assert json.get_backend() is backend
+        assert json.dumps(DATA) == JSONRenderer().render(DATA)
+
+    def test_loads(self, backend) -> None:
+        assert json.loads(b'{"a": [1, "\\u0431"]}') == {'a': [1, 'б']}
+        with pytest.raises(ValueError):
+            json.loads('{"a": NaN}')
+
+    def test_falls_back_to_stdlib_without_orjson(self, settings) -> None:
+        settings.JSON_BACKEND = 'orjson'
+        json.get_backend.cache_clear()
+        try:
+            with patch('common.json.orjson', None):
+                assert json.get_backend() is json.StdlibBackend
+        finally:
+            json.get_backend.cache_clear()
+
+    def test_renderer_keeps_indent(self) -> None:
+        rendered = FastJSONRenderer().render({'a': 1}, 'application/json; indent=2')
+
+        assert rendered == JSONRenderer().render({'a': 1}, 'application/json; indent=2')
+
+    def test_parser_errors(self, backend) -> None:
+        parser = FastJSONParser()
+        with pytest.raises(ParseError):
+            parser.parse(io.BytesIO(b'{"a": '))
+        assert parser.parse(io.BytesIO('{"a": "б"}'.encode())) == {'a': 'б'}
+
+    async def test_consumer_sends_compact_json(self, backend) -> None:
+        consumer = MainConsumer()
+        consumer.send = AsyncMock()
+
+        await consumer.message_deleted(encode_event('message_deleted', {'channel': 'c', 'message': {'number': 1, 'version': 2}}))
+
+        text = consumer.send.await_args.kwargs['text_data']
+        assert text == '{"type":"message_deleted","data":{"channel":"c","message":{"number":1,"version":2}}}'
+
+
+@pytest.mark.django_db
+def test_api_response_matches_drf_renderer(backend, settings) -> None:
+    settings.MESSAGE_CACHE_SIZE = 0
+    user = UserFactory()
+    channel = ChannelFactory()
+    ChannelMembershipFactory(user=user, channel=channel)
+    MessageFactory.create_batch(3, channel=channel, user=user)
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    response = client.get(reverse("channel-messages-list", kwargs={"channel_uuid": channel.uuid}))
+
+    assert response.content == JSONRenderer().render(response.data)
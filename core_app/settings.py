@@ -39,7 +39,8 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'django.contrib.sites'
+    'django.contrib.sites',
+    'django.contrib.postgres',
 ]
 
 THIRD_PARTY_APPS = [
@@ -212,6 +213,15 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'common.pagination.DefaultPagination',
     'PAGE_SIZE': 20,
+    'DEFAULT_RENDERER_CLASSES': [
+        'common.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'common.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', "redis://redis:6379/0")
@@ -285,3 +295,59 @@ SOCIAL_AUTH_PIPELINE = (
 CHANNEL_LAST_MESSAGE_MAX_LENGTH = int(os.getenv('CHANNEL_LAST_MESSAGE_MAX_LENGTH', 25))
 WEBSOCKET_MAX_CONNECTIONS_PER_USER = int(os.getenv('WEBSOCKET_MAX_CONNECTIONS_PER_USER', 3))
 WEBSOCKET_LIVE_TIME = 60 * 60 * 24
+MESSAGE_NUMBER_ALLOCATOR = os.getenv('MESSAGE_NUMBER_ALLOCATOR', 'text_messages.allocators.ChannelCounterAllocator')
+MESSAGE_BATCH_MAX_SIZE = int(os.getenv('MESSAGE_BATCH_MAX_SIZE', 100))
+MESSAGE_PARTITION_SIZE = int(os.getenv('MESSAGE_PARTITION_SIZE', 1000))
+MESSAGE_PARTITIONS_AHEAD = int(os.getenv('MESSAGE_PARTITIONS_AHEAD', 2))
+MESSAGE_ARCHIVE_KEEP_RECENT = int(os.getenv('MESSAGE_ARCHIVE_KEEP_RECENT', 1000))
+MESSAGE_ARCHIVE_SEGMENT_SIZE = int(os.getenv('MESSAGE_ARCHIVE_SEGMENT_SIZE', 200))
+MESSAGE_ARCHIVE_INTERVAL = int(os.getenv('MESSAGE_ARCHIVE_INTERVAL', 60 * 60))
+MESSAGE_COMPACTION_BATCH_SIZE = int(os.getenv('MESSAGE_COMPACTION_BATCH_SIZE', 1000))
+MESSAGE_COMPACTION_INTERVAL = int(os.getenv('MESSAGE_COMPACTION_INTERVAL', 10 * 60))
+CELERY_BEAT_SCHEDULE = {
+    'archive-old-messages': {
+        'task': 'text_messages.tasks.archive_old_messages',
+        'schedule': MESSAGE_ARCHIVE_INTERVAL,
+    },
+    'compact-deleted-messages': {
+        'task': 'text_messages.tasks.compact_deleted_messages',
+        'schedule': MESSAGE_COMPACTION_INTERVAL,
+    },
+}
+MESSAGE_CATCH_UP_LIMIT = int(os.getenv('MESSAGE_CATCH_UP_LIMIT', 50))
+MESSAGE_CATCH_UP_MAX_CHANNELS = int(os.getenv('MESSAGE_CATCH_UP_MAX_CHANNELS', 100))
+# Отдельная база Redis для буферов и кэшей приложения (не channel layer и не брокер Celery)
+REDIS_URL = os.getenv(
+    'REDIS_URL',
+    f"redis://{os.getenv('REDIS_HOST', '127.0.0.1').removeprefix('redis://')}:{os.getenv('REDIS_PORT', '6379')}/1",
+)
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', 1))
+READ_RECEIPTS_FLUSH_INTERVAL = float(os.getenv('READ_RECEIPTS_FLUSH_INTERVAL', 2))
+READ_RECEIPTS_MAX_MEMBERS = int(os.getenv('READ_RECEIPTS_MAX_MEMBERS', 50))
+READ_RECEIPTS_TTL = int(os.getenv('READ_RECEIPTS_TTL', 60 * 60 * 24))
+CELERY_BEAT_SCHEDULE['flush-read-receipts'] = {
+    'task': 'text_channels.tasks.flush_read_receipts',
+    'schedule': READ_RECEIPTS_FLUSH_INTERVAL,
+}
+# Кэш последних сообщений канала в Redis (text_messages.cache), 0 - выключен
+MESSAGE_CACHE_SIZE = int(os.getenv('MESSAGE_CACHE_SIZE', 100))
+MESSAGE_CACHE_TTL = int(os.getenv('MESSAGE_CACHE_TTL', 60 * 60))
+# Быстрое to_representation в common.serializers.FastModelSerializer, 0 - стандартный путь DRF
+FAST_SERIALIZERS = os.getenv('FAST_SERIALIZERS', '1') != '0'
+# Бэкенд common.json для ответов API и вебсокета: orjson или json (стандартная библиотека)
+JSON_BACKEND = os.getenv('JSON_BACKEND', 'orjson')
+# Индикатор набора текста (text_channels.typing_indicator), секунды
+TYPING_THROTTLE_INTERVAL = float(os.getenv('TYPING_THROTTLE_INTERVAL', 2))
+TYPING_EVENT_INTERVAL = float(os.getenv('TYPING_EVENT_INTERVAL', 1))
+TYPING_TTL = float(os.getenv('TYPING_TTL', 6))
+# Сколько участников отдаёт ChannelSerializer.users (превью), всего их - users_count, 0 - не отдавать.
+# Полный список - api/channels/<uuid>/members/
+CHANNEL_MEMBERS_PREVIEW_SIZE = int(os.getenv('CHANNEL_MEMBERS_PREVIEW_SIZE', 5))
+# Точность порядка инбокса и период сброса активности (text_channels.inbox), секунды
+INBOX_ACTIVITY_RESOLUTION = float(os.getenv('INBOX_ACTIVITY_RESOLUTION', 1))
+CELERY_BEAT_SCHEDULE['flush-inbox-activity'] = {
+    'task': 'text_channels.tasks.flush_inbox_activity',
+    'schedule': INBOX_ACTIVITY_RESOLUTION,
+}
+# Кэш фрагментов ChannelSerializer для списка каналов (text_channels.payload_cache), секунды, 0 - выключен
+CHANNEL_PAYLOAD_CACHE_TTL = int(os.getenv('CHANNEL_PAYLOAD_CACHE_TTL', 10 * 60))
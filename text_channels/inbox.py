@@ -0,0 +1,95 @@
+"""
+Инбокс пользователя: его каналы от последней активности к старой.
+
+Проекция живёт прямо в ChannelMembership: (user, channel, last_activity_at, last_read_number),
+последний номер и непрочитанные берутся из Channel.last_message_number. Строка появляется
+при вступлении в канал (создание канала, приглашение) с last_activity_at = время вступления
+и исчезает при выходе, бане и каскадом при удалении канала, поэтому инбокс не расходится
+с составом каналов. api/channels/ листает её курсором по индексу (user, -last_activity_at).
+
+Новое сообщение после коммита только записывает время в Redis-хэш `inbox:activity`
+(канал -> самое позднее время, `touch_channel_on_commit`): запрос не ждёт UPDATE всех членств канала,
+а сколько бы сообщений ни пришло, на канал остаётся одна запись. Периодическая задача
+`flush_inbox_activity` раз в INBOX_ACTIVITY_RESOLUTION секунд забирает хэш и сдвигает членства
+(`touch_channel`) вне блокировок создания сообщения - выход и бан блокируют строку канала
+раньше строк членств (ChannelMembership.delete).
+Если Redis недоступен, активность сдвигается сразу тем же UPDATE.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import transaction
+from redis.exceptions import RedisError
+
+from common.redis import get_redis
+
+from .models import ChannelMembership
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_KEY = 'inbox:activity'
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# KEYS: хэш активности. ARGV: id канала, время (мкс). Время канала только растёт
+SCHEDULE_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if not current or tonumber(ARGV[2]) > tonumber(current) then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+end
+"""
+
+# KEYS: хэш активности. Возвращает [id канала, время, ...] и очищает хэш
+POP_SCRIPT = """
+local result = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return result
+"""
+
+
+def _to_microseconds(at: datetime) -> int:
+    return (at - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_microseconds(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def touch_channel(channel_id: int, at: datetime) -> int:
+    """
+    Новое сообщение канала: сдвигает last_activity_at всех участников одним UPDATE.
+    Строки, сдвинутые меньше INBOX_ACTIVITY_RESOLUTION секунд назад, не переписываются -
+    в активном канале это одна запись участника за интервал, а не за каждое сообщение.
+    """
+    return ChannelMembership.objects.filter(
+        channel_id=channel_id,
+        last_activity_at__lt=at - timedelta(seconds=settings.INBOX_ACTIVITY_RESOLUTION),
+    ).update(last_activity_at=at)
+
+
+def schedule_touch(channel_id: int, at: datetime) -> None:
+    """Откладывает `touch_channel` до ближайшего `flush_inbox_activity`."""
+    try:
+        get_redis().eval(SCHEDULE_SCRIPT, 1, ACTIVITY_KEY, channel_id, _to_microseconds(at))
+    except RedisError as e:
+        logger.warning(f"Inbox activity buffer is unavailable, writing to database: {e!r}")
+        touch_channel(channel_id, at)
+
+
+def touch_channel_on_commit(channel_id: int, at: datetime) -> None:
+    """`schedule_touch` после коммита текущей транзакции."""
+    transaction.on_commit(lambda: schedule_touch(channel_id, at))
+
+
+def pop_scheduled_touches() -> dict[int, datetime]:
+    """Забирает отложенную активность: {channel_pk: время последнего сообщения}."""
+    flat = get_redis().eval(POP_SCRIPT, 1, ACTIVITY_KEY)
+    return {int(channel_id): _from_microseconds(int(at)) for channel_id, at in zip(flat[::2], flat[1::2])}
+
+
+def restore_scheduled_touches(touches: dict[int, datetime]) -> None:
+    """Возвращает активность в очередь, если сдвинуть членства не удалось."""
+    with get_redis().pipeline() as pipe:
+        for channel_id, at in touches.items():
+            pipe.eval(SCHEDULE_SCRIPT, 1, ACTIVITY_KEY, channel_id, _to_microseconds(at))
+        pipe.execute()
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from text_channels import payload_cache
+
+
+class Command(BaseCommand):
+    help = 'Попадания и промахи кэша фрагментов списка каналов (text_channels.payload_cache)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить счётчики после вывода'
+        )
+
+    def handle(self, *args, **kwargs):
+        stats = payload_cache.get_stats()
+        hits, misses = stats.get('hits', 0), stats.get('misses', 0)
+        total = hits + misses
+        ratio = f'{hits / total:.1%}' if total else '-'
+        self.stdout.write(f'Попаданий: {hits}, промахов: {misses}, доля попаданий: {ratio}')
+        if kwargs['reset']:
+            payload_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Счётчики обнулены'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from text_channels.models import reconcile_member_counts
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает Channel.member_count по таблице членств'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'channel_ids',
+            nargs='*',
+            type=int,
+            help='id каналов, по умолчанию все'
+        )
+
+    def handle(self, *args, **kwargs):
+        fixed = reconcile_member_counts(kwargs['channel_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Исправлено каналов: {fixed}'))
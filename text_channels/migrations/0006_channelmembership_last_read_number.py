@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:15
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def mark_history_read(apps, schema_editor):
+    """Существующая история считается прочитанной, чтобы у всех не появились огромные счётчики."""
+    Channel = apps.get_model('text_channels', 'Channel')
+    ChannelMembership = apps.get_model('text_channels', 'ChannelMembership')
+    ChannelMembership.objects.update(
+        last_read_number=Subquery(
+            Channel.objects.filter(pk=OuterRef('channel_id')).values('last_message_number')[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('text_channels', '0005_channel_last_message_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channelmembership',
+            name='last_read_number',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(mark_history_read, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('text_channels', '0006_channelmembership_last_read_number'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='channelmembership',
+            index=models.Index(fields=['channel', 'user'], name='text_channe_channel_2c5bfe_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:38
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_members(apps, schema_editor):
+    Channel = apps.get_model('text_channels', 'Channel')
+    ChannelMembership = apps.get_model('text_channels', 'ChannelMembership')
+    Channel.objects.update(
+        member_count=Coalesce(Subquery(
+            ChannelMembership.objects.filter(channel=OuterRef('pk')).order_by().values('channel')
+            .annotate(value=Count('pk')).values('value')
+        ), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('text_channels', '0007_channelmembership_channel_user_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_members, migrations.RunPython.noop),
+    ]
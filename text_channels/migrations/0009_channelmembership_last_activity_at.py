@@ -0,0 +1,41 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:43
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import DateTimeField, F, OuterRef, Subquery
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast, Coalesce, Greatest, Now
+
+
+def backfill_last_activity(apps, schema_editor):
+    """Время последнего сообщения канала из снимка, для каналов без сообщений - время вступления."""
+    Channel = apps.get_model('text_channels', 'Channel')
+    ChannelMembership = apps.get_model('text_channels', 'ChannelMembership')
+    last_message_at = Channel.objects.filter(pk=OuterRef('channel_id')).annotate(
+        value=Cast(KeyTextTransform('created_at', 'last_message_snapshot'), DateTimeField()),
+    ).values('value')[:1]
+    ChannelMembership.objects.update(
+        last_activity_at=Coalesce(Greatest(F('created_at'), Subquery(last_message_at)), Now()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('text_channels', '0008_channel_member_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channelmembership',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunPython(backfill_last_activity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='channelmembership',
+            index=models.Index(fields=['user', '-last_activity_at'], name='text_channe_user_id_9313d8_idx'),
+        ),
+    ]
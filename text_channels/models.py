@@ -1,6 +1,9 @@
 import uuid
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 from common.models import Timestamped
 from users.models import User
@@ -11,6 +14,21 @@ class Channel(Timestamped):
     owner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=False, related_name='user_channels')
     last_message_number = models.PositiveIntegerField(default=0, editable=False)
     name = models.CharField(max_length=255)
+    # Снимок последнего сообщения для списка каналов, поддерживается text_messages.snapshots
+    last_message_author = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+    )
+    last_message_snapshot = models.JSONField(null=True, blank=True, editable=False)
+    # Количество участников, поддерживается ChannelMembership.save()/delete(), дрейф чинит reconcile_member_counts
+    member_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Поля, которые обновляются отдельными UPDATE и не должны перезаписываться при save() канала
+    DENORMALIZED_FIELDS = ('last_message_number', 'last_message_author', 'last_message_snapshot', 'member_count')
 
     class Meta:
         verbose_name = "Канал"
@@ -22,12 +40,29 @@ class Channel(Timestamped):
     def __str__(self):
         return f"<Channel {self.pk}>"
 
+    def save(self, *args, **kwargs):
+        from .payload_cache import bump_version
+
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DENORMALIZED_FIELDS
+            ]
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if not adding:
+            bump_version(self.pk)
+
 
 class ChannelMembership(Timestamped):
     uuid = models.UUIDField(default=uuid.uuid4, unique=True, db_index=True, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='channels')
     channel = models.ForeignKey(Channel, on_delete=models.CASCADE, related_name='memberships')
     is_admin = models.BooleanField(default=False, verbose_name="Администратор")
+    # Сколько сообщений канала прочитано: непрочитанные = Channel.last_message_number - last_read_number
+    last_read_number = models.PositiveIntegerField(default=0, editable=False)
+    # Инбокс пользователя: время последнего сообщения канала (или вступления), см. text_channels.inbox
+    last_activity_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         verbose_name = "Членство в канале"
@@ -37,11 +72,85 @@ class ChannelMembership(Timestamped):
         )
         indexes = [
             models.Index(fields=["user", "channel"]),
+            # Участники канала по порядку user_id: пагинация api/channels/<uuid>/members/
+            models.Index(fields=["channel", "user"]),
+            # Каналы пользователя от самых активных: курсор api/channels/
+            models.Index(fields=["user", "-last_activity_at"]),
         ]
 
     def __str__(self):
         return f"{self.user} в {self.channel} (admin: {self.is_admin})"
 
+    def save(self, *args, **kwargs):
+        from .payload_cache import bump_version
+
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Channel.objects.filter(pk=self.channel_id).update(
+                member_count=F('member_count') + 1,
+                updated_at=timezone.now(),
+            )
+            bump_version(self.channel_id)
+        self._shift_cached_member_count(1)
+
+    def delete(self, *args, **kwargs):
+        from .payload_cache import bump_version
+
+        with transaction.atomic():
+            # Сначала строка канала, потом членство - в том же порядке, что и при создании сообщения
+            Channel.objects.select_for_update().filter(pk=self.channel_id).values_list('pk').first()
+            result = super().delete(*args, **kwargs)
+            Channel.objects.filter(pk=self.channel_id, member_count__gt=0).update(
+                member_count=F('member_count') - 1,
+                updated_at=timezone.now(),
+            )
+            bump_version(self.channel_id)
+        self._shift_cached_member_count(-1)
+        return result
+
+    def _shift_cached_member_count(self, delta: int) -> None:
+        """Загруженный канал видит новый счётчик без refresh_from_db (ответ ChannelConnectView)."""
+        if ChannelMembership.channel.is_cached(self):
+            self.channel.member_count = max(self.channel.member_count + delta, 0)
+
+
+def reconcile_member_counts(channel_ids=None) -> int:
+    """Пересчитывает Channel.member_count по таблице членств. Возвращает количество исправленных каналов."""
+    channels = Channel.objects.all()
+    if channel_ids is not None:
+        channels = channels.filter(pk__in=channel_ids)
+    actual = Coalesce(Subquery(
+        ChannelMembership.objects.filter(channel=OuterRef('pk')).order_by().values('channel')
+        .annotate(value=Count('pk')).values('value')
+    ), 0)
+    return channels.annotate(actual=actual).exclude(member_count=F('actual')).update(member_count=actual)
+
+
+def touch_user_channels(user_id: int) -> None:
+    """
+    Профиль пользователя (поля UserSerializer) изменился. Каналы, где он участник, владелец или автор
+    последнего сообщения, получают новое updated_at (валидатор условного GET истории и списка каналов),
+    новую версию фрагмента text_channels.payload_cache и пустой кэш новой страницы истории text_messages.cache.
+    Каналы, из которых автор уже вышел, не трогаются: его старый профиль в их истории остаётся до следующей
+    правки или удаления сообщения в канале.
+    """
+    from text_messages import cache as message_cache
+
+    from .payload_cache import bump_version
+
+    channels = list(Channel.objects.filter(
+        Q(memberships__user_id=user_id) | Q(owner_id=user_id) | Q(last_message_author_id=user_id),
+    ).distinct().only('pk', 'uuid'))
+    if not channels:
+        return
+    with transaction.atomic():
+        Channel.objects.filter(pk__in=[channel.pk for channel in channels]).update(updated_at=timezone.now())
+        for channel in channels:
+            bump_version(channel.pk)
+        transaction.on_commit(lambda: message_cache.drop_channels(channels))
+
 
 class ChannelBan(Timestamped):
     uuid = models.UUIDField(default=uuid.uuid4, unique=True, db_index=True, editable=False)
@@ -0,0 +1,24 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class ChannelMemberPagination(CursorPagination):
+    """
+    Курсорная пагинация участников канала по user_id, идёт по индексу (channel, user)
+    без OFFSET и COUNT(*) - число участников отдаёт ChannelSerializer.users_count.
+    """
+    ordering = 'user_id'
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class ChannelInboxPagination(CursorPagination):
+    """
+    Каналы пользователя от последней активности (text_channels.inbox), курсор по
+    ChannelMembership.last_activity_at - индекс (user, -last_activity_at), без OFFSET и COUNT(*).
+    """
+    ordering = ('-last_activity_at', '-id')
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+    page_size_query_param = 'limit'
+    max_page_size = 100
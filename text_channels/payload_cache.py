@@ -0,0 +1,138 @@
+"""
+Кэш отрендеренных фрагментов ChannelSerializer для списка каналов.
+
+Фрагмент - представление канала без полей конкретного пользователя (ChannelSerializer.per_user_fields),
+одинаковое для всех участников: владелец, превью участников, последнее сообщение, номер.
+Лежит в `channel_payload:<channel_pk>:<version>` с TTL CHANNEL_PAYLOAD_CACHE_TTL.
+Версия `channel_payload:<channel_pk>:version` растёт после коммита при создании, правке и удалении
+сообщения, вступлении, выходе и бане участника, переименовании канала - старые фрагменты
+просто перестают читаться и истекают сами. Счётчик версии без TTL, чтобы не начать заново
+с номера, под которым ещё лежит старый фрагмент.
+
+Попадания и промахи копятся в хэше `channel_payload:stats` (команда channel_payload_stats).
+При недоступном Redis кэш просто не используется.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from redis.exceptions import RedisError
+
+from common.json import dumps, loads
+from common.redis import get_redis
+
+from .models import Channel
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = 'channel_payload:stats'
+
+# KEYS: статистика, счётчики версий каналов. ARGV: id каналов в том же порядке
+# Возвращает [версия, фрагмент или nil, ...]
+GET_SCRIPT = """
+local result = {}
+local hits = 0
+for i = 2, #KEYS do
+    local version = redis.call('GET', KEYS[i]) or '0'
+    local fragment = redis.call('GET', 'channel_payload:' .. ARGV[i - 1] .. ':' .. version)
+    if fragment then
+        hits = hits + 1
+    end
+    table.insert(result, version)
+    table.insert(result, fragment)
+end
+redis.call('HINCRBY', KEYS[1], 'hits', hits)
+redis.call('HINCRBY', KEYS[1], 'misses', #KEYS - 1 - hits)
+return result
+"""
+
+
+def _version_key(channel_id: int) -> str:
+    return f'channel_payload:{channel_id}:version'
+
+
+def _fragment_key(channel_id: int, version: str) -> str:
+    return f'channel_payload:{channel_id}:{version}'
+
+
+def is_enabled() -> bool:
+    return settings.CHANNEL_PAYLOAD_CACHE_TTL > 0
+
+
+def get_fragments(channels: list[Channel]) -> tuple[dict[int, dict], dict[int, str]]:
+    """
+    Закэшированные фрагменты (id канала -> фрагмент) и текущие версии каналов для записи промахов.
+    Каналы промахов нужно читать из базы уже после этого вызова. Версий нет, если Redis недоступен -
+    тогда и записывать нечего.
+    """
+    channel_ids = [channel.pk for channel in channels]
+    if not is_enabled() or not channel_ids:
+        return {}, {}
+    try:
+        result = get_redis().eval(
+            GET_SCRIPT,
+            len(channel_ids) + 1,
+            STATS_KEY,
+            *map(_version_key, channel_ids),
+            *channel_ids,
+        )
+    except RedisError as e:
+        logger.warning(f"Channel payload cache is unavailable: {e!r}")
+        return {}, {}
+
+    fragments, versions = {}, {}
+    for channel, version, fragment in zip(channels, result[::2], result[1::2]):
+        versions[channel.pk] = version.decode()
+        if fragment is not None:
+            fragment = loads(fragment)
+            # id каналов не переиспользуются, но Redis может пережить пересоздание базы
+            if fragment['uuid'] == str(channel.uuid):
+                fragments[channel.pk] = fragment
+    return fragments, versions
+
+
+def store_fragments(fragments: dict[int, dict], versions: dict[int, str]) -> None:
+    """
+    Кладёт фрагменты под версиями, прочитанными до чтения каналов из базы: изменение после чтения версий
+    поднимает версию, и такую запись уже не прочитают, а изменение до него фрагмент уже видит.
+    """
+    if not is_enabled() or not versions:
+        return
+    try:
+        with get_redis().pipeline(transaction=False) as pipe:
+            for channel_id, fragment in fragments.items():
+                pipe.set(
+                    _fragment_key(channel_id, versions[channel_id]),
+                    dumps(fragment),
+                    ex=settings.CHANNEL_PAYLOAD_CACHE_TTL,
+                )
+            pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Channel payload cache is unavailable: {e!r}")
+
+
+def bump_version(channel_id: int) -> None:
+    """Инвалидирует фрагмент канала после коммита текущей транзакции."""
+    if not is_enabled():
+        return
+
+    def bump():
+        try:
+            get_redis().incr(_version_key(channel_id))
+        except RedisError as e:
+            logger.warning(f"Channel payload cache is unavailable: {e!r}")
+
+    transaction.on_commit(bump)
+
+
+def get_stats() -> dict[str, int]:
+    try:
+        stats = get_redis().hgetall(STATS_KEY)
+    except RedisError as e:
+        logger.warning(f"Channel payload cache is unavailable: {e!r}")
+        return {}
+    return {key.decode(): int(value) for key, value in stats.items()}
+
+
+def reset_stats() -> None:
+    get_redis().delete(STATS_KEY)
@@ -41,3 +41,12 @@ class CanManageBans(BasePermission):
             channel=obj.channel,
             is_admin=True,
         ).exists()
+
+
+class IsChannelMember(BasePermission):
+    def has_permission(self, request: Request, view):
+        channel = get_object_or_404(Channel, uuid=view.kwargs['channel_uuid'])
+        return ChannelMembership.objects.filter(
+            user=request.user,
+            channel=channel,
+        ).exists()
@@ -0,0 +1,194 @@
+"""
+Прочитанность каналов: `ChannelMembership.last_read_number`.
+
+Отметки копятся в Redis: `read_state:<channel_pk>` - последняя позиция каждого пользователя,
+`read_state:<channel_pk>:dirty` - кто сдвинулся с последнего сброса, `read_state:dirty_channels` - какие каналы
+сбрасывать. Периодическая задача `flush_read_receipts` пишет в Postgres только последнюю позицию
+каждого пользователя и рассылает по каналу одно агрегированное событие read_state.
+Собственные соединения пользователя (группа `websocket_user_<pk>`) узнают об отметке сразу событием channel_read.
+
+Позиция только растёт: отметка, которая ничего не продвинула, не порождает ни записи, ни события,
+поэтому одновременные отметки с разных устройств схлопываются до наибольшей.
+Если Redis недоступен, отметка сразу пишется в базу тем же монотонным UPDATE.
+"""
+import logging
+import uuid
+from typing import cast
+
+from channels.layers import get_channel_layer
+from channels_redis.core import RedisChannelLayer
+from django.conf import settings
+from django.db.models import Case, F, IntegerField, Value, When
+from redis.exceptions import RedisError
+
+from common.events import encode_event
+from common.redis import get_redis
+
+from .models import Channel, ChannelMembership
+
+logger = logging.getLogger(__name__)
+
+DIRTY_CHANNELS_KEY = 'read_state:dirty_channels'
+
+# KEYS: позиции канала, изменённые пользователи канала, изменённые каналы
+# ARGV: user_id, новая позиция, позиция в базе, TTL позиций, channel_pk
+ADVANCE_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], ARGV[1]) or ARGV[3]
+if tonumber(ARGV[2]) <= tonumber(current) then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('SADD', KEYS[2], ARGV[1])
+redis.call('SADD', KEYS[3], ARGV[5])
+return 1
+"""
+
+# KEYS: позиции канала, изменённые пользователи канала. Возвращает [user_id, позиция, ...]
+POP_SCRIPT = """
+local users = redis.call('SMEMBERS', KEYS[2])
+redis.call('DEL', KEYS[2])
+if #users == 0 then
+    return {}
+end
+local positions = redis.call('HMGET', KEYS[1], unpack(users))
+local result = {}
+for i, user in ipairs(users) do
+    if positions[i] then
+        table.insert(result, user)
+        table.insert(result, positions[i])
+    end
+end
+return result
+"""
+
+
+def _positions_key(channel_id: int) -> str:
+    return f'read_state:{channel_id}'
+
+
+def _dirty_key(channel_id: int) -> str:
+    return f'read_state:{channel_id}:dirty'
+
+
+def get_read_state(channel: Channel, last_read_number: int) -> dict:
+    return {
+        'channel': str(channel.uuid),
+        'last_read_number': last_read_number,
+        'unread_count': max(channel.last_message_number - last_read_number, 0),
+    }
+
+
+def mark_read(user_id: int, channel_uuid: uuid.UUID, number: int) -> tuple[Channel, int | None] | None:
+    """
+    Отмечает прочитанными сообщения канала до номера `number` включительно.
+    Возвращает канал и новый last_read_number (None, если отметка ничего не продвинула)
+    или None, если пользователь не состоит в канале.
+    """
+    channel = Channel.objects.filter(
+        uuid=channel_uuid,
+        memberships__user_id=user_id,
+    ).annotate(
+        stored_last_read_number=F('memberships__last_read_number'),
+    ).only('uuid', 'last_message_number').first()
+    if channel is None:
+        return None
+
+    last_read_number = min(number + 1, channel.last_message_number)
+    try:
+        advanced = get_redis().eval(
+            ADVANCE_SCRIPT,
+            3,
+            _positions_key(channel.pk),
+            _dirty_key(channel.pk),
+            DIRTY_CHANNELS_KEY,
+            user_id,
+            last_read_number,
+            channel.stored_last_read_number,
+            settings.READ_RECEIPTS_TTL,
+            channel.pk,
+        )
+    except RedisError as e:
+        logger.warning(f"Read receipts buffer is unavailable, writing to database: {e!r}")
+        advanced = persist_positions(channel.pk, {user_id: last_read_number})
+    return channel, (last_read_number if advanced else None)
+
+
+def get_last_read_number(user_id: int, channel: Channel) -> int:
+    """Позиция пользователя: из буфера, если она там новее, чем в базе."""
+    stored = ChannelMembership.objects.filter(user_id=user_id, channel=channel).values_list(
+        'last_read_number', flat=True,
+    ).get()
+    try:
+        buffered = get_redis().hget(_positions_key(channel.pk), user_id)
+    except RedisError:
+        buffered = None
+    return max(stored, int(buffered or 0))
+
+
+def get_channel_read_state(channel: Channel) -> list[dict]:
+    """Позиции всех участников канала: база с поправкой на ещё не сброшенный буфер."""
+    positions = dict(
+        ChannelMembership.objects.filter(channel=channel).values_list('user_id', 'last_read_number')
+    )
+    try:
+        buffered = get_redis().hgetall(_positions_key(channel.pk))
+    except RedisError:
+        buffered = {}
+    for user_id, last_read_number in buffered.items():
+        user_id = int(user_id)
+        if user_id in positions:
+            positions[user_id] = max(positions[user_id], int(last_read_number))
+    return [
+        {'user': user_id, 'last_read_number': last_read_number}
+        for user_id, last_read_number in sorted(positions.items())
+    ]
+
+
+def persist_positions(channel_id: int, positions: dict[int, int]) -> int:
+    """Один монотонный UPDATE на канал для всех сдвинувшихся пользователей."""
+    new_position = Case(
+        *[When(user_id=user_id, then=Value(number)) for user_id, number in positions.items()],
+        output_field=IntegerField(),
+    )
+    return ChannelMembership.objects.filter(
+        channel_id=channel_id,
+        user_id__in=positions,
+        last_read_number__lt=new_position,
+    ).update(last_read_number=new_position)
+
+
+def pop_buffered_positions() -> dict[int, dict[int, int]]:
+    """Забирает из буфера позиции, изменившиеся с прошлого сброса: {channel_pk: {user_id: позиция}}."""
+    redis = get_redis()
+    channel_ids = redis.spop(DIRTY_CHANNELS_KEY, count=redis.scard(DIRTY_CHANNELS_KEY) or 1) or []
+    result = {}
+    for channel_id in map(int, channel_ids):
+        flat = redis.eval(POP_SCRIPT, 2, _positions_key(channel_id), _dirty_key(channel_id))
+        positions = {int(user_id): int(number) for user_id, number in zip(flat[::2], flat[1::2])}
+        if positions:
+            result[channel_id] = positions
+    return result
+
+
+def restore_buffered_positions(positions: dict[int, dict[int, int]]) -> None:
+    """Возвращает позиции в очередь на сброс, если записать их не удалось."""
+    redis = get_redis()
+    with redis.pipeline() as pipe:
+        for channel_id, users in positions.items():
+            pipe.sadd(_dirty_key(channel_id), *users)
+            pipe.sadd(DIRTY_CHANNELS_KEY, channel_id)
+        pipe.execute()
+
+
+async def send_read_state(user_id: int, channel: Channel, last_read_number: int) -> None:
+    """Событие channel_read во все соединения пользователя."""
+    channel_layer = cast(RedisChannelLayer, get_channel_layer())
+    if not channel_layer:
+        logger.error("Channel layer is not configured")
+        return
+
+    await channel_layer.group_send(
+        f"websocket_user_{user_id}",
+        encode_event("channel_read", get_read_state(channel, last_read_number)),
+    )
@@ -4,8 +4,8 @@ from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
+from common.serializers import FastModelSerializer
 from text_channels.models import ChannelBan
-from text_messages.models import Message
 from text_messages.serializers import MessageSerializer
 from users.models import User
 from users.serializers import UserSerializer
@@ -28,43 +28,82 @@ class MiniChannelSerializer(serializers.ModelSerializer):
     Используется в Invitations, не должен передавать чувствительные данные!
     """
     owner = UserSerializer(read_only=True)
-    users_count = serializers.SerializerMethodField()
+    users_count = serializers.IntegerField(source='member_count', read_only=True)
 
     class Meta:
         model = Channel
         fields = ['name', 'owner', 'created_at', 'users_count']
         read_only_fields = ['name', 'owner', 'created_at', 'users_count']
 
-    @extend_schema_field(OpenApiTypes.INT)
-    def get_users_count(self, obj: Channel):
-        return ChannelMembership.objects.filter(channel=obj).count()
+
+def members_queryset():
+    """
+    Участники для ChannelSerializer.users и ChannelMemberSerializer: только нужные колонки.
+    Превью в ChannelSerializer идёт в порядке вступления, эндпоинт участников сортирует ChannelMemberPagination по user_id.
+    """
+    return ChannelMembership.objects.select_related('user').only(
+        'channel', 'is_admin', 'created_at', 'user', *(f'user__{field}' for field in UserSerializer.Meta.fields),
+    ).order_by('pk')
 
 
-class ChannelSerializer(serializers.ModelSerializer):
+class ChannelSerializer(FastModelSerializer):
+    # Поля, зависящие от пользователя: не попадают в кэш text_channels.payload_cache
+    per_user_fields = ('unread_count', )
+
     owner = UserSerializer(read_only=True)
     last_message = serializers.SerializerMethodField()
     users = serializers.SerializerMethodField()
+    users_count = serializers.IntegerField(source='member_count', read_only=True)
+    unread_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Channel
-        fields = ['uuid', 'name', 'owner', 'created_at', 'last_message', 'users', 'last_message_number']
+        fields = [
+            'uuid', 'name', 'owner', 'created_at', 'last_message',
+            'users', 'users_count', 'last_message_number', 'unread_count',
+        ]
         read_only_fields = fields
 
+    @extend_schema_field(OpenApiTypes.INT)
+    def get_unread_count(self, obj: Channel) -> int:
+        """Аннотация ChannelView.get_queryset, у только что созданного членства непрочитанных нет."""
+        return max(getattr(obj, 'unread_count', 0), 0)
+
     @extend_schema_field(MessageSerializer(allow_null=True))
     def get_last_message(self, obj: Channel):
-        last_message = Message.objects.filter(channel=obj).order_by('-created_at').first()
-        if last_message:
-            data = MessageSerializer(last_message).data
-            content_length = len(data['content'])
-            if content_length > settings.CHANNEL_LAST_MESSAGE_MAX_LENGTH:
-                data['content'] = data['content'][:settings.CHANNEL_LAST_MESSAGE_MAX_LENGTH] + '...'
-            return data
+        """Из снимка на канале, без запроса к сообщениям (см. text_messages.snapshots)."""
+        snapshot = obj.last_message_snapshot
+        if not snapshot:
+            return None
+        author = obj.last_message_author
+        user = UserSerializer(author).data if author else None
+        return {
+            field: user if field == 'user' else snapshot.get(field)
+            for field in MessageSerializer.Meta.fields
+        }
 
     @extend_schema_field(UserSerializer(many=True))
     def get_users(self, obj: Channel):
-        memberships = ChannelMembership.objects.filter(channel=obj).select_related('user')
-        users = [membership.user for membership in memberships]
-        return UserSerializer(users, many=True).data
+        """
+        Первые CHANNEL_MEMBERS_PREVIEW_SIZE участников, всего их - users_count,
+        полный список - api/channels/<uuid>/members/. При CHANNEL_MEMBERS_PREVIEW_SIZE = 0 список пуст.
+        ChannelView подгружает превью всех каналов одним запросом (members_preview).
+        """
+        if not settings.CHANNEL_MEMBERS_PREVIEW_SIZE:
+            return []
+        memberships = getattr(obj, 'members_preview', None)
+        if memberships is None:
+            memberships = members_queryset().filter(channel=obj)[:settings.CHANNEL_MEMBERS_PREVIEW_SIZE]
+        return UserSerializer([membership.user for membership in memberships], many=True).data
+
+
+class ChannelMemberSerializer(FastModelSerializer):
+    user = UserSerializer(read_only=True)
+
+    class Meta:
+        model = ChannelMembership
+        fields = ['user', 'is_admin', 'created_at']
+        read_only_fields = fields
 
 
 class ChannelCreateSerializer(serializers.ModelSerializer):
@@ -110,3 +149,13 @@ class ChannelBanSerializer(serializers.ModelSerializer):
         if value and len(value) > 255:
             raise serializers.ValidationError("Причина бана слишком длинная (максимум 255 символов).")
         return value
+
+
+class ChannelReadSerializer(serializers.Serializer):
+    number = serializers.IntegerField(min_value=0, help_text="Номер последнего прочитанного сообщения")
+
+
+class ChannelReadStateSerializer(serializers.Serializer):
+    channel = serializers.UUIDField()
+    last_read_number = serializers.IntegerField()
+    unread_count = serializers.IntegerField()
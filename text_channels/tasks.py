@@ -0,0 +1,67 @@
+import logging
+from typing import cast
+
+from asgiref.sync import async_to_sync
+from celery import shared_task
+from channels.layers import get_channel_layer
+from channels_redis.core import RedisChannelLayer
+from django.conf import settings
+
+from common.events import encode_event
+
+from .inbox import pop_scheduled_touches, restore_scheduled_touches, touch_channel
+from .models import Channel
+from .read_state import persist_positions, pop_buffered_positions, restore_buffered_positions
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def flush_read_receipts() -> None:
+    """
+    Сбрасывает буфер отметок о прочтении: последняя позиция каждого пользователя пишется в базу,
+    в каждый небольшой канал уходит одно событие read_state со всеми сдвинувшимися позициями.
+    """
+    buffered = pop_buffered_positions()
+    if not buffered:
+        return
+
+    try:
+        for channel_id, positions in buffered.items():
+            persist_positions(channel_id, positions)
+    except Exception:
+        restore_buffered_positions(buffered)
+        raise
+
+    channel_layer = cast(RedisChannelLayer, get_channel_layer())
+    if not channel_layer:
+        logger.error("Channel layer is not configured")
+        return
+
+    channels = Channel.objects.filter(pk__in=buffered).values_list('pk', 'uuid', 'member_count')
+    for channel_id, channel_uuid, member_count in channels:
+        if member_count > settings.READ_RECEIPTS_MAX_MEMBERS:
+            continue
+        async_to_sync(channel_layer.group_send)(
+            f"websocket_channel_{channel_id}",
+            encode_event("read_state", {
+                "channel": str(channel_uuid),
+                "read_state": [
+                    {"user": user_id, "last_read_number": last_read_number}
+                    for user_id, last_read_number in sorted(buffered[channel_id].items())
+                ],
+            }),
+        )
+
+
+@shared_task(ignore_result=True)
+def flush_inbox_activity() -> None:
+    """Сдвигает last_activity_at участников каналов с новыми сообщениями: одно UPDATE на канал за интервал."""
+    touches = pop_scheduled_touches()
+    try:
+        for channel_id, at in touches.items():
+            touch_channel(channel_id, at)
+    except Exception:
+        # Повторный сдвиг уже обработанных каналов ничего не перепишет
+        restore_scheduled_touches(touches)
+        raise
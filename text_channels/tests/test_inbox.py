@@ -0,0 +1,153 @@
+from datetime import timedelta
+from typing import cast
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from invitations.tests.factories import InvitationFactory
+from common.redis import get_redis
+from text_channels.inbox import ACTIVITY_KEY, schedule_touch, touch_channel
+from text_channels.models import Channel, ChannelMembership
+from text_channels.tasks import flush_inbox_activity
+from text_channels.tests.factories import ChannelFactory, ChannelMembershipFactory
+from text_messages.models import Message
+from text_messages.tests.factories import MessageFactory
+from users.tests.factories import UserFactory
+
+
+@pytest.fixture(autouse=True)
+def exact_activity(settings):
+    settings.INBOX_ACTIVITY_RESOLUTION = 0
+
+
+@pytest.fixture(autouse=True)
+def clean_activity_buffer():
+    get_redis().delete(ACTIVITY_KEY)
+    yield
+    get_redis().delete(ACTIVITY_KEY)
+
+
+@pytest.fixture
+def user() -> UserFactory:
+    return UserFactory()
+
+
+@pytest.fixture
+def client(user: UserFactory) -> APIClient:
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.fixture
+def channels(user: UserFactory) -> list[Channel]:
+    channels = []
+    for _ in range(3):
+        channel = ChannelFactory()
+        ChannelMembershipFactory(user=user, channel=channel)
+        channels.append(channel)
+    return channels
+
+
+def inbox(client: APIClient, **params) -> list[str]:
+    """uuid каналов со всех страниц инбокса."""
+    uuids = []
+    response = cast(Response, client.get(reverse("channels-list"), params))
+    while True:
+        uuids += [item["uuid"] for item in response.data["results"]]  # type: ignore
+        if not response.data["next"]:  # type: ignore
+            return uuids
+        response = cast(Response, client.get(response.data["next"]))  # type: ignore
+
+
+@pytest.mark.django_db
+class TestInbox:
+    def test_ordered_by_last_message(
+        self, client: APIClient, channels: list[Channel], django_capture_on_commit_callbacks,
+    ) -> None:
+        first, second, third = channels
+        with django_capture_on_commit_callbacks(execute=True):
+            MessageFactory(channel=first)
+            Message.bulk_create_numbered(second, [Message(content='пачка')])
+        flush_inbox_activity()
+
+        assert inbox(client) == [str(second.uuid), str(first.uuid), str(third.uuid)]
+        assert inbox(client, limit=1) == inbox(client)
+
+    def test_touched_after_commit(
+        self, user: UserFactory, channels: list[Channel], django_capture_on_commit_callbacks,
+    ) -> None:
+        membership = ChannelMembership.objects.get(user=user, channel=channels[0])
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            message = MessageFactory(channel=channels[0])
+        membership.refresh_from_db()
+        assert membership.last_activity_at < message.created_at
+
+        for callback in callbacks:
+            callback()
+        membership.refresh_from_db()
+        # После коммита время только отложено в Redis, членства сдвигает задача
+        assert membership.last_activity_at < message.created_at
+
+        flush_inbox_activity()
+        membership.refresh_from_db()
+        assert membership.last_activity_at == message.created_at
+
+    def test_join_leave_ban_and_delete(self, client: APIClient, user: UserFactory, channels: list[Channel]) -> None:
+        MessageFactory(channel=channels[0])
+        joined = ChannelFactory()
+        client.post(reverse(
+            "channel-invitations-connect", kwargs={"invitation_uuid": InvitationFactory(channel=joined).uuid},
+        ))
+        assert inbox(client)[0] == str(joined.uuid)
+
+        client.delete(reverse("channel-invitations-disconnect", kwargs={"channel_uuid": joined.uuid}))
+        admin = UserFactory()
+        ChannelMembershipFactory(user=admin, channel=channels[1], is_admin=True)
+        admin_client = APIClient()
+        admin_client.force_authenticate(user=admin)
+        admin_client.post(reverse("channel-ban-detail", kwargs={"channel_uuid": channels[1].uuid, "user_id": user.pk}))
+        channels[2].delete()
+
+        assert inbox(client) == [str(channels[0].uuid)]
+
+    def test_resolution_coalesces_writes(self, settings, user: UserFactory, channels: list[Channel]) -> None:
+        settings.INBOX_ACTIVITY_RESOLUTION = 60
+        channel = channels[0]
+        membership = ChannelMembership.objects.get(user=user, channel=channel)
+
+        assert touch_channel(channel.pk, membership.last_activity_at + timedelta(seconds=30)) == 0
+        assert touch_channel(channel.pk, timezone.now() + timedelta(minutes=2)) == 1
+
+    def test_flush_coalesces_and_respects_resolution(
+        self, settings, user: UserFactory, channels: list[Channel],
+    ) -> None:
+        settings.INBOX_ACTIVITY_RESOLUTION = 60
+        channel = channels[0]
+        membership = ChannelMembership.objects.get(user=user, channel=channel)
+        start = membership.last_activity_at
+
+        # Сообщения одного интервала схлопываются до самого позднего
+        schedule_touch(channel.pk, start + timedelta(minutes=2))
+        schedule_touch(channel.pk, start + timedelta(minutes=3))
+        schedule_touch(channel.pk, start + timedelta(minutes=1))
+        flush_inbox_activity()
+        membership.refresh_from_db()
+        assert membership.last_activity_at == start + timedelta(minutes=3)
+
+        # Окно точности ещё не прошло - строки не переписываются
+        schedule_touch(channel.pk, start + timedelta(minutes=3, seconds=30))
+        flush_inbox_activity()
+        membership.refresh_from_db()
+        assert membership.last_activity_at == start + timedelta(minutes=3)
+
+        # Окно прошло - активность сдвигается
+        schedule_touch(channel.pk, start + timedelta(minutes=5))
+        flush_inbox_activity()
+        membership.refresh_from_db()
+        assert membership.last_activity_at == start + timedelta(minutes=5)
+        assert get_redis().hlen(ACTIVITY_KEY) == 0
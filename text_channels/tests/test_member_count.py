@@ -0,0 +1,88 @@
+from typing import cast
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from invitations.tests.factories import InvitationFactory
+from text_channels.models import Channel, ChannelBan, ChannelMembership, reconcile_member_counts
+from text_channels.serializers import ChannelBanSerializer, MiniChannelSerializer
+from text_channels.tests.factories import ChannelFactory, ChannelMembershipFactory
+from users.tests.factories import UserFactory
+
+
+@pytest.fixture
+def user() -> UserFactory:
+    return UserFactory()
+
+
+@pytest.fixture
+def client(user: UserFactory) -> APIClient:
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+def member_count(channel: Channel) -> int:
+    return Channel.objects.values_list('member_count', flat=True).get(pk=channel.pk)
+
+
+@pytest.mark.django_db
+class TestMemberCount:
+    def test_channel_creation(self, client: APIClient) -> None:
+        response = cast(Response, client.post(reverse("channels-list"), {"name": "Канал"}, format="json"))
+
+        assert member_count(Channel.objects.get(uuid=response.data["uuid"])) == 1  # type: ignore
+
+    def test_join_and_leave(self, client: APIClient, user: UserFactory) -> None:
+        channel = ChannelFactory()
+        ChannelMembershipFactory(channel=channel)
+        invitation = InvitationFactory(channel=channel)
+
+        client.post(reverse("channel-invitations-connect", kwargs={"invitation_uuid": invitation.uuid}))
+        assert member_count(channel) == 2
+
+        client.delete(reverse("channel-invitations-disconnect", kwargs={"channel_uuid": channel.uuid}))
+        assert member_count(channel) == 1
+
+    def test_ban(self, client: APIClient, user: UserFactory) -> None:
+        channel = ChannelFactory(owner=user)
+        ChannelMembershipFactory(user=user, channel=channel, is_admin=True)
+        banned = ChannelMembershipFactory(channel=channel).user
+
+        response = cast(Response, client.post(
+            reverse("channel-ban-detail", kwargs={"channel_uuid": channel.uuid, "user_id": banned.pk}),
+            {"reason": "спам"},
+            format="json",
+        ))
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert member_count(channel) == 1
+        assert response.data["channel"]["users_count"] == 1  # type: ignore
+
+    def test_serializers_read_counter(self, django_assert_num_queries) -> None:
+        channel = ChannelFactory()
+        ChannelMembershipFactory.create_batch(3, channel=channel)
+        ban = ChannelBan.objects.select_related('user', 'banned_by', 'channel__owner').get(
+            pk=ChannelBan.objects.create(channel=channel, user=UserFactory()).pk,
+        )
+
+        with django_assert_num_queries(0):
+            assert ChannelBanSerializer(ban).data['channel']['users_count'] == 3
+            assert MiniChannelSerializer(ban.channel).data['users_count'] == 3
+
+    def test_reconcile(self, capsys) -> None:
+        channel, other = ChannelFactory(), ChannelFactory()
+        ChannelMembershipFactory.create_batch(2, channel=channel)
+        ChannelMembership.objects.filter(channel=channel).first().user.delete()  # каскад мимо счётчика
+        Channel.objects.filter(pk=other.pk).update(member_count=5)
+
+        assert reconcile_member_counts([channel.pk]) == 1
+        assert member_count(channel) == 1
+        call_command('reconcile_member_counts')
+
+        assert member_count(other) == 0
+        assert 'Исправлено каналов: 1' in capsys.readouterr().out
@@ -0,0 +1,158 @@
+from typing import cast
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from common.redis import get_redis
+from text_channels import payload_cache
+from text_channels.models import Channel, ChannelMembership
+from text_channels.tests.factories import ChannelFactory, ChannelMembershipFactory
+from text_messages.models import Message
+from text_messages.tests.factories import MessageFactory
+from users.tests.factories import UserFactory
+
+
+@pytest.fixture(autouse=True)
+def clean_payload_cache():
+    redis = get_redis()
+    for key in redis.scan_iter('channel_payload:*'):
+        redis.delete(key)
+    yield
+    for key in redis.scan_iter('channel_payload:*'):
+        redis.delete(key)
+
+
+@pytest.fixture
+def user() -> UserFactory:
+    return UserFactory()
+
+
+@pytest.fixture
+def channel(user: UserFactory) -> Channel:
+    channel = ChannelFactory(owner=user)
+    ChannelMembershipFactory(user=user, channel=channel, is_admin=True)
+    ChannelMembershipFactory(channel=channel)
+    MessageFactory(channel=channel, user=user)
+    return channel
+
+
+def client_for(user) -> APIClient:
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+def list_channels(client: APIClient) -> bytes:
+    return cast(Response, client.get(reverse("channels-list"))).content
+
+
+@pytest.mark.django_db
+class TestChannelPayloadCache:
+    def test_same_response_as_serializer(self, settings, user: UserFactory, channel: Channel) -> None:
+        client = client_for(user)
+        settings.CHANNEL_PAYLOAD_CACHE_TTL = 0
+        expected = list_channels(client)
+        settings.CHANNEL_PAYLOAD_CACHE_TTL = 60
+
+        assert list_channels(client) == expected  # промах
+        assert list_channels(client) == expected  # попадание
+        assert payload_cache.get_stats() == {'hits': 1, 'misses': 1}
+
+    def test_hit_skips_members_preview(self, user: UserFactory, channel: Channel, django_assert_num_queries) -> None:
+        client = client_for(user)
+        list_channels(client)
+
+        # Только страница каналов (она же валидаторы ETag), без каналов и превью участников
+        with django_assert_num_queries(1):
+            list_channels(client)
+
+    def test_per_user_fields(self, user: UserFactory, channel: Channel) -> None:
+        reader = ChannelMembership.objects.exclude(user=user).get(channel=channel).user
+        ChannelMembership.objects.filter(user=reader).update(last_read_number=1)
+
+        owner_item = client_for(user).get(reverse("channels-list")).data["results"][0]  # type: ignore
+        reader_item = client_for(reader).get(reverse("channels-list")).data["results"][0]  # type: ignore
+
+        assert (owner_item["unread_count"], reader_item["unread_count"]) == (1, 0)
+        assert payload_cache.get_stats() == {'hits': 1, 'misses': 1}
+
+    @pytest.mark.parametrize("change", ["message", "edit", "delete", "join", "leave", "rename"])
+    def test_invalidation(
+        self, user: UserFactory, channel: Channel, change: str, django_capture_on_commit_callbacks,
+    ) -> None:
+        client = client_for(user)
+        before = list_channels(client)
+        message = Message.objects.get(channel=channel)
+        with django_capture_on_commit_callbacks(execute=True):
+            if change == "message":
+                MessageFactory(channel=channel)
+            elif change == "edit":
+                message.edit("Исправлено")
+            elif change == "delete":
+                message.soft_delete()
+            elif change == "join":
+                ChannelMembershipFactory(channel=channel)
+            elif change == "leave":
+                ChannelMembership.objects.exclude(user=user).get(channel=channel).delete()
+            else:
+                channel.name = "Новое имя"
+                channel.save()
+
+        assert list_channels(client) != before
+        assert payload_cache.get_stats() == {'hits': 0, 'misses': 2}
+
+    def test_change_between_page_and_versions(
+        self, user: UserFactory, channel: Channel, monkeypatch, django_capture_on_commit_callbacks,
+    ) -> None:
+        get_fragments = payload_cache.get_fragments
+
+        def rename_then_get_fragments(channels):
+            # Страница уже прочитана, версия растёт до чтения версий
+            with django_capture_on_commit_callbacks(execute=True):
+                channel.name = "Новое имя"
+                channel.save()
+            return get_fragments(channels)
+        monkeypatch.setattr(payload_cache, 'get_fragments', rename_then_get_fragments)
+        client = client_for(user)
+        assert client.get(reverse("channels-list")).data["results"][0]["name"] == "Новое имя"  # type: ignore
+
+        monkeypatch.setattr(payload_cache, 'get_fragments', get_fragments)
+        assert client.get(reverse("channels-list")).data["results"][0]["name"] == "Новое имя"  # type: ignore
+        assert payload_cache.get_stats() == {'hits': 1, 'misses': 1}
+
+    def test_owner_avatar_follows_request_host(self, user: UserFactory, channel: Channel) -> None:
+        user.avatar = "avatars/owner.png"
+        user.save(update_fields=["avatar"])
+        client = client_for(user)
+        list_channels(client)
+
+        response = cast(Response, client.get(reverse("channels-list"), HTTP_HOST="chat.example.com"))
+
+        owner = response.data["results"][0]["owner"]  # type: ignore
+        assert owner["avatar"] == "http://chat.example.com/api/media/avatars/owner.png"
+        assert payload_cache.get_stats() == {'hits': 1, 'misses': 1}
+
+    def test_ban(self, user: UserFactory, channel: Channel, django_capture_on_commit_callbacks) -> None:
+        client = client_for(user)
+        banned = ChannelMembership.objects.exclude(user=user).get(channel=channel).user
+        list_channels(client)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            client.post(reverse("channel-ban-detail", kwargs={"channel_uuid": channel.uuid, "user_id": banned.pk}))
+
+        item = client.get(reverse("channels-list")).data["results"][0]  # type: ignore
+        assert item["users_count"] == 1
+        assert [member["id"] for member in item["users"]] == [user.pk]
+
+    def test_stats_command(self, user: UserFactory, channel: Channel, capsys) -> None:
+        client = client_for(user)
+        list_channels(client)
+        list_channels(client)
+
+        call_command('channel_payload_stats', reset=True)
+
+        assert 'Попаданий: 1, промахов: 1, доля попаданий: 50.0%' in capsys.readouterr().out
+        assert payload_cache.get_stats() == {}
@@ -0,0 +1,137 @@
+from typing import cast
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from django.urls import reverse
+from redis.exceptions import RedisError
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from common.json import loads
+from common.redis import get_redis
+from text_channels.models import Channel, ChannelMembership
+from text_channels.read_state import get_channel_read_state
+from text_channels.tasks import flush_read_receipts
+from text_channels.tests.factories import ChannelFactory, ChannelMembershipFactory
+from text_messages.tests.factories import MessageFactory
+from users.tests.factories import UserFactory
+
+
+@pytest.fixture(autouse=True)
+def clean_read_state():
+    redis = get_redis()
+    for key in redis.scan_iter('read_state:*'):
+        redis.delete(key)
+    yield
+    for key in redis.scan_iter('read_state:*'):
+        redis.delete(key)
+
+
+@pytest.fixture
+def channel() -> Channel:
+    channel = ChannelFactory()
+    MessageFactory.create_batch(5, channel=channel)
+    return channel
+
+
+def client_for(user) -> APIClient:
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+def mark_read(user, channel: Channel, number: int) -> Response:
+    url = reverse("channels-read", kwargs={"channel_uuid": channel.uuid})
+    with patch("text_channels.read_state.get_channel_layer") as get_channel_layer:
+        get_channel_layer.return_value.group_send = AsyncMock()
+        return cast(Response, client_for(user).post(url, {"number": number}, format="json"))
+
+
+def last_read_number(user, channel: Channel) -> int:
+    return ChannelMembership.objects.get(user=user, channel=channel).last_read_number
+
+
+@pytest.mark.django_db
+class TestReadReceipts:
+    def test_marks_are_buffered_and_flushed_as_one_event(self, channel: Channel) -> None:
+        first, second = UserFactory(), UserFactory()
+        ChannelMembershipFactory(user=first, channel=channel)
+        ChannelMembershipFactory(user=second, channel=channel)
+
+        mark_read(first, channel, 1)
+        mark_read(first, channel, 3)
+        mark_read(second, channel, 0)
+        assert last_read_number(first, channel) == 0
+
+        with patch("text_channels.tasks.get_channel_layer") as get_channel_layer:
+            get_channel_layer.return_value.group_send = AsyncMock()
+            flush_read_receipts()
+            flush_read_receipts()
+
+        assert last_read_number(first, channel) == 4
+        assert last_read_number(second, channel) == 1
+        get_channel_layer.return_value.group_send.assert_awaited_once()
+        group_name, event = get_channel_layer.return_value.group_send.await_args.args
+        assert group_name == f"websocket_channel_{channel.pk}"
+        assert loads(event["text"]) == {
+            "type": "read_state",
+            "data": {
+                "channel": str(channel.uuid),
+                "read_state": [
+                    {"user": first.pk, "last_read_number": 4},
+                    {"user": second.pk, "last_read_number": 1},
+                ],
+            },
+        }
+
+    def test_large_channel_is_persisted_without_event(self, channel: Channel, settings) -> None:
+        settings.READ_RECEIPTS_MAX_MEMBERS = 1
+        user = UserFactory()
+        ChannelMembershipFactory(user=user, channel=channel)
+        ChannelMembershipFactory(channel=channel)
+
+        mark_read(user, channel, 4)
+        with patch("text_channels.tasks.get_channel_layer") as get_channel_layer:
+            get_channel_layer.return_value.group_send = AsyncMock()
+            flush_read_receipts()
+
+        assert last_read_number(user, channel) == 5
+        get_channel_layer.return_value.group_send.assert_not_awaited()
+
+    def test_marks_below_stored_position_are_ignored(self, channel: Channel) -> None:
+        user = UserFactory()
+        ChannelMembershipFactory(user=user, channel=channel, last_read_number=4)
+
+        response = mark_read(user, channel, 1)
+
+        assert response.data["last_read_number"] == 4  # type: ignore
+        assert not get_redis().exists(f"read_state:{channel.pk}:dirty")
+
+    def test_falls_back_to_database_without_redis(self, channel: Channel) -> None:
+        user = UserFactory()
+        ChannelMembershipFactory(user=user, channel=channel)
+
+        with patch("text_channels.read_state.get_redis") as get_redis_mock:
+            get_redis_mock.return_value.eval.side_effect = RedisError
+            get_redis_mock.return_value.hget.side_effect = RedisError
+            response = mark_read(user, channel, 2)
+
+        assert response.data["last_read_number"] == 3  # type: ignore
+        assert last_read_number(user, channel) == 3
+
+    def test_read_state_with_messages_page(self, channel: Channel) -> None:
+        user, other = UserFactory(), UserFactory()
+        ChannelMembershipFactory(user=user, channel=channel)
+        ChannelMembershipFactory(user=other, channel=channel, last_read_number=2)
+        mark_read(user, channel, 3)
+        url = reverse("channel-messages-list", kwargs={"channel_uuid": channel.uuid})
+
+        response = cast(Response, client_for(user).get(url, {"read_state": "true"}))
+
+        expected = sorted([
+            {"user": user.pk, "last_read_number": 4},
+            {"user": other.pk, "last_read_number": 2},
+        ], key=lambda item: item["user"])
+        assert response.data["read_state"] == expected  # type: ignore
+        assert get_channel_read_state(channel) == expected
+        assert "read_state" not in cast(Response, client_for(user).get(url)).data  # type: ignore
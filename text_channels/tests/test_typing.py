@@ -0,0 +1,61 @@
+import pytest
+from django.conf import settings
+from redis.asyncio.client import Redis
+
+from text_channels.typing_indicator import SEND_LATER, SEND_NOW, flush_typing, register_typing, typing_key
+
+CHANNEL_ID = 10 ** 9
+
+
+@pytest.fixture
+async def redis():
+    redis = Redis.from_url(settings.REDIS_URL)
+    async for key in redis.scan_iter(f'{typing_key(CHANNEL_ID)}*'):
+        await redis.delete(key)
+    yield redis
+    async for key in redis.scan_iter(f'{typing_key(CHANNEL_ID)}*'):
+        await redis.delete(key)
+    await redis.aclose()
+
+
+@pytest.fixture(autouse=True)
+def typing_settings(settings):
+    settings.TYPING_THROTTLE_INTERVAL = 0.5
+    settings.TYPING_EVENT_INTERVAL = 0.2
+    settings.TYPING_TTL = 5
+
+
+class TestTyping:
+    async def test_first_signal_sends_event(self, redis: Redis) -> None:
+        assert await register_typing(redis, CHANNEL_ID, 1) == (SEND_NOW, [1])
+
+    async def test_user_is_throttled(self, redis: Redis) -> None:
+        await register_typing(redis, CHANNEL_ID, 1)
+
+        assert await register_typing(redis, CHANNEL_ID, 1) == (0, None)
+
+    async def test_signals_are_coalesced_per_channel(self, redis: Redis) -> None:
+        await register_typing(redis, CHANNEL_ID, 1)
+
+        status, delay_ms = await register_typing(redis, CHANNEL_ID, 2)
+        assert status == SEND_LATER
+        assert 0 < delay_ms <= 200
+        # Досылку уже взяло на себя другое соединение
+        assert await register_typing(redis, CHANNEL_ID, 3) == (0, None)
+
+        assert sorted(await flush_typing(redis, CHANNEL_ID, delay_ms)) == [1, 2, 3]
+
+    async def test_flush_skipped_after_event(self, redis: Redis) -> None:
+        await register_typing(redis, CHANNEL_ID, 1)
+        _, delay_ms = await register_typing(redis, CHANNEL_ID, 2)
+        await redis.delete(f'{typing_key(CHANNEL_ID)}:gate')
+        # Следующий сигнал открыл gate и сам отправил событие со всеми печатающими
+        assert (await register_typing(redis, CHANNEL_ID, 3))[0] == SEND_NOW
+
+        assert await flush_typing(redis, CHANNEL_ID, delay_ms) is None
+
+    async def test_keys_expire(self, redis: Redis) -> None:
+        await register_typing(redis, CHANNEL_ID, 1)
+
+        async for key in redis.scan_iter(f'{typing_key(CHANNEL_ID)}*'):
+            assert await redis.pttl(key) > 0
@@ -1,6 +1,7 @@
 import logging
 from typing import cast
-from uuid import UUID
+from unittest.mock import AsyncMock, patch
+from uuid import UUID, uuid4
 
 import pytest
 from django.urls import reverse
@@ -9,10 +10,13 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.test import APIClient
 
+from common.json import loads
+from common.redis import get_redis
 from invitations.tests.factories import InvitationFactory
 from text_channels.models import Channel, ChannelMembership
 from text_channels.serializers import ChannelMembershipSerializer, ChannelSerializer
 from text_channels.tests.factories import ChannelFactory, ChannelMembershipFactory
+from text_messages.tests.factories import MessageFactory
 from users.tests.factories import UserFactory
 
 logger = logging.getLogger(__name__)
@@ -47,8 +51,32 @@ class TestChannelView:
         response = cast(Response, authenticated_client.get(url))
 
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) == 1  # type: ignore
-        assert response.data[0]["uuid"] == str(channel.uuid)  # type: ignore
+        assert len(response.data["results"]) == 1  # type: ignore
+        assert response.data["results"][0]["uuid"] == str(channel.uuid)  # type: ignore
+
+    def test_list_channels_fixed_queries(
+        self, authenticated_client: APIClient, user: UserFactory, settings, django_assert_num_queries,
+    ) -> None:
+        settings.CHANNEL_MEMBERS_PREVIEW_SIZE = 2
+        for members in (1, 4):
+            channel = ChannelFactory()
+            ChannelMembershipFactory(user=user, channel=channel)
+            ChannelMembershipFactory.create_batch(members - 1, channel=channel)
+            MessageFactory(channel=channel)
+        url = reverse("channels-list")
+
+        # Страница (она же валидаторы ETag), каналы промахов кэша и превью участников; последние сообщения - из снимков
+        with django_assert_num_queries(3):
+            response = cast(Response, authenticated_client.get(url))
+        ChannelMembershipFactory(user=user, channel=ChannelFactory())
+        with django_assert_num_queries(3):
+            authenticated_client.get(url)
+
+        small, large = response.data["results"][1], response.data["results"][0]  # type: ignore
+        assert (small["users_count"], len(small["users"])) == (1, 1)
+        assert (large["users_count"], len(large["users"])) == (4, 2)
+        assert small["users"][0]["id"] == user.pk
+        assert large["last_message"] is not None
 
     def test_create_channel_authenticated(
         self, authenticated_client: APIClient, user: UserFactory
@@ -132,8 +160,10 @@ class TestChannelConnectView:
         assert ChannelMembership.objects.filter(
             user=user, channel=channel
         ).exists()
+        channel.refresh_from_db()
         serializer = ChannelSerializer(channel)
         assert response.data == serializer.data
+        assert response.data["users_count"] == 1  # type: ignore
 
     def test_connect_with_expired_invitation(
         self, authenticated_client: APIClient, user: UserFactory
@@ -162,6 +192,67 @@ class TestChannelConnectView:
         assert "Вы уже в этом канале" in str(response.data)
 
 
+@pytest.mark.django_db
+class TestChannelMemberListView:
+    def test_cursor_pagination(self, authenticated_client: APIClient, user: UserFactory) -> None:
+        channel = ChannelFactory()
+        ChannelMembershipFactory(user=user, channel=channel, is_admin=True)
+        ChannelMembershipFactory.create_batch(4, channel=channel)
+        url = reverse("channel-members-list", kwargs={"channel_uuid": channel.uuid})
+
+        user_ids = []
+        response = cast(Response, authenticated_client.get(url, {"limit": 2}))
+        while True:
+            assert response.status_code == status.HTTP_200_OK
+            user_ids += [member["user"]["id"] for member in response.data["results"]]  # type: ignore
+            if not response.data["next"]:  # type: ignore
+                break
+            response = cast(Response, authenticated_client.get(response.data["next"]))  # type: ignore
+
+        assert user_ids == sorted(ChannelMembership.objects.filter(channel=channel).values_list("user_id", flat=True))
+        assert set(response.data["results"][0]) == {"user", "is_admin", "created_at"}  # type: ignore
+
+    def test_username_prefix_search(self, authenticated_client: APIClient, user: UserFactory) -> None:
+        channel = ChannelFactory()
+        ChannelMembershipFactory(user=user, channel=channel)
+        for username in ("Alice", "alina", "bob", "x_ali"):
+            ChannelMembershipFactory(user=UserFactory(username=username), channel=channel)
+        url = reverse("channel-members-list", kwargs={"channel_uuid": channel.uuid})
+
+        response = cast(Response, authenticated_client.get(url, {"q": "ali"}))
+
+        assert {member["user"]["username"] for member in response.data["results"]} == {"Alice", "alina"}  # type: ignore
+
+    def test_non_member(self, authenticated_client: APIClient) -> None:
+        channel = ChannelFactory()
+        ChannelMembershipFactory(channel=channel)
+        url = reverse("channel-members-list", kwargs={"channel_uuid": channel.uuid})
+
+        response = cast(Response, authenticated_client.get(url))
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_unknown_channel(self, authenticated_client: APIClient) -> None:
+        url = reverse("channel-members-list", kwargs={"channel_uuid": uuid4()})
+
+        response = cast(Response, authenticated_client.get(url))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_channel_payload_without_members(
+        self, authenticated_client: APIClient, user: UserFactory, settings,
+    ) -> None:
+        settings.CHANNEL_MEMBERS_PREVIEW_SIZE = 0
+        channel = ChannelFactory()
+        ChannelMembershipFactory(user=user, channel=channel)
+        ChannelMembershipFactory(channel=channel)
+
+        response = cast(Response, authenticated_client.get(reverse("channels-list")))
+
+        assert response.data["results"][0]["users"] == []  # type: ignore
+        assert response.data["results"][0]["users_count"] == 2  # type: ignore
+
+
 @pytest.mark.django_db
 class TestChannelDisconnectView:
     def test_disconnect_from_channel(
@@ -189,3 +280,85 @@ class TestChannelDisconnectView:
         response = cast(Response, authenticated_client.delete(url))
 
         assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.fixture
+def clean_read_state():
+    redis = get_redis()
+    for key in redis.scan_iter('read_state:*'):
+        redis.delete(key)
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('clean_read_state')
+class TestChannelReadView:
+    def test_unread_count_in_channel_list(
+        self, authenticated_client: APIClient, user: UserFactory
+    ) -> None:
+        channel = ChannelFactory()
+        ChannelMembershipFactory(user=user, channel=channel)
+        MessageFactory.create_batch(5, channel=channel)
+        ChannelMembership.objects.filter(user=user, channel=channel).update(last_read_number=2)
+        response = cast(Response, authenticated_client.get(reverse("channels-list")))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["results"][0]["unread_count"] == 3  # type: ignore
+
+    def test_mark_read(
+        self, authenticated_client: APIClient, user: UserFactory
+    ) -> None:
+        channel = ChannelFactory()
+        ChannelMembershipFactory(user=user, channel=channel)
+        MessageFactory.create_batch(5, channel=channel)
+        url = reverse("channels-read", kwargs={"channel_uuid": channel.uuid})
+        with patch("text_channels.read_state.get_channel_layer") as get_channel_layer:
+            get_channel_layer.return_value.group_send = AsyncMock()
+            response = cast(Response, authenticated_client.post(url, {"number": 2}, format="json"))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {  # type: ignore
+            "channel": str(channel.uuid),
+            "last_read_number": 3,
+            "unread_count": 2,
+        }
+        group_name, event = get_channel_layer.return_value.group_send.await_args.args
+        assert group_name == f"websocket_user_{user.pk}"
+        assert loads(event["text"]) == {"type": "channel_read", "data": response.data}  # type: ignore
+
+    def test_mark_read_is_monotonic_and_coalesced(
+        self, authenticated_client: APIClient, user: UserFactory
+    ) -> None:
+        channel = ChannelFactory()
+        ChannelMembershipFactory(user=user, channel=channel)
+        MessageFactory.create_batch(5, channel=channel)
+        url = reverse("channels-read", kwargs={"channel_uuid": channel.uuid})
+        with patch("text_channels.read_state.get_channel_layer") as get_channel_layer:
+            get_channel_layer.return_value.group_send = AsyncMock()
+            authenticated_client.post(url, {"number": 100}, format="json")
+            response = cast(Response, authenticated_client.post(url, {"number": 1}, format="json"))
+
+        assert response.data["last_read_number"] == 5  # type: ignore
+        assert response.data["unread_count"] == 0  # type: ignore
+        get_channel_layer.return_value.group_send.assert_awaited_once()
+
+    def test_mark_read_non_member(
+        self, authenticated_client: APIClient, user: UserFactory
+    ) -> None:
+        channel = ChannelFactory()
+        url = reverse("channels-read", kwargs={"channel_uuid": channel.uuid})
+        response = cast(Response, authenticated_client.post(url, {"number": 1}, format="json"))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_connect_marks_history_read(
+        self, authenticated_client: APIClient, user: UserFactory
+    ) -> None:
+        channel = ChannelFactory()
+        MessageFactory.create_batch(3, channel=channel)
+        invitation = InvitationFactory(channel=channel)
+        url = reverse(
+            "channel-invitations-connect", kwargs={"invitation_uuid": invitation.uuid}
+        )
+        authenticated_client.post(url)
+
+        assert ChannelMembership.objects.get(user=user, channel=channel).last_read_number == 3
@@ -0,0 +1,112 @@
+"""
+Индикатор набора текста: только Redis, без Postgres.
+
+Клиент шлёт в ws/main/ {"type": "typing", "data": {"channel": uuid}} хоть на каждое нажатие клавиши.
+- `typing:<channel_pk>:<user_id>` - троттлинг пользователя в канале: сигналы чаще TYPING_THROTTLE_INTERVAL отбрасываются;
+- `typing:<channel_pk>` - кто печатает (sorted set, score - время сигнала), записи старше TYPING_TTL вычищаются;
+- `typing:<channel_pk>:gate` - не больше одного события typing на канал за TYPING_EVENT_INTERVAL;
+- `typing:<channel_pk>:pending` - сигнал пришёл при закрытом gate, одно соединение досылает событие
+  после интервала, чтобы последний сигнал не потерялся.
+
+Событие typing содержит всех, кто печатал за последние TYPING_TTL секунд, клиент показывает
+индикатор до следующего события или TYPING_TTL. Все ключи живут с TTL и исчезают сами.
+"""
+import asyncio
+import logging
+import time
+
+from django.conf import settings
+from redis.asyncio.client import Redis
+
+logger = logging.getLogger(__name__)
+
+# KEYS: троттлинг пользователя, кто печатает, gate канала, pending канала
+# ARGV: user_id, сейчас (мс), троттлинг (мс), TTL (мс), интервал событий (мс)
+# Возвращает {1, user_id, ...} - отправить событие сейчас, {2, мс} - дослать через мс, {0} - ничего
+TYPING_SCRIPT = """
+if not redis.call('SET', KEYS[1], 1, 'NX', 'PX', ARGV[3]) then
+    return {0}
+end
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', tonumber(ARGV[2]) - tonumber(ARGV[4]))
+redis.call('PEXPIRE', KEYS[2], ARGV[4])
+if redis.call('SET', KEYS[3], 1, 'NX', 'PX', ARGV[5]) then
+    redis.call('DEL', KEYS[4])
+    local result = redis.call('ZRANGE', KEYS[2], 0, -1)
+    table.insert(result, 1, 1)
+    return result
+end
+-- pending живёт дольше gate, чтобы досылающее соединение застало его после интервала
+if redis.call('SET', KEYS[4], 1, 'NX', 'PX', tonumber(ARGV[5]) * 2) then
+    return {2, math.max(redis.call('PTTL', KEYS[3]), 1)}
+end
+return {0}
+"""
+
+# KEYS: кто печатает, gate канала, pending канала. ARGV: сейчас (мс), TTL (мс), интервал событий (мс)
+# Возвращает {1, user_id, ...} - отправить событие, {2, мс} - gate ещё закрыт,
+# {0} - событие со всеми печатающими уже отправил кто-то другой (pending снят)
+FLUSH_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    return {0}
+end
+if not redis.call('SET', KEYS[2], 1, 'NX', 'PX', ARGV[3]) then
+    return {2, math.max(redis.call('PTTL', KEYS[2]), 1)}
+end
+redis.call('DEL', KEYS[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', tonumber(ARGV[1]) - tonumber(ARGV[2]))
+local result = redis.call('ZRANGE', KEYS[1], 0, -1)
+table.insert(result, 1, 1)
+return result
+"""
+
+SEND_NOW = 1
+SEND_LATER = 2
+# Сколько раз досылающее соединение ждёт освобождения gate
+FLUSH_ATTEMPTS = 3
+
+
+def typing_key(channel_id: int) -> str:
+    return f'typing:{channel_id}'
+
+
+def _ms(seconds: float) -> int:
+    return int(seconds * 1000)
+
+
+def _result(result: list) -> tuple[int, list[int] | int | None]:
+    status = int(result[0])
+    if status == SEND_NOW:
+        return status, [int(user_id) for user_id in result[1:]]
+    if status == SEND_LATER:
+        return status, int(result[1])
+    return status, None
+
+
+async def register_typing(redis: Redis, channel_id: int, user_id: int) -> tuple[int, list[int] | int | None]:
+    """
+    Сигнал набора текста. (SEND_NOW, печатающие) - событие нужно отправить сейчас,
+    (SEND_LATER, мс) - этому соединению дослать событие через `flush_typing`, (0, None) - ничего.
+    """
+    key = typing_key(channel_id)
+    result = await redis.eval(
+        TYPING_SCRIPT, 4, f'{key}:{user_id}', key, f'{key}:gate', f'{key}:pending',
+        user_id, _ms(time.time()), _ms(settings.TYPING_THROTTLE_INTERVAL),
+        _ms(settings.TYPING_TTL), _ms(settings.TYPING_EVENT_INTERVAL),
+    )
+    return _result(result)
+
+
+async def flush_typing(redis: Redis, channel_id: int, delay_ms: int) -> list[int] | None:
+    """Досылка после закрытого gate: печатающие для события или None, если событие уже ушло."""
+    key = typing_key(channel_id)
+    for _ in range(FLUSH_ATTEMPTS):
+        await asyncio.sleep(delay_ms / 1000)
+        status, value = _result(await redis.eval(
+            FLUSH_SCRIPT, 3, key, f'{key}:gate', f'{key}:pending',
+            _ms(time.time()), _ms(settings.TYPING_TTL), _ms(settings.TYPING_EVENT_INTERVAL),
+        ))
+        if status != SEND_LATER:
+            return value or None
+        delay_ms = value
+    return None
@@ -6,6 +6,8 @@ from .views import (
     ChannelConnectView,
     ChannelCreateDeleteBanView,
     ChannelDisconnectView,
+    ChannelMemberListView,
+    ChannelReadView,
     ChannelView,
 )
 
@@ -20,6 +22,16 @@ urlpatterns = [
         ChannelView.as_view({'get': 'retrieve', 'patch': 'update', 'delete': 'destroy'}),
         name='channels-detail'
     ),
+    path(
+        'api/channels/<uuid:channel_uuid>/read/',
+        ChannelReadView.as_view(),
+        name='channels-read'
+    ),
+    path(
+        'api/channels/<uuid:channel_uuid>/members/',
+        ChannelMemberListView.as_view(),
+        name='channel-members-list'
+    ),
     path(
         'api/channels/connect/<uuid:invitation_uuid>/',
         ChannelConnectView.as_view(),
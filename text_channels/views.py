@@ -5,40 +5,106 @@ from typing import cast
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from channels_redis.core import RedisChannelLayer
+from django.conf import settings
 from django.db import transaction
-from django.db.models import F
+from django.db.models import F, Prefetch
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import OpenApiParameter, extend_schema
 from rest_framework import mixins, status
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.generics import GenericAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
+from common.conditional import ConditionalListMixin
+from common.events import encode_event
 from invitations.models import Invitation, InvitationAcceptance
 from text_channels.models import ChannelBan
 from users.models import User
+from users.serializers import avatar_path, avatar_url
 
+from . import payload_cache
 from .models import Channel, ChannelMembership
-from .permissions import CanManageBans, CanManageChannel
+from .pagination import ChannelInboxPagination, ChannelMemberPagination
+from .permissions import CanManageBans, CanManageChannel, IsChannelMember
+from .read_state import get_last_read_number, get_read_state, mark_read, send_read_state
 from .serializers import (ChannelBanSerializer, ChannelCreateSerializer,
+                          ChannelMemberSerializer,
                           ChannelMembershipCreateSerializer,
-                          ChannelMembershipSerializer, ChannelSerializer)
+                          ChannelMembershipSerializer, ChannelReadSerializer,
+                          ChannelReadStateSerializer, ChannelSerializer,
+                          members_queryset)
 
 logger = logging.getLogger(__name__)
 
+MEMBER_SEARCH_QUERY_PARAM = 'q'
+
+
+class ChannelPayloadCacheMixin:
+    """
+    Список каналов из фрагментов text_channels.payload_cache и полей пользователя.
+    Аватар владельца во фрагменте без хоста (avatar_path), абсолютным он становится для каждого запроса.
+    Страница читается без колонок фрагмента, сами каналы с превью участников - только для промахов
+    и уже после чтения версий: изменение между страницей и версиями поднимет версию, а не ляжет под новой
+    версией устаревшим фрагментом.
+    """
+
+    def get_page(self) -> list[Channel]:
+        """
+        Каналы страницы: порядок, курсор, поля пользователя и счётчики для ETag, без владельца, снимка и превью.
+        Запрашивается один раз за запрос.
+        """
+        if not hasattr(self, '_page'):
+            queryset = self.get_queryset().prefetch_related(None).select_related(None).only(
+                'uuid', 'last_message_number', 'member_count', 'updated_at',
+            )
+            self._page = self.paginate_queryset(self.filter_queryset(queryset))
+        return self._page
+
+    def render_channels(self, page: list[Channel]) -> list[dict]:
+        fragments, versions = payload_cache.get_fragments(page)
+        miss_ids = [channel.pk for channel in page if channel.pk not in fragments]
+        if miss_ids:
+            misses = list(self.get_queryset().filter(pk__in=miss_ids))
+            rendered = {}
+            for channel, data in zip(misses, self.get_serializer(misses, many=True).data):
+                rendered[channel.pk] = {
+                    name: avatar_path(value, self.request) if name == 'owner' else value
+                    for name, value in data.items() if name not in ChannelSerializer.per_user_fields
+                }
+            payload_cache.store_fragments(rendered, versions)
+            fragments.update(rendered)
+
+        serializer = ChannelSerializer()
+        return [
+            {
+                **fragments[channel.pk],
+                'owner': avatar_url(fragments[channel.pk]['owner'], self.request),
+                **{name: getattr(serializer, f'get_{name}')(channel) for name in ChannelSerializer.per_user_fields},
+            }
+            for channel in page
+        ]
+
+    def list(self, request: Request, *args, **kwargs):
+        if not payload_cache.is_enabled():
+            return super().list(request, *args, **kwargs)
+        return self.get_paginated_response(self.render_channels(self.get_page()))
+
 
 class ChannelView(
+    ConditionalListMixin,
+    ChannelPayloadCacheMixin,
     ModelViewSet,
 ):
     """
-    Вьюшка для CRUD операций с каналами
+    Вьюшка для CRUD операций с каналами.
+    Список - инбокс пользователя (text_channels.inbox): от последней активности, постранично курсором.
     """
     permission_classes = [IsAuthenticated, CanManageChannel]
-    pagination_class = None
+    pagination_class = ChannelInboxPagination
     http_method_names = ['get', 'post', 'patch', 'delete']
     lookup_field = 'uuid'
     lookup_url_kwarg = 'channel_uuid'
@@ -49,7 +115,46 @@ class ChannelView(
         return ChannelSerializer
 
     def get_queryset(self):
-        return Channel.objects.filter(memberships__user=self.request.user).exclude(bans_info__user=self.request.user).order_by('-id')
+        queryset = Channel.objects.filter(
+            memberships__user=self.request.user,
+        ).exclude(
+            bans_info__user=self.request.user,
+        ).select_related('owner', 'last_message_author').annotate(
+            # Соединение с memberships уже есть из фильтра, отдельного сканирования нет
+            unread_count=F('last_message_number') - F('memberships__last_read_number'),
+            last_activity_at=F('memberships__last_activity_at'),
+        ).order_by('-last_activity_at', '-id')
+        if self.action in ('list', 'retrieve') and settings.CHANNEL_MEMBERS_PREVIEW_SIZE:
+            queryset = queryset.prefetch_related(self.get_members_prefetch())
+        return queryset
+
+    def get_members_prefetch(self) -> Prefetch:
+        """Превью участников всех каналов одним запросом (ROW_NUMBER() по каналу)."""
+        return Prefetch(
+            'memberships',
+            queryset=members_queryset()[:settings.CHANNEL_MEMBERS_PREVIEW_SIZE],
+            to_attr='members_preview',
+        )
+
+    def get_list_validators(self, request: Request):
+        """
+        Запрошенная страница без сериализации (та же отдаётся списком): активность и непрочитанное пользователя
+        и поддерживаемые поля канала. last_message_number растёт с новым сообщением, member_count и updated_at -
+        со вступлением и выходом, updated_at ещё и с переименованием, правкой и удалением сообщения и изменением
+        профиля участника, владельца или автора последнего сообщения (touch_user_channels).
+        """
+        key = [
+            (
+                channel.pk,
+                channel.last_activity_at,
+                channel.unread_count,
+                channel.last_message_number,
+                channel.member_count,
+                channel.updated_at,
+            )
+            for channel in self.get_page()
+        ]
+        return request.user.pk, key, self.paginator.get_next_link(), self.paginator.get_previous_link()
 
     def perform_create(self, serializer: ChannelCreateSerializer):
         user = self.request.user
@@ -118,6 +223,8 @@ class ChannelConnectView(
             serializer.save(
                 user=self.request.user,
                 channel=invitation.channel,
+                # История до вступления непрочитанной не считается
+                last_read_number=invitation.channel.last_message_number,
             )
             InvitationAcceptance.objects.get_or_create(
                 user=self.request.user,
@@ -139,7 +246,10 @@ class ChannelConnectView(
             group_name,
             {
                 "type": "subscribe_channel",
-                "channel_pk": channel.pk
+                "channel_pk": channel.pk,
+                "channel_uuid": str(channel.uuid),
+                # Фрейм для участников канала кодируется здесь один раз
+                "notification": encode_event("chat_subscribe", {"user": user.pk, "channel": channel.pk}),
             }
         )
 
@@ -181,11 +291,68 @@ class ChannelDisconnectView(
             group_name,
             {
                 "type": "unsubscribe_channel",
-                "channel_pk": channel_membership.channel.pk
+                "channel_pk": channel_membership.channel.pk,
+                "channel_uuid": str(channel_membership.channel.uuid),
+                "notification": encode_event("chat_unsubscribe", {
+                    "user": channel_membership.user.pk,
+                    "channel": channel_membership.channel.pk,
+                }),
             }
         )
 
 
+class ChannelReadView(GenericAPIView):
+    """
+    Отметка прочитанных сообщений канала. Счётчик только растёт,
+    изменение рассылается во все соединения пользователя событием channel_read.
+    """
+    serializer_class = ChannelReadSerializer
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        request=ChannelReadSerializer,
+        responses=ChannelReadStateSerializer,
+    )
+    def post(self, request: Request, channel_uuid: uuid.UUID, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        result = mark_read(request.user.pk, channel_uuid, serializer.validated_data['number'])
+        if result is None:
+            raise NotFound("Вы не состоите в этом канале")
+        channel, last_read_number = result
+        if last_read_number is None:
+            last_read_number = get_last_read_number(request.user.pk, channel)
+        else:
+            async_to_sync(send_read_state)(request.user.pk, channel, last_read_number)
+        return Response(ChannelReadStateSerializer(get_read_state(channel, last_read_number)).data)
+
+
+class ChannelMemberListView(
+    GenericAPIView,
+    mixins.ListModelMixin,
+):
+    """
+    Участники канала постранично, с поиском по началу username (`q`)
+    """
+    serializer_class = ChannelMemberSerializer
+    permission_classes = [IsAuthenticated, IsChannelMember]
+    pagination_class = ChannelMemberPagination
+
+    def get_queryset(self):
+        queryset = members_queryset().filter(channel__uuid=self.kwargs['channel_uuid'])
+        prefix = self.request.query_params.get(MEMBER_SEARCH_QUERY_PARAM, '').strip()
+        if prefix:
+            queryset = queryset.filter(user__username__istartswith=prefix)
+        return queryset
+
+    @extend_schema(
+        parameters=[OpenApiParameter(MEMBER_SEARCH_QUERY_PARAM, str, description='Начало username')],
+    )
+    def get(self, request, channel_uuid: uuid.UUID, *args, **kwargs):
+        return super().list(request, channel_uuid=channel_uuid, *args, **kwargs)
+
+
 class ChannelBanListView(
     GenericAPIView,
     mixins.ListModelMixin,
@@ -227,9 +394,9 @@ class ChannelCreateDeleteBanView(
         if user.pk == banned_by.pk:
             raise ValidationError("Нельза забанить себя.")
 
-        user_channel_membership = ChannelMembership.objects.filter(
+        # Через channel.memberships у членства закэширован этот же канал, его member_count уменьшится при delete()
+        user_channel_membership = channel.memberships.filter(
             user=user,
-            channel=channel,
             is_admin=False,
         ).first()
         if not user_channel_membership:
@@ -4,7 +4,7 @@ from django.contrib import admin
 from text_channels.models import Channel
 from users.models import User
 
-from .models import Message
+from .models import Message, MessageArchiveSegment
 
 
 @admin.register(Message)
@@ -30,3 +30,12 @@ class MessageAdmin(admin.ModelAdmin):
         elif db_field.name == 'channel':
             kwargs['queryset'] = Channel.objects.order_by('name')
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+@admin.register(MessageArchiveSegment)
+class MessageArchiveSegmentAdmin(admin.ModelAdmin):
+    list_display = ('channel', 'first_number', 'last_number', 'messages_count', 'created_at')
+    list_filter = ('channel__name', )
+    readonly_fields = ('channel', 'first_number', 'last_number', 'messages_count', 'created_at', 'updated_at')
+    exclude = ('data', )
+    ordering = ('channel', '-first_number')
@@ -0,0 +1,65 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+
+class BaseNumberAllocator:
+    """
+    Выдаёт порядковые номера сообщений (`Message.number`) внутри канала.
+
+    Вызывается внутри транзакции, в которой создаются сообщения: номера должны
+    идти подряд и без пропусков, поэтому откат вставки откатывает и выдачу номеров.
+    """
+
+    def allocate(self, channel_id: int, count: int = 1) -> int:
+        """Резервирует `count` номеров подряд и возвращает первый из них."""
+        raise NotImplementedError
+
+
+class ChannelCounterAllocator(BaseNumberAllocator):
+    """
+    Один `UPDATE ... RETURNING` по счётчику `Channel.last_message_number`.
+
+    Строка канала блокируется только на время вставки сообщения, без отдельного
+    SELECT FOR UPDATE и без перезаписи остальных колонок канала.
+    """
+
+    def allocate(self, channel_id: int, count: int = 1) -> int:
+        from text_channels.models import Channel
+
+        quote_name = connection.ops.quote_name
+        table = quote_name(Channel._meta.db_table)
+        column = quote_name('last_message_number')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET {column} = {column} + %s WHERE {quote_name("id")} = %s RETURNING {column}',
+                [count, channel_id],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            raise Channel.DoesNotExist(f"Channel {channel_id} does not exist")
+        return row[0] - count
+
+
+class SelectForUpdateAllocator(BaseNumberAllocator):
+    """Прежняя схема: SELECT FOR UPDATE канала и сохранение счётчика. Оставлена для сравнения."""
+
+    def allocate(self, channel_id: int, count: int = 1) -> int:
+        from text_channels.models import Channel
+
+        channel = Channel.objects.select_for_update().only('last_message_number').get(pk=channel_id)
+        number = channel.last_message_number
+        channel.last_message_number += count
+        channel.save(update_fields=('last_message_number', ))
+        return number
+
+
+@lru_cache
+def _load_allocator(path: str) -> BaseNumberAllocator:
+    return import_string(path)()
+
+
+def get_number_allocator() -> BaseNumberAllocator:
+    return _load_allocator(settings.MESSAGE_NUMBER_ALLOCATOR)
@@ -0,0 +1,150 @@
+"""
+Холодный архив старой истории каналов.
+
+Чаще всего читаются последние сотни сообщений канала, поэтому всё, что старше
+`MESSAGE_ARCHIVE_KEEP_RECENT` последних номеров, переносится сегментами по
+`MESSAGE_ARCHIVE_SEGMENT_SIZE` сообщений в `MessageArchiveSegment` и удаляется из таблицы Message.
+Номера сообщений идут без пропусков, поэтому "дыра" в номерах горячей таблицы означает,
+что эти сообщения лежат в архиве: пагинатор дочитывает их из сегментов.
+Архивные сообщения доступны только для чтения.
+"""
+import json
+import uuid
+import zlib
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils.dateparse import parse_datetime
+
+from text_channels.models import Channel
+from users.models import User
+from users.serializers import UserSerializer
+
+from .models import Message, MessageArchiveSegment
+
+
+def compress_messages(messages: list[Message]) -> bytes:
+    """Текст удалённых сообщений в сегмент не попадает: из архива его уже не вычистит compact_deleted_messages."""
+    lines = []
+    for message in messages:
+        lines.append(json.dumps({
+            'id': message.pk,
+            'uuid': str(message.uuid),
+            'user_id': message.user_id,
+            'content': '' if message.is_deleted else message.content,
+            'created_at': message.created_at.isoformat(),
+            'updated_at': message.updated_at.isoformat() if message.updated_at else None,
+            'is_deleted': message.is_deleted,
+            'number': message.number,
+            'version': message.version,
+        }, ensure_ascii=False))
+    return zlib.compress('\n'.join(lines).encode())
+
+
+def decompress_messages(data: bytes, channel: Channel) -> list[Message]:
+    """Сообщения сегмента без пользователей, по возрастанию номера."""
+    messages = []
+    for line in zlib.decompress(bytes(data)).decode().splitlines():
+        row = json.loads(line)
+        messages.append(Message(
+            id=row['id'],
+            uuid=uuid.UUID(row['uuid']),
+            channel=channel,
+            user_id=row['user_id'],
+            content=row['content'],
+            created_at=parse_datetime(row['created_at']),
+            updated_at=parse_datetime(row['updated_at']) if row['updated_at'] else None,
+            is_deleted=row['is_deleted'],
+            number=row['number'],
+            version=row.get('version', 0),
+        ))
+    return messages
+
+
+def get_archived_messages(
+    channel: Channel,
+    *,
+    before: int,
+    after: int = -1,
+    limit: int,
+    descending: bool = True,
+) -> list[Message]:
+    """
+    До `limit` архивных сообщений канала с номерами в интервале (after, before).
+    Сегменты читаются по одному, пока не наберётся страница.
+    """
+    messages: list[Message] = []
+    segments = MessageArchiveSegment.objects.filter(channel=channel).only('first_number', 'last_number', 'data')
+    lower, upper = after, before
+    while len(messages) < limit and upper - lower > 1:
+        if descending:
+            segment = segments.filter(first_number__lt=upper).order_by('-first_number').first()
+        else:
+            segment = segments.filter(last_number__gt=lower).order_by('first_number').first()
+        if segment is None:
+            break
+
+        rows = [row for row in decompress_messages(segment.data, channel) if lower < row.number < upper]
+        if descending:
+            messages.extend(reversed(rows))
+            upper = segment.first_number
+        else:
+            messages.extend(rows)
+            lower = segment.last_number
+    messages = messages[:limit]
+
+    user_ids = {message.user_id for message in messages if message.user_id is not None}
+    users = User.objects.only(*UserSerializer.Meta.fields).in_bulk(user_ids) if user_ids else {}
+    for message in messages:
+        message.user = users.get(message.user_id)
+    return messages
+
+
+def archive_channel(channel_id: int) -> int:
+    """Переносит в архив все целые сегменты старше порога. Возвращает количество новых сегментов."""
+    keep_recent = settings.MESSAGE_ARCHIVE_KEEP_RECENT
+    segment_size = settings.MESSAGE_ARCHIVE_SEGMENT_SIZE
+    created = 0
+    while True:
+        with transaction.atomic():
+            channel = Channel.objects.only('last_message_number').get(pk=channel_id)
+            first_number = (
+                Message.objects.filter(channel_id=channel_id).order_by('number').values_list('number', flat=True).first()
+            )
+            if first_number is None:
+                return created
+            end = (first_number // segment_size + 1) * segment_size
+            if end > channel.last_message_number - keep_recent:
+                return created
+
+            messages = list(
+                Message.objects
+                .select_for_update()
+                .filter(channel_id=channel_id, number__gte=first_number, number__lt=end)
+                .order_by('number')
+            )
+            if not messages:
+                # Сегмент уже заархивирован параллельной задачей
+                continue
+            MessageArchiveSegment.objects.create(
+                channel_id=channel_id,
+                first_number=messages[0].number,
+                last_number=messages[-1].number,
+                messages_count=len(messages),
+                data=compress_messages(messages),
+            )
+            Message.objects.filter(channel_id=channel_id, number__gte=first_number, number__lt=end).delete()
+            created += 1
+
+
+def get_channels_to_archive():
+    """Каналы, в которых хотя бы один сегмент уже целиком старше порога."""
+    threshold = settings.MESSAGE_ARCHIVE_KEEP_RECENT + settings.MESSAGE_ARCHIVE_SEGMENT_SIZE - 1
+    old_messages = Message.objects.filter(
+        channel=OuterRef('pk'),
+        number__lt=OuterRef('last_message_number') - threshold,
+    )
+    return Channel.objects.filter(
+        last_message_number__gt=threshold,
+    ).filter(Exists(old_messages)).values_list('pk', flat=True)
@@ -0,0 +1,181 @@
+"""
+Кэш самой новой страницы истории канала.
+
+В Redis-списке `message_cache:<channel_uuid>` лежат последние MESSAGE_CACHE_SIZE сообщений
+канала, уже сериализованные MessageSerializer, от новых к старым. Список пополняется
+после коммита при создании сообщений, правится на месте при редактировании и удалении
+и прогревается первой же страницей, прочитанной из базы.
+
+Номера сообщений идут без пропусков, поэтому кэш считается верным, только если его
+голова совпадает с `Channel.last_message_number - 1`, а сообщение с номером не на своём месте
+сбрасывает список целиком. Счётчик `message_cache:<channel_uuid>:generation` растёт при каждой
+записи: прогрев страницей, прочитанной до правки, такую правку не затрёт.
+Профиль автора (UserSerializer) в сообщениях не отслеживается: при его изменении кэш каналов
+автора сбрасывается целиком (`drop_channels`).
+При недоступном Redis кэш просто не используется.
+"""
+import logging
+
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from common.json import dumps, loads
+from common.redis import get_redis
+from text_channels.models import Channel
+
+logger = logging.getLogger(__name__)
+
+# KEYS: список, счётчик записей. ARGV: номер первого сообщения, размер, TTL, сообщения по возрастанию номера
+PUSH_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+local head = redis.call('LINDEX', KEYS[1], 0)
+local expected = head and cjson.decode(head)['number'] + 1 or 0
+if tonumber(ARGV[1]) ~= expected then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+for i = 4, #ARGV do
+    redis.call('LPUSH', KEYS[1], ARGV[i])
+end
+redis.call('LTRIM', KEYS[1], 0, tonumber(ARGV[2]) - 1)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+# KEYS: список, счётчик записей. ARGV: номер сообщения, TTL, новое представление сообщения
+PATCH_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+local head = redis.call('LINDEX', KEYS[1], 0)
+if not head then
+    return 0
+end
+local index = cjson.decode(head)['number'] - tonumber(ARGV[1])
+local current = index >= 0 and redis.call('LINDEX', KEYS[1], index)
+if not current or cjson.decode(current)['number'] ~= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('LSET', KEYS[1], index, ARGV[3])
+return 1
+"""
+
+# KEYS: список, счётчик записей. ARGV: счётчик на момент чтения из базы, размер, TTL, сообщения от новых к старым
+FILL_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('RPUSH', KEYS[1], unpack(ARGV, 4))
+redis.call('LTRIM', KEYS[1], 0, tonumber(ARGV[2]) - 1)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+def _cache_key(channel: Channel) -> str:
+    return f'message_cache:{channel.uuid}'
+
+
+def _generation_key(channel: Channel) -> str:
+    return f'message_cache:{channel.uuid}:generation'
+
+
+def is_enabled() -> bool:
+    return settings.MESSAGE_CACHE_SIZE > 0
+
+
+def get_cached_page(channel: Channel, limit: int) -> tuple[list[dict] | None, str | None]:
+    """
+    Самые новые `limit` сообщений канала из кэша и счётчик записей для прогрева.
+    Страница None - кэш холодный или отстал от канала, счётчик None - Redis недоступен.
+    """
+    if not is_enabled() or limit > settings.MESSAGE_CACHE_SIZE or channel.last_message_number == 0:
+        return None, None
+    try:
+        with get_redis().pipeline(transaction=False) as pipe:
+            pipe.lrange(_cache_key(channel), 0, limit - 1)
+            pipe.get(_generation_key(channel))
+            items, generation = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Message cache is unavailable: {e!r}")
+        return None, None
+
+    generation = generation.decode() if generation else '0'
+    page = [loads(item) for item in items]
+    if not page or page[0]['number'] != channel.last_message_number - 1:
+        return None, generation
+    if len(page) < limit and page[-1]['number'] != 0:
+        return None, generation
+    return page, generation
+
+
+def fill_cache(channel: Channel, page: list[dict], generation: str) -> None:
+    """Прогревает кэш страницей из базы, если с момента чтения счётчика в кэш никто не писал."""
+    if not page:
+        return
+    try:
+        get_redis().eval(
+            FILL_SCRIPT,
+            2,
+            _cache_key(channel),
+            _generation_key(channel),
+            generation,
+            settings.MESSAGE_CACHE_SIZE,
+            settings.MESSAGE_CACHE_TTL,
+            *map(dumps, page),
+        )
+    except RedisError as e:
+        logger.warning(f"Message cache is unavailable: {e!r}")
+
+
+def push_messages(channel: Channel, payloads: list[dict]) -> None:
+    """Добавляет новые сообщения канала (по возрастанию номера). Вызывать после коммита."""
+    if not is_enabled() or not payloads:
+        return
+    try:
+        get_redis().eval(
+            PUSH_SCRIPT,
+            2,
+            _cache_key(channel),
+            _generation_key(channel),
+            payloads[0]['number'],
+            settings.MESSAGE_CACHE_SIZE,
+            settings.MESSAGE_CACHE_TTL,
+            *map(dumps, payloads),
+        )
+    except RedisError as e:
+        logger.warning(f"Message cache is unavailable: {e!r}")
+
+
+def patch_message(channel: Channel, payload: dict) -> None:
+    """Заменяет закэшированное представление изменённого сообщения. Вызывать после коммита."""
+    if not is_enabled():
+        return
+    try:
+        get_redis().eval(
+            PATCH_SCRIPT,
+            2,
+            _cache_key(channel),
+            _generation_key(channel),
+            payload['number'],
+            settings.MESSAGE_CACHE_TTL,
+            dumps(payload),
+        )
+    except RedisError as e:
+        logger.warning(f"Message cache is unavailable: {e!r}")
+
+
+def drop_channels(channels: list[Channel]) -> None:
+    """Сбрасывает кэш каналов: следующая страница прочитается из базы. Вызывать после коммита."""
+    if not is_enabled():
+        return
+    try:
+        with get_redis().pipeline(transaction=False) as pipe:
+            for channel in channels:
+                pipe.incr(_generation_key(channel))
+                pipe.expire(_generation_key(channel), settings.MESSAGE_CACHE_TTL)
+                pipe.delete(_cache_key(channel))
+            pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Message cache is unavailable: {e!r}")
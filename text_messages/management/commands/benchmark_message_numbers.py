@@ -0,0 +1,91 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from text_channels.models import Channel
+from text_messages.models import Message
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк выдачи номеров сообщений: параллельные посты в один канал в секунду'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Количество параллельных писателей в один канал'
+        )
+        parser.add_argument(
+            '--messages',
+            type=int,
+            default=200,
+            help='Количество сообщений на одного писателя'
+        )
+        parser.add_argument(
+            '--allocator',
+            type=str,
+            action='append',
+            help='Путь к классу аллокатора, можно указать несколько раз. По умолчанию MESSAGE_NUMBER_ALLOCATOR'
+        )
+        parser.add_argument(
+            '--i_do_not_use_it_in_the_prod',
+            type=str,
+            required=True,
+            help='НЕ ИСПОЛЬЗОВАТЬ В ПРОДАКШЕНЕ, ЭТО ТОЛЬКО ДЛЯ РАЗРАБОТКИ. Для использования команды передать \"i_understand\"'
+        )
+
+    def handle(self, *args, **kwargs):
+        if kwargs['i_do_not_use_it_in_the_prod'] != 'i_understand':
+            self.stdout.write(self.style.ERROR('Не подтверждено использование команды'))
+            return
+
+        for allocator_path in kwargs['allocator'] or [settings.MESSAGE_NUMBER_ALLOCATOR]:
+            with override_settings(MESSAGE_NUMBER_ALLOCATOR=allocator_path):
+                self._run(allocator_path, kwargs['threads'], kwargs['messages'])
+
+    def _run(self, allocator_path: str, threads_count: int, messages_count: int) -> None:
+        channel = Channel.objects.create(name=f'benchmark-{time.time_ns()}')
+        errors: list[Exception] = []
+
+        def writer():
+            try:
+                for _ in range(messages_count):
+                    Message.objects.create(channel=channel, content='benchmark')
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(threads_count)]
+        try:
+            started_at = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started_at
+
+            total = threads_count * messages_count - len(errors)
+            numbers = list(
+                Message.objects.filter(channel=channel).order_by('number').values_list('number', flat=True)
+            )
+            channel.refresh_from_db(fields=('last_message_number', ))
+            is_gap_free = numbers == list(range(len(numbers))) and channel.last_message_number == len(numbers)
+
+            self.stdout.write(
+                f'{allocator_path}: {total} сообщений, {threads_count} писателей, '
+                f'{elapsed:.2f} с, {total / elapsed:.0f} сообщений/с в канал'
+            )
+            if errors:
+                self.stdout.write(self.style.ERROR(f'Ошибок: {len(errors)}, первая: {errors[0]!r}'))
+            if is_gap_free:
+                self.stdout.write(self.style.SUCCESS('Номера идут подряд без пропусков'))
+            else:
+                self.stdout.write(self.style.ERROR('Найдены пропуски или повторы в номерах'))
+        finally:
+            channel.delete()
@@ -0,0 +1,80 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from text_channels.models import Channel
+from text_messages.models import Message
+from text_messages.serializers import MessageSerializer
+from users.models import User
+
+
+def _build_messages(count: int) -> list[Message]:
+    """Сообщения в памяти, как их отдаёт MessageView: с авторами, правками и удалёнными."""
+    channel = Channel(pk=1, uuid=uuid.uuid4(), name='benchmark')
+    users = [
+        User(pk=pk, username=f'user{pk}', is_staff=pk == 1, avatar=f'avatars/{pk}.png' if pk % 2 else '')
+        for pk in range(1, 21)
+    ]
+    created_at = timezone.now() - timedelta(days=1)
+    messages = []
+    for number in range(count):
+        created_at += timedelta(seconds=1)
+        messages.append(Message(
+            pk=number + 1,
+            uuid=uuid.uuid4(),
+            channel=channel,
+            user=users[number % len(users)] if number % 50 else None,
+            content=f'Сообщение номер {number}',
+            created_at=created_at,
+            updated_at=created_at + timedelta(minutes=1) if number % 10 == 0 else created_at,
+            is_deleted=number % 20 == 0,
+            number=number,
+            version=int(number % 10 == 0) + int(number % 20 == 0),
+        ))
+    return messages
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк сериализации страницы сообщений: стандартный путь DRF против FastModelSerializer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=10000,
+            help='Количество сообщений в одной сериализации'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Количество повторов, берётся лучший результат'
+        )
+
+    def handle(self, *args, **kwargs):
+        messages = _build_messages(kwargs['rows'])
+        context = {'request': Request(RequestFactory().get('/'))}
+
+        rendered = {}
+        for fast in (False, True):
+            with override_settings(FAST_SERIALIZERS=fast):
+                best = float('inf')
+                for _ in range(kwargs['repeat']):
+                    started_at = time.perf_counter()
+                    data = MessageSerializer(messages, many=True, context=context).data
+                    best = min(best, time.perf_counter() - started_at)
+                rendered[fast] = JSONRenderer().render(data)
+            name = 'FastModelSerializer' if fast else 'DRF'
+            self.stdout.write(f'{name}: {len(messages) / best:.0f} сообщений/с ({best * 1000:.1f} мс)')
+
+        if rendered[False] == rendered[True]:
+            self.stdout.write(self.style.SUCCESS('JSON совпадает до байта'))
+        else:
+            self.stdout.write(self.style.ERROR('JSON отличается'))
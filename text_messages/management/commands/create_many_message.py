@@ -1,15 +1,82 @@
+import csv
+import io
+import multiprocessing
 import random
+import uuid
+from collections import Counter
 from datetime import datetime, timedelta
 
 import factory
 from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.db.models import Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from faker import Faker
 
 from text_channels.models import Channel
+from text_channels.payload_cache import bump_version
+from text_messages import cache as message_cache
+from text_messages.allocators import get_number_allocator
 from text_messages.models import Message
+from text_messages.snapshots import rebuild_last_messages
 from users.models import User
 
+SAME_USER_CHANCE = 0.7
+SHORT_MESSAGE_CHANCE = 0.8
+UPDATE_CHANCE = 0.1
+IS_DELETED_CHANCE = 0.05
+COPY_COLUMNS = (
+    'uuid', 'channel_id', 'user_id', 'content', 'is_deleted', 'number', 'version', 'created_at', 'updated_at',
+)
+
+
+def _generate_rows(channel_id: int, first_number: int, count: int, user_ids: list[int], fake: Faker):
+    """Строки сообщений одного канала: номера подряд, время создания растёт вместе с номером."""
+    end_date = timezone.now()
+    created_at = end_date - timedelta(days=random.randint(1, 365*3))
+    user_id = random.choice(user_ids)
+    for number in range(first_number, first_number + count):
+        if SHORT_MESSAGE_CHANCE > random.random():
+            content = fake.text(max_nb_chars=20)
+        else:
+            content = fake.paragraph()
+        created_at += timedelta(seconds=random.randint(1, 180))
+        if SAME_USER_CHANCE > random.random():
+            user_id = random.choice(user_ids)
+        is_updated = UPDATE_CHANCE > random.random()
+        if is_updated:
+            updated_at = created_at + timedelta(minutes=random.randint(1, 455))
+        else:
+            updated_at = created_at
+        is_deleted = IS_DELETED_CHANCE > random.random()
+        yield (
+            uuid.uuid4(), channel_id, user_id, content,
+            is_deleted, number, int(is_updated) + int(is_deleted), created_at, updated_at,
+        )
+
+
+def _copy_channel_messages(job: tuple[int, int, int, list[int], int]) -> int:
+    """Вставляет сообщения одного канала через COPY пачками по batch_size строк."""
+    channel_id, first_number, count, user_ids, batch_size = job
+    fake = Faker('ru_RU')
+    table = connection.ops.quote_name(Message._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(column) for column in COPY_COLUMNS)
+    rows = _generate_rows(channel_id, first_number, count, user_ids, fake)
+    inserted = 0
+    while inserted < count:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(row)
+            inserted += 1
+            if inserted % batch_size == 0:
+                break
+        buffer.seek(0)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.copy_expert(f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+    return inserted
+
 
 class Command(BaseCommand):
     help = 'Генерация Message с русским текстом'
@@ -27,6 +94,23 @@ class Command(BaseCommand):
             required=True,
             help='НЕ ИСПОЛЬЗОВАТЬ В ПРОДАКШЕНЕ, ЭТО ТОЛЬКО ДЛЯ РАЗРАБОТКИ. Для использования команды передать \"i_understand\"'
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Быстрый режим: номера резервируются заранее, строки вставляются через COPY'
+        )
+        parser.add_argument(
+            '--batch_size',
+            type=int,
+            default=10000,
+            help='Размер пачки для COPY в быстром режиме'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Количество процессов в быстром режиме, работа делится по каналам'
+        )
 
     def handle(self, *args, **kwargs):
         if kwargs['i_do_not_use_it_in_the_prod'] != 'i_understand':
@@ -43,12 +127,22 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR('Нет пользователей или каналов!'))
             return
 
-        same_user_chance = 0.7
-        short_message_chance = 0.8
+        if kwargs['bulk']:
+            self._handle_bulk(
+                total=total,
+                user_ids=[user.pk for user in users],
+                channel_ids=[channel.pk for channel in channels],
+                batch_size=kwargs['batch_size'],
+                workers=kwargs['workers'],
+            )
+            return
+
+        same_user_chance = SAME_USER_CHANCE
+        short_message_chance = SHORT_MESSAGE_CHANCE
         change_channel_chance = 0.1
-        update_chance = 0.1
+        update_chance = UPDATE_CHANCE
         change_date_chance = 0.2
-        is_deleted_chance = 0.05
+        is_deleted_chance = IS_DELETED_CHANCE
 
         end_date = timezone.now()
         start_date = end_date - timedelta(days=random.randint(1, 365*3))
@@ -87,7 +181,56 @@ class Command(BaseCommand):
                 is_deleted=is_deleted,
             )
             Message.objects.filter(uuid=message.uuid).update(created_at=created_at, updated_at=updated_at)
+        # Даты переписаны после вставки, снимки последних сообщений нужно собрать заново
+        rebuild_last_messages([channel.pk for channel in channels])
+        self._drop_caches([channel.pk for channel in channels])
 
         self.stdout.write(
             self.style.SUCCESS(f'Успешно создано {total} сообщений')
         )
+
+    def _handle_bulk(self, total: int, user_ids: list[int], channel_ids: list[int], batch_size: int, workers: int):
+        counts = Counter(random.choices(channel_ids, k=total))
+
+        # Номера резервируются сразу диапазоном на канал, параллельные посты их не пересекут
+        allocator = get_number_allocator()
+        jobs = []
+        for channel_id, count in counts.items():
+            with transaction.atomic():
+                first_number = allocator.allocate(channel_id, count=count)
+            jobs.append((channel_id, first_number, count, user_ids, batch_size))
+
+        if workers > 1:
+            # Дочерние процессы не должны наследовать открытые соединения с БД
+            connections.close_all()
+            with multiprocessing.Pool(processes=workers) as pool:
+                inserted = sum(pool.imap_unordered(_copy_channel_messages, jobs))
+        else:
+            inserted = sum(map(_copy_channel_messages, jobs))
+
+        self._fix_last_message_numbers(list(counts))
+        rebuild_last_messages(list(counts))
+        self._drop_caches(list(counts))
+        self.stdout.write(
+            self.style.SUCCESS(f'Успешно создано {inserted} сообщений в {len(counts)} каналах')
+        )
+
+    def _fix_last_message_numbers(self, channel_ids: list[int]) -> None:
+        """Приводит Channel.last_message_number в соответствие с реально вставленными сообщениями."""
+        max_number = (
+            Message.objects.filter(channel=OuterRef('pk'))
+            .order_by()
+            .values('channel')
+            .annotate(max_number=Max('number'))
+            .values('max_number')
+        )
+        Channel.objects.filter(pk__in=channel_ids).update(
+            last_message_number=Coalesce(Subquery(max_number) + 1, Value(0)),
+        )
+
+    def _drop_caches(self, channel_ids: list[int]) -> None:
+        """Сообщения записаны в обход моделей: фрагменты payload_cache и кэш истории каналов устарели."""
+        channels = list(Channel.objects.filter(pk__in=channel_ids).only('pk', 'uuid'))
+        for channel in channels:
+            bump_version(channel.pk)
+        message_cache.drop_channels(channels)
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from text_channels.models import Channel
+from text_messages.partitioning import create_partitions, get_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = 'Заранее создаёт секции таблицы сообщений под будущие каналы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=settings.MESSAGE_PARTITIONS_AHEAD,
+            help='Сколько секций держать в запасе сверх максимального id канала'
+        )
+
+    def handle(self, *args, **kwargs):
+        if connection.vendor != 'postgresql' or not is_partitioned(connection):
+            self.stdout.write(self.style.ERROR('Таблица сообщений не секционирована'))
+            return
+
+        max_channel_id = Channel.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        with transaction.atomic():
+            created = create_partitions(
+                connection,
+                max_channel_id + kwargs['ahead'] * settings.MESSAGE_PARTITION_SIZE,
+            )
+
+        for name in created:
+            self.stdout.write(self.style.SUCCESS(f'Создана секция {name}'))
+        for name, start, end in get_partitions(connection):
+            bounds = f'[{start}, {end})' if start is not None else 'DEFAULT'
+            self.stdout.write(f'{name}: {bounds}')
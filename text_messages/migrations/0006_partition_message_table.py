@@ -0,0 +1,187 @@
+import re
+import uuid
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Копия text_messages.partitioning на момент миграции: миграция не должна зависеть от кода приложения
+
+TABLE = 'text_messages_message'
+PARTITION_KEY = 'channel_id'
+DEFAULT_PARTITION = f'{TABLE}_default'
+SEQUENCE = f'{TABLE}_id_seq'
+
+_BOUNDS_RE = re.compile(r"FROM \('?(\d+)'?\) TO \('?(\d+)'?\)")
+_KEY_CONSTRAINT_RE = re.compile(r'^(PRIMARY KEY|UNIQUE) \((.+)\)$')
+
+
+def is_partitioned(connection) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt '
+            'JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = %s)',
+            [TABLE],
+        )
+        return cursor.fetchone()[0]
+
+
+def get_partition_ends(connection) -> list[int]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass',
+            [TABLE],
+        )
+        return [int(match.group(2)) for (bounds, ) in cursor.fetchall() if (match := _BOUNDS_RE.search(bounds))]
+
+
+def get_stored_columns(connection) -> list[str]:
+    """Колонки без GENERATED: в них можно вставлять значения."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT attname FROM pg_attribute WHERE attrelid = %s::regclass '
+            "AND attnum > 0 AND NOT attisdropped AND attgenerated = '' ORDER BY attnum",
+            [TABLE],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def create_partitions(connection, up_to_channel_id: int, size: int) -> None:
+    quote = connection.ops.quote_name
+    start = max(get_partition_ends(connection), default=0)
+    columns = ', '.join(quote(column) for column in get_stored_columns(connection))
+    with connection.cursor() as cursor:
+        while start <= up_to_channel_id:
+            end = start + size
+            name = f'{TABLE}_p{start}'
+            cursor.execute(
+                f'CREATE TABLE {quote(name)} '
+                f'(LIKE {quote(TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED)'
+            )
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM {quote(DEFAULT_PARTITION)} '
+                f'WHERE {quote(PARTITION_KEY)} >= %s AND {quote(PARTITION_KEY)} < %s RETURNING {columns}) '
+                f'INSERT INTO {quote(name)} ({columns}) SELECT {columns} FROM moved',
+                [start, end],
+            )
+            cursor.execute(
+                f'ALTER TABLE {quote(TABLE)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)',
+                [start, end],
+            )
+            start = end
+
+
+def adjust_key_constraint(definition: str, partitioned: bool) -> str:
+    """Добавляет ключ секционирования в PRIMARY KEY/UNIQUE или убирает добавленный ранее."""
+    match = _KEY_CONSTRAINT_RE.match(definition)
+    if not match:
+        return definition
+    kind, columns = match.group(1), [column.strip() for column in match.group(2).split(',')]
+    if partitioned and PARTITION_KEY not in columns:
+        columns.append(PARTITION_KEY)
+    elif not partitioned and len(columns) > 1 and columns[-1] == PARTITION_KEY:
+        columns.pop()
+    return f'{kind} ({", ".join(columns)})'
+
+
+def rebuild(connection, partitioned: bool) -> None:
+    quote = connection.ops.quote_name
+    old_table = f'{TABLE}_old'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint '
+            "WHERE conrelid = %s::regclass ORDER BY contype = 'f', conname",
+            [TABLE],
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(
+            'SELECT indexdef FROM pg_indexes i WHERE tablename = %s AND NOT EXISTS '
+            '(SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname AND c.conrelid = %s::regclass)',
+            [TABLE, TABLE],
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+        columns = ', '.join(quote(column) for column in get_stored_columns(connection))
+
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [TABLE, 'id'])
+        if cursor.fetchone()[0]:
+            cursor.execute(
+                'SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = %s',
+                [TABLE, 'id'],
+            )
+            if cursor.fetchone()[0]:
+                cursor.execute(f'ALTER TABLE {quote(TABLE)} ALTER COLUMN id DROP IDENTITY')
+            else:
+                cursor.execute(f'ALTER TABLE {quote(TABLE)} ALTER COLUMN id DROP DEFAULT')
+                cursor.execute(f'DROP SEQUENCE {quote(SEQUENCE)}')
+
+        cursor.execute(f'ALTER TABLE {quote(TABLE)} RENAME TO {quote(old_table)}')
+        partition_by = f' PARTITION BY RANGE ({quote(PARTITION_KEY)})' if partitioned else ''
+        cursor.execute(
+            f'CREATE TABLE {quote(TABLE)} '
+            f'(LIKE {quote(old_table)} INCLUDING DEFAULTS INCLUDING GENERATED){partition_by}'
+        )
+        if partitioned:
+            cursor.execute(f'CREATE TABLE {quote(DEFAULT_PARTITION)} PARTITION OF {quote(TABLE)} DEFAULT')
+
+        cursor.execute(f'INSERT INTO {quote(TABLE)} ({columns}) SELECT {columns} FROM {quote(old_table)}')
+        cursor.execute(f'DROP TABLE {quote(old_table)} CASCADE')
+
+        for name, definition in constraints:
+            cursor.execute(
+                f'ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(name)} '
+                f'{adjust_key_constraint(definition, partitioned)}'
+            )
+        for definition in indexes:
+            # У индексов секционированной таблицы в определении стоит ON ONLY
+            cursor.execute(definition.replace(' ON ONLY ', ' ON ', 1))
+
+        cursor.execute(f'CREATE SEQUENCE {quote(SEQUENCE)} OWNED BY {quote(TABLE)}.id')
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+        cursor.execute(f"SELECT setval('{SEQUENCE}', COALESCE((SELECT MAX(id) FROM {quote(TABLE)}), 0) + 1, false)")
+
+
+def forwards(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or is_partitioned(connection):
+        return
+    rebuild(connection, partitioned=True)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM text_channels_channel')
+        max_channel_id = cursor.fetchone()[0]
+    size = settings.MESSAGE_PARTITION_SIZE
+    create_partitions(connection, max_channel_id + settings.MESSAGE_PARTITIONS_AHEAD * size, size)
+
+
+def backwards(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or not is_partitioned(connection):
+        return
+    rebuild(connection, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('text_channels', '0004_channelban_and_more'),
+        ('text_messages', '0005_message_search_vector'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(forwards, backwards),
+            ],
+            # Ключ секционирования входит в каждый уникальный индекс: UNIQUE (uuid) становится UNIQUE (uuid, channel_id)
+            state_operations=[
+                migrations.AlterField(
+                    model_name='message',
+                    name='uuid',
+                    field=models.UUIDField(default=uuid.uuid4, editable=False),
+                ),
+                migrations.AddConstraint(
+                    model_name='message',
+                    constraint=models.UniqueConstraint(fields=('uuid', 'channel'), name='text_messages_message_uuid_key'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('text_channels', '0004_channelban_and_more'),
+        ('text_messages', '0006_partition_message_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True)),
+                ('first_number', models.PositiveIntegerField()),
+                ('last_number', models.PositiveIntegerField()),
+                ('messages_count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_segments', to='text_channels.channel')),
+            ],
+            options={
+                'verbose_name': 'Архивный сегмент сообщений',
+                'verbose_name_plural': 'Архивные сегменты сообщений',
+                'ordering': ('-first_number',),
+                'indexes': [models.Index(fields=['channel', 'last_number'], name='archive_segment_channel_last')],
+                'constraints': [models.UniqueConstraint(fields=('channel', 'first_number'), name='archive_segment_channel_first_number')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('text_channels', '0004_channelban_and_more'),
+        ('text_messages', '0007_message_archive_segment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_deleted', True), models.Q(('content', ''), _negated=True)), fields=['id'], name='message_tombstone_pending'),
+        ),
+    ]
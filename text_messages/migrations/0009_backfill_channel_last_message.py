@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.db import migrations
+from rest_framework import serializers
+
+DELETED_CONTENT = "Сообщение удалено."
+
+
+def snapshot(message) -> dict:
+    """Снимок в формате text_messages.snapshots.build_snapshot на момент миграции."""
+    datetime_field = serializers.DateTimeField()
+    content = DELETED_CONTENT if message.is_deleted else message.content
+    if len(content) > settings.CHANNEL_LAST_MESSAGE_MAX_LENGTH:
+        content = content[:settings.CHANNEL_LAST_MESSAGE_MAX_LENGTH] + '...'
+    return {
+        'uuid': str(message.uuid),
+        'content': content,
+        'created_at': datetime_field.to_representation(message.created_at),
+        'updated_at': datetime_field.to_representation(message.updated_at),
+        'is_deleted': message.is_deleted,
+        'number': message.number,
+        'version': message.version,
+    }
+
+
+def forwards(apps, schema_editor):
+    Channel = apps.get_model('text_channels', 'Channel')
+    Message = apps.get_model('text_messages', 'Message')
+    for channel in Channel.objects.only('pk').iterator():
+        message = Message.objects.filter(channel_id=channel.pk).order_by('-number').first()
+        if message is None:
+            continue
+        Channel.objects.filter(pk=channel.pk).update(
+            last_message_author_id=message.user_id,
+            last_message_snapshot=snapshot(message),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('text_channels', '0005_channel_last_message_snapshot'),
+        ('text_messages', '0008_message_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
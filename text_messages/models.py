@@ -1,34 +1,145 @@
 import uuid
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
 
 from common.models import Timestamped
+from text_channels.inbox import touch_channel_on_commit
+from text_channels.models import Channel
+from text_channels.payload_cache import bump_version
 from users.models import User
 
+from .allocators import get_number_allocator
+
+SEARCH_CONFIG = 'russian'
+
 
 class Message(Timestamped):
-    uuid = models.UUIDField(default=uuid.uuid4, unique=True, db_index=True, editable=False)
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False)
     channel = models.ForeignKey('text_channels.Channel', on_delete=models.CASCADE, related_name='messages')
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=False, related_name='messages')
     content = models.TextField()
     is_deleted = models.BooleanField(default=False)
     number = models.PositiveIntegerField(editable=False, default=0)
+    # Увеличивается при каждом изменении или удалении, по ней клиент отбрасывает устаревшие события
+    version = models.PositiveIntegerField(editable=False, default=0)
+    # Поддерживается самим Postgres при вставке и изменении content
+    search_vector = models.GeneratedField(
+        expression=SearchVector('content', config=SEARCH_CONFIG),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
     class Meta:
+        # Таблица секционирована по channel_id (см. text_messages.partitioning): в базе первичный ключ
+        # (id, channel_id), а uuid уникален в паре с channel_id. id по-прежнему берётся из одной последовательности.
         verbose_name = "Сообщение"
         verbose_name_plural = "Сообщения"
         unique_together = ('channel', 'number')
+        constraints = [
+            models.UniqueConstraint(fields=('uuid', 'channel'), name='text_messages_message_uuid_key'),
+        ]
         ordering = ('-number', )
+        indexes = [
+            GinIndex(fields=['search_vector'], name='message_search_vector_gin'),
+            # Удалённые сообщения, у которых ещё не очищен текст (см. compact_deleted_messages)
+            models.Index(
+                fields=['id'],
+                condition=Q(is_deleted=True) & ~Q(content=''),
+                name='message_tombstone_pending',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.channel} -> <Message {self.pk}>"
 
+    @classmethod
+    def bulk_create_numbered(cls, channel, messages: list['Message']) -> list['Message']:
+        """
+        Создаёт пачку сообщений канала одним INSERT.
+        Номера резервируются одним диапазоном и идут подряд в порядке списка.
+        """
+        from .snapshots import set_last_message
+
+        with transaction.atomic():
+            first_number = get_number_allocator().allocate(channel.pk, count=len(messages))
+            for offset, message in enumerate(messages):
+                message.channel = channel
+                message.number = first_number + offset
+            cls.objects.bulk_create(messages)
+            set_last_message(messages[-1])
+            touch_channel_on_commit(channel.pk, messages[-1].created_at)
+            bump_version(channel.pk)
+        channel.last_message_number = first_number + len(messages)
+        return messages
+
     def save(self, *args, **kwargs):
+        from .snapshots import set_last_message
+
         if not self.pk:
+            # Номер выдаётся в той же транзакции, что и вставка, чтобы не было пропусков
             with transaction.atomic():
-                from text_channels.models import Channel
-                channel = Channel.objects.select_for_update().get(pk=self.channel.pk)
-                self.number = channel.last_message_number
-                channel.last_message_number += 1
-                channel.save(update_fields=('last_message_number', ))
+                self.number = get_number_allocator().allocate(self.channel_id)
+                super().save(*args, **kwargs)
+                set_last_message(self)
+                touch_channel_on_commit(self.channel_id, self.created_at)
+                bump_version(self.channel_id)
+            if self._meta.get_field('channel').is_cached(self):
+                self.channel.last_message_number = self.number + 1
+            return
         super().save(*args, **kwargs)
+
+    def edit(self, content: str) -> None:
+        """Меняет текст сообщения с увеличением версии."""
+        self._update_versioned(content=content)
+
+    def soft_delete(self) -> None:
+        """Помечает сообщение удалённым. Текст очищается позже фоновой задачей."""
+        self._update_versioned(is_deleted=True)
+
+    def _update_versioned(self, **fields) -> None:
+        from .snapshots import refresh_last_message
+
+        fields['updated_at'] = timezone.now()
+        with transaction.atomic():
+            type(self).objects.filter(pk=self.pk, channel_id=self.channel_id).update(
+                version=F('version') + 1,
+                **fields,
+            )
+            # Строка заблокирована нашим UPDATE до конца транзакции, версия - именно наша
+            self.refresh_from_db(fields=('version', ))
+            for name, value in fields.items():
+                setattr(self, name, value)
+            refresh_last_message(self)
+            # Время изменения канала - валидатор первой страницы истории (MessageView.get_list_validators)
+            Channel.objects.filter(pk=self.channel_id).update(updated_at=fields['updated_at'])
+            bump_version(self.channel_id)
+
+
+class MessageArchiveSegment(Timestamped):
+    """
+    Сжатый сегмент старой истории канала: сообщения с номерами [first_number, last_number]
+    в виде NDJSON, сжатого zlib. Строки этих сообщений удалены из таблицы Message.
+    """
+    channel = models.ForeignKey('text_channels.Channel', on_delete=models.CASCADE, related_name='archive_segments')
+    first_number = models.PositiveIntegerField()
+    last_number = models.PositiveIntegerField()
+    messages_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        verbose_name = "Архивный сегмент сообщений"
+        verbose_name_plural = "Архивные сегменты сообщений"
+        ordering = ('-first_number', )
+        constraints = [
+            models.UniqueConstraint(fields=['channel', 'first_number'], name='archive_segment_channel_first_number'),
+        ]
+        indexes = [
+            models.Index(fields=['channel', 'last_number'], name='archive_segment_channel_last'),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} -> <MessageArchiveSegment {self.first_number}-{self.last_number}>"
@@ -0,0 +1,313 @@
+import binascii
+import contextlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .archive import get_archived_messages
+from .cache import get_cached_page
+
+
+class LimitPaginationMixin:
+    """Размер страницы из параметра `limit`, как в common.pagination.DefaultPagination."""
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+    def get_page_size(self, request) -> int:
+        with contextlib.suppress(KeyError, ValueError):
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        return self.page_size
+
+
+class MessageCursorPagination(LimitPaginationMixin, BasePagination):
+    """
+    Keyset-пагинация истории сообщений канала по индексу (channel, number).
+
+    - без параметров отдаются самые новые сообщения;
+    - `before_number` - сообщения старше указанного номера;
+    - `after_number` - сообщения новее указанного номера.
+
+    Сообщения всегда отдаются от новых к старым, старая история прозрачно
+    дочитывается из архивных сегментов. COUNT(*) не выполняется,
+    в `count` отдаётся `Channel.last_message_number` как оценка размера канала.
+    Первая страница отдаётся из кэша text_messages.cache, если он не отстал от канала.
+    """
+    before_query_param = 'before_number'
+    after_query_param = 'after_number'
+
+    def paginate_cached(self, request, view) -> list[dict] | None:
+        """
+        Первая страница уже сериализованных сообщений из кэша или None.
+        При промахе по первой странице запоминает `cache_generation` для прогрева кэша.
+        """
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        self.cache_generation = None
+        channel = view.get_channel()
+        self.total_hint = channel.last_message_number
+        if any(request.query_params.get(param) for param in (self.before_query_param, self.after_query_param)):
+            return None
+
+        page, self.cache_generation = get_cached_page(channel, self.page_size_value)
+        if page is None:
+            return None
+        self.is_ascending = False
+        self.has_older = page[-1]['number'] > 0
+        self.has_newer = False
+        self.newest_number, self.oldest_number = page[0]['number'], page[-1]['number']
+        return page
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None):
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        self.total_hint = view.get_channel().last_message_number if view is not None else None
+
+        before_number = self._get_number(request, self.before_query_param)
+        after_number = self._get_number(request, self.after_query_param)
+        if before_number is not None and after_number is not None:
+            raise ValidationError({
+                'detail': f'Нельзя одновременно передавать {self.before_query_param} и {self.after_query_param}.'
+            })
+
+        self.is_ascending = after_number is not None
+        if self.is_ascending:
+            queryset = queryset.filter(number__gt=after_number).order_by('number')
+        else:
+            if before_number is not None:
+                queryset = queryset.filter(number__lt=before_number)
+            queryset = queryset.order_by('-number')
+
+        # Берём на одну запись больше, чтобы узнать о следующей странице без COUNT(*)
+        results = list(queryset[:self.page_size_value + 1])
+        if view is not None:
+            results = self.add_archived(results, view.get_channel(), before_number, after_number)
+        has_more = len(results) > self.page_size_value
+        results = results[:self.page_size_value]
+
+        if self.is_ascending:
+            results.reverse()
+            self.has_newer = has_more
+            self.has_older = bool(results) and results[-1].number > 0
+        else:
+            self.has_older = has_more
+            self.has_newer = (
+                before_number is not None
+                and bool(results)
+                and self.total_hint is not None
+                and results[0].number < self.total_hint - 1
+            )
+
+        self.page = results
+        if results:
+            self.newest_number, self.oldest_number = results[0].number, results[-1].number
+        return results
+
+    def add_archived(
+        self,
+        results: list,
+        channel,
+        before_number: int | None,
+        after_number: int | None,
+    ) -> list:
+        """
+        Дочитывает страницу из архива, если в горячей таблице не хватило сообщений.
+        Номера идут без пропусков, поэтому недостающие номера лежат в архивных сегментах.
+        """
+        limit = self.page_size_value + 1
+        if self.is_ascending:
+            first_hot = results[0].number if results else channel.last_message_number
+            if first_hot <= after_number + 1:
+                return results
+            archived = get_archived_messages(
+                channel, after=after_number, before=first_hot, limit=limit, descending=False,
+            )
+            return (archived + results)[:limit]
+
+        if len(results) >= limit:
+            return results
+        if results:
+            lowest = results[-1].number
+        else:
+            lowest = before_number if before_number is not None else channel.last_message_number
+        if lowest <= 0:
+            return results
+        return results + get_archived_messages(channel, before=lowest, limit=limit - len(results))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.total_hint,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['count', 'results'],
+            'properties': {
+                'count': {
+                    'type': 'integer',
+                    'example': 123,
+                },
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                    'example': f'http://api.example.org/messages/?{self.before_query_param}=100',
+                },
+                'previous': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                    'example': f'http://api.example.org/messages/?{self.after_query_param}=119',
+                },
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.before_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Вернуть сообщения с номером меньше указанного.',
+                'schema': {'type': 'integer'},
+            },
+            {
+                'name': self.after_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Вернуть сообщения с номером больше указанного.',
+                'schema': {'type': 'integer'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Количество сообщений на странице.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+    def get_next_link(self) -> str | None:
+        """Ссылка на более старые сообщения."""
+        if not self.has_older:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.after_query_param)
+        return replace_query_param(url, self.before_query_param, self.oldest_number)
+
+    def get_previous_link(self) -> str | None:
+        """Ссылка на более новые сообщения."""
+        if not self.has_newer:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.before_query_param)
+        return replace_query_param(url, self.after_query_param, self.newest_number)
+
+    def _get_number(self, request, param: str) -> int | None:
+        value = request.query_params.get(param)
+        if value is None or value == '':
+            return None
+        try:
+            number = int(value)
+        except ValueError:
+            raise ValidationError({param: 'Ожидается целое число.'})
+        if number < 0:
+            raise ValidationError({param: 'Ожидается неотрицательное число.'})
+        return number
+
+
+class MessageSearchPagination(LimitPaginationMixin, BasePagination):
+    """
+    Курсорная пагинация результатов полнотекстового поиска.
+
+    Результаты упорядочены по (rank, id) по убыванию, курсор - непрозрачная
+    base64-строка с позицией последнего элемента страницы.
+    """
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            rank, pk = cursor
+            queryset = queryset.filter(Q(rank__lt=rank) | Q(rank=rank, pk__lt=pk))
+
+        results = list(queryset.order_by('-rank', '-pk')[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                    'example': f'http://api.example.org/messages/search/?q=text&{self.cursor_query_param}=eyJyIjogMC4xfQ',
+                },
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Курсор следующей страницы.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Количество результатов на странице.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+    def get_next_link(self) -> str | None:
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(last.rank, last.pk),
+        )
+
+    def encode_cursor(self, rank: float, pk: int) -> str:
+        return urlsafe_b64encode(json.dumps([rank, pk]).encode()).decode()
+
+    def decode_cursor(self, request) -> tuple[float, int] | None:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            rank, pk = json.loads(urlsafe_b64decode(encoded.encode()))
+            return float(rank), int(pk)
+        except (TypeError, ValueError, binascii.Error):
+            raise ValidationError({self.cursor_query_param: 'Некорректный курсор.'})
@@ -0,0 +1,105 @@
+"""
+Секционирование таблицы сообщений по диапазонам channel_id.
+
+Все горячие запросы (история канала, последнее сообщение, поиск по uuid внутри канала)
+фильтруют по channel_id, поэтому Postgres отсекает лишние секции ещё при планировании.
+Ключ секционирования обязан входить в каждый уникальный индекс, поэтому на
+секционированной таблице первичный ключ - (id, channel_id), а uuid уникален в паре с channel_id.
+Таблицу перестраивает миграция 0006_partition_message_table.
+Новые секции создаются заранее командой `create_message_partitions`, строки каналов,
+для которых секции ещё нет, попадают в секцию по умолчанию.
+"""
+import re
+
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+TABLE = 'text_messages_message'
+PARTITION_KEY = 'channel_id'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+_BOUNDS_RE = re.compile(r"FROM \('?(\d+)'?\) TO \('?(\d+)'?\)")
+
+
+def partition_name(start: int) -> str:
+    return f'{TABLE}_p{start}'
+
+
+def is_partitioned(connection: BaseDatabaseWrapper) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt '
+            'JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = %s)',
+            [TABLE],
+        )
+        return cursor.fetchone()[0]
+
+
+def get_partitions(connection: BaseDatabaseWrapper) -> list[tuple[str, int | None, int | None]]:
+    """Секции таблицы сообщений: (имя, начало диапазона, конец диапазона), у секции по умолчанию границ нет."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass ORDER BY c.relname',
+            [TABLE],
+        )
+        partitions = []
+        for name, bounds in cursor.fetchall():
+            match = _BOUNDS_RE.search(bounds)
+            if match:
+                partitions.append((name, int(match.group(1)), int(match.group(2))))
+            else:
+                partitions.append((name, None, None))
+        return sorted(partitions, key=lambda partition: (partition[1] is None, partition[1] or 0))
+
+
+def create_partitions(
+    connection: BaseDatabaseWrapper,
+    up_to_channel_id: int,
+    size: int | None = None,
+) -> list[str]:
+    """
+    Создаёт секции так, чтобы покрыть channel_id до `up_to_channel_id` включительно.
+    Строки, уже попавшие в секцию по умолчанию, переносятся в новую секцию.
+    Вызывать внутри транзакции.
+    """
+    size = size or settings.MESSAGE_PARTITION_SIZE
+    quote = connection.ops.quote_name
+    ranges = [(start, end) for _, start, end in get_partitions(connection) if start is not None]
+    start = max((end for _, end in ranges), default=0)
+
+    created = []
+    columns = ', '.join(quote(column) for column in _get_stored_columns(connection))
+    with connection.cursor() as cursor:
+        while start <= up_to_channel_id:
+            end = start + size
+            name = partition_name(start)
+            # Сначала отдельная таблица: ATTACH проверит секцию по умолчанию только после переноса строк
+            cursor.execute(
+                f'CREATE TABLE {quote(name)} '
+                f'(LIKE {quote(TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED)'
+            )
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM {quote(DEFAULT_PARTITION)} '
+                f'WHERE {quote(PARTITION_KEY)} >= %s AND {quote(PARTITION_KEY)} < %s RETURNING {columns}) '
+                f'INSERT INTO {quote(name)} ({columns}) SELECT {columns} FROM moved',
+                [start, end],
+            )
+            cursor.execute(
+                f'ALTER TABLE {quote(TABLE)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)',
+                [start, end],
+            )
+            created.append(name)
+            start = end
+    return created
+
+
+def _get_stored_columns(connection: BaseDatabaseWrapper) -> list[str]:
+    """Колонки без GENERATED: в них можно вставлять значения."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT attname FROM pg_attribute WHERE attrelid = %s::regclass '
+            "AND attnum > 0 AND NOT attisdropped AND attgenerated = '' ORDER BY attnum",
+            [TABLE],
+        )
+        return [row[0] for row in cursor.fetchall()]
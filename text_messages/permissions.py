@@ -28,7 +28,10 @@ class MessagePermissions(permissions.BasePermission):
     message = "You do not have permission to perform this action."
 
     def has_permission(self, request: Request, view) -> bool:
-        channel = get_object_or_404(Channel, uuid=view.kwargs['channel_uuid'])
+        if hasattr(view, 'get_channel'):
+            channel = view.get_channel()
+        else:
+            channel = get_object_or_404(Channel, uuid=view.kwargs['channel_uuid'])
         is_member = ChannelMembership.objects.filter(
             user=request.user,
             channel=channel,
@@ -43,15 +46,15 @@ class MessagePermissions(permissions.BasePermission):
             return True
 
         if request.method in ('PATCH', 'PUT'):
-            if obj.user != request.user:
+            if obj.user_id != request.user.pk:
                 self.message = "You can only edit your own messages."
                 return False
             return True
 
         if request.method == 'DELETE':
-            is_author = obj.user == request.user
-            is_admin = ChannelMembership.objects.filter(
-                user=request.user, channel=obj.channel, is_admin=True
+            is_author = obj.user_id == request.user.pk
+            is_admin = not is_author and ChannelMembership.objects.filter(
+                user=request.user, channel_id=obj.channel_id, is_admin=True
             ).exists()
             if not (is_author or is_admin):
                 self.message = "You can only delete your own messages or if you are a channel admin."
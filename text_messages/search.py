@@ -0,0 +1,32 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField, QuerySet
+from django.db.models.functions import Cast
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+
+from .models import SEARCH_CONFIG
+
+SEARCH_QUERY_PARAM = 'q'
+SEARCH_QUERY_MAX_LENGTH = 200
+
+
+def get_search_text(request: Request) -> str:
+    text = request.query_params.get(SEARCH_QUERY_PARAM, '').strip()
+    if not text:
+        raise ValidationError({SEARCH_QUERY_PARAM: 'Обязательный параметр.'})
+    if len(text) > SEARCH_QUERY_MAX_LENGTH:
+        raise ValidationError({SEARCH_QUERY_PARAM: f'Не длиннее {SEARCH_QUERY_MAX_LENGTH} символов.'})
+    return text
+
+
+def search_messages(queryset: QuerySet, text: str) -> QuerySet:
+    """
+    Полнотекстовый поиск по GIN-индексу Message.search_vector.
+    Удалённые сообщения не ищутся, в `rank` - релевантность для сортировки.
+    """
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return (
+        queryset.filter(search_vector=query, is_deleted=False)
+        # ts_rank возвращает real, приводим к double, чтобы курсор сравнивался без потери точности
+        .annotate(rank=Cast(SearchRank(F('search_vector'), query), FloatField()))
+    )
@@ -1,19 +1,22 @@
+import uuid
 
+from django.conf import settings
 from rest_framework import serializers
 
+from common.serializers import FastModelSerializer
 from users.serializers import UserSerializer
 
 from .models import Message
 
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(FastModelSerializer):
     user = UserSerializer(read_only=True)
     # channel = ChannelSerializer(read_only=True)
 
     class Meta:
         model = Message
-        fields = ['uuid', 'user', 'content', 'created_at', 'updated_at', 'is_deleted', 'number']
-        read_only_fields = ['uuid', 'created_at', 'updated_at', 'user', 'is_deleted', 'number']
+        fields = ['uuid', 'user', 'content', 'created_at', 'updated_at', 'is_deleted', 'number', 'version']
+        read_only_fields = ['uuid', 'created_at', 'updated_at', 'user', 'is_deleted', 'number', 'version']
 
     def to_representation(self, instance: Message):
         representation = super().to_representation(instance)
@@ -21,6 +24,31 @@ class MessageSerializer(serializers.ModelSerializer):
             representation['content'] = "Сообщение удалено."
         return representation
 
+    @classmethod
+    def get_read_only_columns(cls) -> tuple[str, ...]:
+        """Колонки для QuerySet.only(), нужные сериализатору вместе с select_related('user')."""
+        message_fields = [field for field in cls.Meta.fields if field != 'user']
+        user_fields = [f'user__{field}' for field in UserSerializer.Meta.fields]
+        return (*message_fields, 'user', *user_fields)
+
+
+class MessageSnapshotSerializer(MessageSerializer):
+    """MessageSerializer без пользователя: снимок последнего сообщения канала (см. text_messages.snapshots)."""
+    user = None
+
+    class Meta(MessageSerializer.Meta):
+        fields = [field for field in MessageSerializer.Meta.fields if field != 'user']
+        read_only_fields = fields
+
+
+class MessageSearchSerializer(MessageSerializer):
+    channel = serializers.UUIDField(source='channel.uuid', read_only=True)
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(MessageSerializer.Meta):
+        fields = [*MessageSerializer.Meta.fields, 'channel', 'rank']
+        read_only_fields = fields
+
 
 class MessageCreateSerializer(serializers.ModelSerializer):
 
@@ -39,3 +67,57 @@ class MessageCreateSerializer(serializers.ModelSerializer):
         if self.instance and self.instance.is_deleted:
             raise serializers.ValidationError("Нельзя обновлять содержимое удалённого сообщения")
         return value
+
+
+class MessageUpdatedEventSerializer(serializers.ModelSerializer):
+    """Событие message_updated: номер, версия и изменённые поля."""
+
+    class Meta:
+        model = Message
+        fields = ('number', 'version', 'content', 'updated_at')
+        read_only_fields = fields
+
+
+class MessageDeletedEventSerializer(serializers.ModelSerializer):
+    """Событие message_deleted: только номер и версия."""
+
+    class Meta:
+        model = Message
+        fields = ('number', 'version')
+        read_only_fields = fields
+
+
+class MessageBatchCreateSerializer(serializers.Serializer):
+    messages = MessageCreateSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=settings.MESSAGE_BATCH_MAX_SIZE,
+    )
+
+
+class MessageCatchUpSerializer(serializers.Serializer):
+    """`channel_uuid -> last_seen_number`, -1 если клиент не видел ни одного сообщения канала."""
+    channels = serializers.DictField(
+        child=serializers.IntegerField(min_value=-1),
+        allow_empty=False,
+    )
+
+    def validate_channels(self, value: dict[str, int]) -> dict[uuid.UUID, int]:
+        if len(value) > settings.MESSAGE_CATCH_UP_MAX_CHANNELS:
+            raise serializers.ValidationError(
+                f"Не больше {settings.MESSAGE_CATCH_UP_MAX_CHANNELS} каналов за запрос"
+            )
+        try:
+            return {uuid.UUID(channel_uuid): number for channel_uuid, number in value.items()}
+        except ValueError:
+            raise serializers.ValidationError("Ключи должны быть UUID каналов")
+
+
+class ChannelCatchUpSerializer(serializers.Serializer):
+    last_message_number = serializers.IntegerField()
+    too_far_behind = serializers.BooleanField()
+    messages = MessageSerializer(many=True)
+
+
+class MessageCatchUpResponseSerializer(serializers.Serializer):
+    channels = serializers.DictField(child=ChannelCatchUpSerializer())
@@ -0,0 +1,64 @@
+"""
+Снимок последнего сообщения канала (`Channel.last_message_snapshot` и `Channel.last_message_author`).
+
+Снимок хранит то, что отдаёт MessageSerializer, кроме пользователя, с уже обрезанным
+до CHANNEL_LAST_MESSAGE_MAX_LENGTH текстом. Список каналов собирается из него без запросов к сообщениям.
+Обновляется в той же транзакции, что и вставка: строка канала в ней уже заблокирована аллокатором номеров,
+поэтому снимки разных сообщений канала не перезаписывают друг друга не по порядку.
+"""
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+
+from text_channels.models import Channel
+
+from .models import Message
+from .serializers import MessageSnapshotSerializer
+
+
+def build_snapshot(message: Message) -> dict:
+    data = dict(MessageSnapshotSerializer(message).data)
+    if len(data['content']) > settings.CHANNEL_LAST_MESSAGE_MAX_LENGTH:
+        data['content'] = data['content'][:settings.CHANNEL_LAST_MESSAGE_MAX_LENGTH] + '...'
+    return data
+
+
+def set_last_message(message: Message) -> None:
+    """Новое последнее сообщение канала."""
+    Channel.objects.filter(pk=message.channel_id).update(
+        last_message_author_id=message.user_id,
+        last_message_snapshot=build_snapshot(message),
+    )
+
+
+def refresh_last_message(message: Message) -> None:
+    """Изменённое или удалённое сообщение: снимок обновляется, только если это сообщение последнее."""
+    Channel.objects.filter(pk=message.channel_id, last_message_snapshot__number=message.number).update(
+        last_message_snapshot=build_snapshot(message),
+    )
+
+
+def rebuild_last_messages(channel_ids=None) -> int:
+    """Пересобирает снимки каналов из таблицы сообщений. Возвращает количество обновлённых каналов."""
+    channels = Channel.objects.all()
+    if channel_ids is not None:
+        channels = channels.filter(pk__in=channel_ids)
+    last_messages = (
+        Message.objects
+        .filter(channel=OuterRef('pk'))
+        .order_by('-number')
+        .values('pk')[:1]
+    )
+    message_ids = channels.annotate(last_message_id=Subquery(last_messages)).values_list('pk', 'last_message_id')
+
+    updated = 0
+    for channel_id, message_id in message_ids.iterator():
+        if message_id is None:
+            updated += Channel.objects.filter(pk=channel_id).update(
+                last_message_author=None,
+                last_message_snapshot=None,
+            )
+            continue
+        message = Message.objects.filter(channel_id=channel_id).get(pk=message_id)
+        set_last_message(message)
+        updated += 1
+    return updated
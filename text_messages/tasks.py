@@ -0,0 +1,44 @@
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.db.models import Q
+
+from .archive import archive_channel, get_channels_to_archive
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def archive_channel_messages(channel_id: int) -> int:
+    created = archive_channel(channel_id)
+    if created:
+        logger.info("Archived %s message segments of channel %s", created, channel_id)
+    return created
+
+
+@shared_task
+def archive_old_messages() -> None:
+    """Периодическая задача: ставит в очередь архивацию каналов с достаточно старой историей."""
+    for channel_id in get_channels_to_archive().iterator():
+        archive_channel_messages.delay(channel_id)
+
+
+@shared_task
+def compact_deleted_messages() -> int:
+    """
+    Очищает текст удалённых сообщений пачками по MESSAGE_COMPACTION_BATCH_SIZE.
+    Клиенту текст удалённого сообщения не отдаётся, поэтому версия не меняется.
+    """
+    pending = Message.objects.filter(Q(is_deleted=True) & ~Q(content=''))
+    compacted = 0
+    while True:
+        batch = pending.values('pk')[:settings.MESSAGE_COMPACTION_BATCH_SIZE]
+        updated = Message.objects.filter(pk__in=batch).update(content='')
+        compacted += updated
+        if updated < settings.MESSAGE_COMPACTION_BATCH_SIZE:
+            break
+    if compacted:
+        logger.info("Compacted %s deleted messages", compacted)
+    return compacted
@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+from django.db import connection, transaction
+
+from text_channels.models import Channel
+from text_channels.tests.factories import ChannelFactory
+from text_messages.allocators import ChannelCounterAllocator, SelectForUpdateAllocator
+from text_messages.models import Message
+from text_messages.tests.factories import MessageFactory
+from users.tests.factories import UserFactory
+
+
+@pytest.mark.django_db
+class TestChannelCounterAllocator:
+    def test_messages_are_numbered_sequentially(self) -> None:
+        channel = ChannelFactory()
+        messages = MessageFactory.create_batch(5, channel=channel)
+
+        channel.refresh_from_db()
+        assert [message.number for message in messages] == [0, 1, 2, 3, 4]
+        assert channel.last_message_number == 5
+
+    def test_allocate_range(self) -> None:
+        channel = ChannelFactory()
+        allocator = ChannelCounterAllocator()
+        with transaction.atomic():
+            first = allocator.allocate(channel.pk, count=10)
+            second = allocator.allocate(channel.pk)
+
+        channel.refresh_from_db()
+        assert first == 0
+        assert second == 10
+        assert channel.last_message_number == 11
+
+    def test_does_not_touch_channel_updated_at(self) -> None:
+        channel = ChannelFactory()
+        updated_at = channel.updated_at
+        MessageFactory(channel=channel)
+
+        channel.refresh_from_db()
+        assert channel.updated_at == updated_at
+
+    def test_rollback_does_not_leave_gap(self) -> None:
+        channel = ChannelFactory()
+        MessageFactory(channel=channel)
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                MessageFactory(channel=channel)
+                raise RuntimeError
+        message = MessageFactory(channel=channel)
+
+        assert message.number == 1
+
+    def test_missing_channel(self) -> None:
+        with pytest.raises(Channel.DoesNotExist):
+            with transaction.atomic():
+                ChannelCounterAllocator().allocate(-1)
+
+    def test_select_for_update_allocator(self) -> None:
+        channel = ChannelFactory()
+        with transaction.atomic():
+            number = SelectForUpdateAllocator().allocate(channel.pk, count=3)
+
+        channel.refresh_from_db()
+        assert number == 0
+        assert channel.last_message_number == 3
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_messages_are_gap_free() -> None:
+    channel = ChannelFactory()
+    user = UserFactory()
+
+    def writer():
+        try:
+            for _ in range(10):
+                Message.objects.create(channel=channel, user=user, content='test')
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=writer) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    numbers = list(Message.objects.filter(channel=channel).order_by('number').values_list('number', flat=True))
+    channel.refresh_from_db()
+    assert numbers == list(range(40))
+    assert channel.last_message_number == 40
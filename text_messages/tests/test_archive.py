@@ -0,0 +1,151 @@
+import zlib
+from typing import cast
+from unittest.mock import patch
+
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from text_channels.models import Channel
+from text_channels.tests.factories import ChannelFactory, ChannelMembershipFactory
+from text_messages.archive import archive_channel, get_archived_messages
+from text_messages.models import Message, MessageArchiveSegment
+from text_messages.tasks import archive_old_messages
+from text_messages.tests.factories import MessageFactory
+from users.tests.factories import UserFactory
+
+
+@pytest.fixture(autouse=True)
+def archive_settings(settings) -> None:
+    settings.MESSAGE_ARCHIVE_KEEP_RECENT = 10
+    settings.MESSAGE_ARCHIVE_SEGMENT_SIZE = 5
+
+
+@pytest.fixture
+def user() -> UserFactory:
+    return UserFactory()
+
+
+@pytest.fixture
+def channel() -> Channel:
+    return ChannelFactory()
+
+
+@pytest.fixture
+def authenticated_client(user: UserFactory, channel: Channel) -> APIClient:
+    ChannelMembershipFactory(user=user, channel=channel)
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+def get_page(client: APIClient, channel: Channel, **params) -> dict:
+    url = reverse("channel-messages-list", kwargs={"channel_uuid": channel.uuid})
+    response = cast(Response, client.get(url, params))
+    assert response.status_code == status.HTTP_200_OK
+    return response.data  # type: ignore
+
+
+@pytest.mark.django_db
+class TestMessageArchive:
+    def test_archive_channel_moves_whole_old_segments(self, channel: Channel, user: UserFactory) -> None:
+        MessageFactory.create_batch(27, channel=channel, user=user)
+
+        assert archive_channel(channel.pk) == 3
+
+        segments = list(MessageArchiveSegment.objects.filter(channel=channel).order_by('first_number'))
+        assert [(s.first_number, s.last_number, s.messages_count) for s in segments] == [
+            (0, 4, 5), (5, 9, 5), (10, 14, 5),
+        ]
+        hot_numbers = Message.objects.filter(channel=channel).order_by('number').values_list('number', flat=True)
+        assert list(hot_numbers) == list(range(15, 27))
+        assert archive_channel(channel.pk) == 0
+
+    def test_deleted_text_is_not_archived(self, channel: Channel, user: UserFactory) -> None:
+        messages = MessageFactory.create_batch(15, channel=channel, user=user, content="обычный текст")
+        messages[2].content = "секретный текст"
+        messages[2].save(update_fields=['content'])
+        messages[2].soft_delete()
+
+        archive_channel(channel.pk)
+
+        segment = MessageArchiveSegment.objects.get(channel=channel, first_number=0)
+        assert "секретный текст".encode() not in zlib.decompress(segment.data)
+        archived = get_archived_messages(channel, before=3, limit=1)
+        assert (archived[0].is_deleted, archived[0].content) == (True, '')
+
+    def test_get_archived_messages(self, channel: Channel, user: UserFactory) -> None:
+        messages = MessageFactory.create_batch(20, channel=channel, user=user)
+        archive_channel(channel.pk)
+
+        archived = get_archived_messages(channel, before=8, limit=4)
+        assert [message.number for message in archived] == [7, 6, 5, 4]
+        assert archived[0].uuid == messages[7].uuid
+        assert archived[0].user == user
+        assert archived[0].created_at == messages[7].created_at
+
+        archived = get_archived_messages(channel, after=2, before=10, limit=100, descending=False)
+        assert [message.number for message in archived] == list(range(3, 10))
+
+    def test_pages_are_identical_after_archiving(
+        self,
+        authenticated_client: APIClient,
+        channel: Channel,
+        user: UserFactory,
+    ) -> None:
+        MessageFactory.create_batch(30, channel=channel, user=user)
+        requests = [
+            {'limit': 8},
+            {'before_number': 22, 'limit': 8},
+            {'before_number': 4},
+            {'after_number': 3, 'limit': 5},
+            {'after_number': 12, 'limit': 10},
+        ]
+        before = [get_page(authenticated_client, channel, **params) for params in requests]
+
+        archive_channel(channel.pk)
+        after = [get_page(authenticated_client, channel, **params) for params in requests]
+
+        assert MessageArchiveSegment.objects.filter(channel=channel).count() == 4
+        assert after == before
+
+    def test_walk_whole_history(self, authenticated_client: APIClient, channel: Channel, user: UserFactory) -> None:
+        MessageFactory.create_batch(30, channel=channel, user=user)
+        archive_channel(channel.pk)
+
+        numbers = []
+        params = {'limit': 7}
+        while True:
+            data = get_page(authenticated_client, channel, **params)
+            numbers.extend(message['number'] for message in data['results'])
+            if data['next'] is None:
+                break
+            params = {'limit': 7, 'before_number': data['results'][-1]['number']}
+
+        assert numbers == list(range(29, -1, -1))
+
+    def test_hot_page_does_not_read_archive(
+        self,
+        authenticated_client: APIClient,
+        channel: Channel,
+        user: UserFactory,
+        django_assert_num_queries,
+    ) -> None:
+        MessageFactory.create_batch(30, channel=channel, user=user)
+        archive_channel(channel.pk)
+        url = reverse("channel-messages-list", kwargs={"channel_uuid": channel.uuid})
+
+        with django_assert_num_queries(3):
+            authenticated_client.get(url, {'limit': 5})
+
+    def test_archive_old_messages_task(self, channel: Channel, user: UserFactory) -> None:
+        small_channel = ChannelFactory()
+        MessageFactory.create_batch(15, channel=channel, user=user)
+        MessageFactory.create_batch(5, channel=small_channel, user=user)
+
+        with patch('text_messages.tasks.archive_channel_messages.delay') as delay:
+            archive_old_messages()
+
+        delay.assert_called_once_with(channel.pk)
@@ -0,0 +1,226 @@
+from typing import cast
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from django.urls import reverse
+from redis.exceptions import RedisError
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from common.redis import get_redis
+from text_channels.models import Channel
+from text_channels.tests.factories import ChannelFactory, ChannelMembershipFactory
+from text_messages.cache import fill_cache, get_cached_page, push_messages
+from text_messages.models import Message
+from text_messages.tests.factories import MessageFactory
+from users.tests.factories import UserFactory
+
+
+@pytest.fixture(autouse=True)
+def clean_message_cache():
+    redis = get_redis()
+    for key in redis.scan_iter('message_cache:*'):
+        redis.delete(key)
+    yield
+    for key in redis.scan_iter('message_cache:*'):
+        redis.delete(key)
+
+
+@pytest.fixture
+def user() -> UserFactory:
+    return UserFactory()
+
+
+@pytest.fixture
+def channel(user: UserFactory) -> Channel:
+    channel = ChannelFactory()
+    ChannelMembershipFactory(user=user, channel=channel)
+    MessageFactory.create_batch(5, channel=channel, user=user)
+    return channel
+
+
+@pytest.fixture
+def client(user: UserFactory) -> APIClient:
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+def list_messages(client: APIClient, channel: Channel, **params) -> Response:
+    url = reverse("channel-messages-list", kwargs={"channel_uuid": channel.uuid})
+    return cast(Response, client.get(url, params))
+
+
+def send(client: APIClient, method: str, url: str, data: dict | None = None) -> Response:
+    with patch("text_messages.views.get_channel_layer") as get_channel_layer:
+        get_channel_layer.return_value.group_send = AsyncMock()
+        return cast(Response, getattr(client, method)(url, data, format="json"))
+
+
+def message_payload(number: int) -> dict:
+    return {'number': number, 'content': f'message {number}'}
+
+
+@pytest.mark.django_db
+class TestMessageCache:
+    def test_first_page_is_served_from_cache(
+        self,
+        client: APIClient,
+        channel: Channel,
+        django_assert_num_queries,
+    ) -> None:
+        from_database = list_messages(client, channel, limit=3).data
+
+        # канал и членство, сообщения не читаются
+        with django_assert_num_queries(2):
+            from_cache = list_messages(client, channel, limit=3).data
+
+        assert from_cache == from_database
+        assert [message["number"] for message in from_cache["results"]] == [4, 3, 2]
+        assert "before_number=2" in from_cache["next"]
+        assert from_cache["previous"] is None
+
+    def test_whole_history_in_cache_has_no_next_page(self, client: APIClient, channel: Channel) -> None:
+        list_messages(client, channel)
+        response = list_messages(client, channel, limit=10)
+
+        assert [message["number"] for message in response.data["results"]] == [4, 3, 2, 1, 0]
+        assert response.data["next"] is None
+
+    def test_page_larger_than_cached_falls_back_to_database(
+        self,
+        client: APIClient,
+        channel: Channel,
+        django_assert_num_queries,
+    ) -> None:
+        MessageFactory.create_batch(5, channel=channel)
+        list_messages(client, channel, limit=3)
+
+        with django_assert_num_queries(3):
+            response = list_messages(client, channel, limit=5)
+
+        assert [message["number"] for message in response.data["results"]] == [9, 8, 7, 6, 5]
+
+    def test_created_messages_are_pushed(
+        self,
+        client: APIClient,
+        channel: Channel,
+        django_capture_on_commit_callbacks,
+        django_assert_num_queries,
+    ) -> None:
+        list_messages(client, channel)
+        url = reverse("channel-messages-list", kwargs={"channel_uuid": channel.uuid})
+        batch_url = reverse("channel-messages-batch", kwargs={"channel_uuid": channel.uuid})
+        with django_capture_on_commit_callbacks(execute=True):
+            send(client, "post", url, {"content": "single"})
+            send(client, "post", batch_url, {"messages": [{"content": "first"}, {"content": "second"}]})
+
+        with django_assert_num_queries(2):
+            response = list_messages(client, channel, limit=4)
+
+        assert [message["number"] for message in response.data["results"]] == [7, 6, 5, 4]
+        assert [message["content"] for message in response.data["results"][:3]] == ["second", "first", "single"]
+
+    def test_edit_and_delete_patch_cached_message(
+        self,
+        client: APIClient,
+        channel: Channel,
+        django_capture_on_commit_callbacks,
+    ) -> None:
+        list_messages(client, channel)
+        edited, deleted = Message.objects.filter(channel=channel).order_by('number')[3:5]
+        with django_capture_on_commit_callbacks(execute=True):
+            send(client, "patch", reverse(
+                "channel-messages-detail",
+                kwargs={"channel_uuid": channel.uuid, "message_uuid": edited.uuid},
+            ), {"content": "edited"})
+            send(client, "delete", reverse(
+                "channel-messages-detail",
+                kwargs={"channel_uuid": channel.uuid, "message_uuid": deleted.uuid},
+            ))
+
+        page, _ = get_cached_page(channel, 5)
+        assert page is not None
+        assert page[0]["is_deleted"] is True
+        assert page[0]["version"] == 1
+        assert page[1]["content"] == "edited"
+        assert page[1]["version"] == 1
+        assert list_messages(client, channel).data["results"][:2] == page[:2]
+
+    def test_author_profile_change_drops_cache(
+        self,
+        client: APIClient,
+        channel: Channel,
+        user: UserFactory,
+        django_capture_on_commit_callbacks,
+    ) -> None:
+        list_messages(client, channel)
+        with django_capture_on_commit_callbacks(execute=True):
+            user.username = "renamed"
+            user.save()
+
+        assert get_cached_page(channel, 5)[0] is None
+        assert list_messages(client, channel).data["results"][0]["user"]["username"] == "renamed"
+
+    def test_avatar_url_follows_request_host(
+        self,
+        client: APIClient,
+        channel: Channel,
+        user: UserFactory,
+    ) -> None:
+        user.avatar = "avatars/author.png"
+        user.save(update_fields=["avatar"])
+        list_messages(client, channel)
+        url = reverse("channel-messages-list", kwargs={"channel_uuid": channel.uuid})
+
+        response = cast(Response, client.get(url, HTTP_HOST="chat.example.com"))
+
+        assert get_cached_page(channel, 5)[0][0]["user"]["avatar"] == "/api/media/avatars/author.png"
+        assert response.data["results"][0]["user"]["avatar"] == "http://chat.example.com/api/media/avatars/author.png"
+
+    def test_out_of_order_push_drops_cache(self, channel: Channel) -> None:
+        _, generation = get_cached_page(channel, 5)
+        fill_cache(channel, [message_payload(number) for number in range(4, -1, -1)], generation)
+        assert get_cached_page(channel, 5)[0] is not None
+
+        push_messages(channel, [message_payload(7)])
+
+        assert get_redis().exists(f'message_cache:{channel.uuid}') == 0
+
+    def test_lagging_cache_is_not_served(self, channel: Channel) -> None:
+        _, generation = get_cached_page(channel, 5)
+        fill_cache(channel, [message_payload(number) for number in range(3, -1, -1)], generation)
+
+        assert get_cached_page(channel, 3)[0] is None
+
+    def test_fill_does_not_overwrite_newer_writes(self, channel: Channel) -> None:
+        _, generation = get_cached_page(channel, 5)
+        push_messages(channel, [message_payload(5)])
+
+        fill_cache(channel, [message_payload(number) for number in range(4, -1, -1)], generation)
+
+        assert get_redis().exists(f'message_cache:{channel.uuid}') == 0
+
+    def test_falls_back_to_database_when_redis_is_unavailable(
+        self,
+        client: APIClient,
+        channel: Channel,
+        django_capture_on_commit_callbacks,
+    ) -> None:
+        with patch("text_messages.cache.get_redis") as get_redis_mock:
+            get_redis_mock.return_value.pipeline.side_effect = RedisError
+            get_redis_mock.return_value.eval.side_effect = RedisError
+            response = list_messages(client, channel)
+            url = reverse("channel-messages-list", kwargs={"channel_uuid": channel.uuid})
+            with django_capture_on_commit_callbacks(execute=True):
+                created = send(client, "post", url, {"content": "new"})
+
+        assert response.status_code == 200
+        assert [message["number"] for message in response.data["results"]] == [4, 3, 2, 1, 0]
+        assert created.status_code == 201
+
+    def test_cache_can_be_disabled(self, client: APIClient, channel: Channel, settings) -> None:
+        settings.MESSAGE_CACHE_SIZE = 0
+        list_messages(client, channel)
+
+        assert get_redis().exists(f'message_cache:{channel.uuid}') == 0
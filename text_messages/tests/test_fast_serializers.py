@@ -0,0 +1,117 @@
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from text_channels.models import Channel
+from text_channels.serializers import ChannelSerializer
+from text_channels.tests.factories import ChannelFactory, ChannelMembershipFactory
+from text_messages.models import Message
+from text_messages.serializers import MessageSearchSerializer, MessageSerializer
+from text_messages.tests.factories import MessageFactory
+from users.tests.factories import UserFactory
+
+
+@pytest.fixture(autouse=True)
+def disable_message_cache(settings):
+    settings.MESSAGE_CACHE_SIZE = 0
+
+
+@pytest.fixture
+def user() -> UserFactory:
+    return UserFactory(avatar='avatars/user.png')
+
+
+@pytest.fixture
+def channel(user: UserFactory) -> Channel:
+    channel = ChannelFactory(owner=user)
+    ChannelMembershipFactory(user=user, channel=channel, is_admin=True)
+    ChannelMembershipFactory(channel=channel)
+    MessageFactory(channel=channel, user=user, content='Привет, "мир" \\ <b>')
+    MessageFactory(channel=channel, user=UserFactory())
+    MessageFactory(channel=channel, user=None)
+    deleted = MessageFactory(channel=channel, user=user)
+    deleted.soft_delete()
+    edited = MessageFactory(channel=channel, user=user)
+    edited.edit('Исправлено')
+    channel.refresh_from_db()
+    return channel
+
+
+@pytest.fixture
+def client(user: UserFactory) -> APIClient:
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+def render_both(settings, serialize) -> tuple[bytes, bytes]:
+    """JSON стандартного пути DRF и быстрого пути."""
+    settings.FAST_SERIALIZERS = False
+    standard = JSONRenderer().render(serialize())
+    settings.FAST_SERIALIZERS = True
+    fast = JSONRenderer().render(serialize())
+    return standard, fast
+
+
+def get_both(settings, client: APIClient, url: str) -> tuple[bytes, bytes]:
+    settings.FAST_SERIALIZERS = False
+    standard = client.get(url).content
+    settings.FAST_SERIALIZERS = True
+    fast = client.get(url).content
+    return standard, fast
+
+
+@pytest.mark.django_db
+class TestFastSerializersParity:
+    def test_message_list(self, settings, client: APIClient, channel: Channel) -> None:
+        standard, fast = get_both(
+            settings, client, reverse("channel-messages-list", kwargs={"channel_uuid": channel.uuid}),
+        )
+
+        assert standard == fast
+        assert b'"avatar":"http://testserver/' in fast
+
+    def test_message_retrieve(self, settings, client: APIClient, channel: Channel) -> None:
+        message = Message.objects.filter(channel=channel, is_deleted=True).get()
+        standard, fast = get_both(settings, client, reverse(
+            "channel-messages-detail",
+            kwargs={"channel_uuid": channel.uuid, "message_uuid": message.uuid},
+        ))
+
+        assert standard == fast
+
+    def test_channel_list(self, settings, client: APIClient, user: UserFactory, channel: Channel) -> None:
+        ChannelMembershipFactory(user=user, channel=ChannelFactory())
+        standard, fast = get_both(settings, client, reverse("channels-list"))
+
+        assert standard == fast
+
+    def test_serializers_without_request(self, settings, channel: Channel) -> None:
+        messages = list(Message.objects.filter(channel=channel).select_related('user'))
+
+        for serializer_class in (MessageSerializer, MessageSearchSerializer):
+            standard, fast = render_both(settings, lambda: serializer_class(messages, many=True).data)
+            assert standard == fast
+        standard, fast = render_both(settings, lambda: ChannelSerializer(channel).data)
+        assert standard == fast
+
+    def test_datetimes_in_current_timezone(self, settings, channel: Channel) -> None:
+        messages = list(Message.objects.filter(channel=channel).select_related('user'))
+        request = Request(APIRequestFactory().get('/'))
+
+        with timezone.override('Europe/Moscow'):
+            standard, fast = render_both(
+                settings, lambda: MessageSerializer(messages, many=True, context={'request': request}).data,
+            )
+
+        assert standard == fast
+        assert b'+03:00' in fast
+
+    def test_benchmark_command(self, capsys) -> None:
+        call_command('benchmark_serializers', rows=50, repeat=1)
+
+        assert 'JSON совпадает до байта' in capsys.readouterr().out
@@ -0,0 +1,98 @@
+import pytest
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import override_settings
+
+from text_channels.tests.factories import ChannelFactory
+from text_messages.models import Message
+from text_messages.partitioning import (DEFAULT_PARTITION, create_partitions,
+                                        get_partitions, is_partitioned,
+                                        partition_name)
+from text_messages.tests.factories import MessageFactory
+
+
+def explain(queryset) -> str:
+    with connection.cursor() as cursor:
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute(f'EXPLAIN {sql}', params)
+        return '\n'.join(row[0] for row in cursor.fetchall())
+
+
+def scanned_partitions(plan: str) -> set[str]:
+    return {name for name, _, _ in get_partitions(connection) if f' {name} ' in plan or plan.endswith(f' {name}')}
+
+
+@pytest.mark.django_db
+class TestMessagePartitioning:
+    def test_table_is_partitioned(self) -> None:
+        partitions = get_partitions(connection)
+
+        assert is_partitioned(connection)
+        assert partitions[-1] == (DEFAULT_PARTITION, None, None)
+        assert partitions[0][1] == 0
+
+    def test_history_query_scans_one_partition(self) -> None:
+        channel = ChannelFactory()
+        MessageFactory.create_batch(3, channel=channel)
+
+        plan = explain(Message.objects.filter(channel=channel, number__lt=2).order_by('-number')[:20])
+
+        assert len(scanned_partitions(plan)) == 1
+
+    def test_last_message_query_scans_one_partition(self) -> None:
+        channel = ChannelFactory()
+        MessageFactory(channel=channel)
+
+        plan = explain(Message.objects.filter(channel=channel).order_by('-number')[:1])
+
+        assert len(scanned_partitions(plan)) == 1
+
+    def test_channel_number_is_unique(self) -> None:
+        message = MessageFactory()
+
+        with pytest.raises(IntegrityError):
+            with transaction.atomic():
+                Message.objects.bulk_create([
+                    Message(channel=message.channel, user=message.user, content='test', number=message.number),
+                ])
+
+    def test_create_partitions_moves_rows_from_default(self) -> None:
+        last_end = max(end for _, _, end in get_partitions(connection) if end is not None)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT setval(pg_get_serial_sequence('text_channels_channel', 'id'), %s)",
+                [last_end + 5],
+            )
+        channel = ChannelFactory()
+        message = MessageFactory(channel=channel)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {DEFAULT_PARTITION} WHERE id = %s', [message.pk])
+            assert cursor.fetchone()[0] == 1
+
+        with override_settings(MESSAGE_PARTITION_SIZE=10):
+            created = create_partitions(connection, channel.pk)
+
+        assert created[-1] == partition_name(last_end + 10 * (len(created) - 1))
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {DEFAULT_PARTITION}')
+            assert cursor.fetchone()[0] == 0
+            cursor.execute(f'SELECT COUNT(*) FROM {created[-1]} WHERE id = %s', [message.pk])
+            assert cursor.fetchone()[0] == 1
+        assert Message.objects.get(uuid=message.uuid).number == 0
+
+    def test_command_creates_partitions_ahead(self) -> None:
+        last_end = max(end for _, _, end in get_partitions(connection) if end is not None)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT setval(pg_get_serial_sequence('text_channels_channel', 'id'), %s)",
+                [last_end + 5],
+            )
+        channel = ChannelFactory()
+
+        with override_settings(MESSAGE_PARTITION_SIZE=10):
+            call_command('create_message_partitions', ahead=3)
+            partitions = get_partitions(connection)
+            call_command('create_message_partitions', ahead=3)
+
+        assert get_partitions(connection) == partitions
+        assert max(end for _, _, end in partitions if end is not None) > channel.pk + 3 * 10
@@ -0,0 +1,111 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from text_channels.models import Channel
+from text_channels.serializers import ChannelSerializer
+from text_channels.tests.factories import ChannelFactory, ChannelMembershipFactory
+from text_messages.models import Message
+from text_messages.serializers import MessageSerializer
+from text_messages.snapshots import rebuild_last_messages
+from text_messages.tests.factories import MessageFactory
+from users.tests.factories import UserFactory
+
+
+def expected_last_message(message: Message, max_length: int) -> dict:
+    """Прежний способ: сериализация последнего сообщения и обрезка текста."""
+    data = MessageSerializer(message).data
+    if len(data['content']) > max_length:
+        data['content'] = data['content'][:max_length] + '...'
+    return data
+
+
+def get_last_message(channel: Channel) -> dict | None:
+    channel = Channel.objects.select_related('last_message_author').get(pk=channel.pk)
+    return ChannelSerializer().get_last_message(channel)
+
+
+@pytest.mark.django_db
+class TestLastMessageSnapshot:
+    def test_snapshot_matches_serialized_message(self, settings) -> None:
+        settings.CHANNEL_LAST_MESSAGE_MAX_LENGTH = 10
+        channel = ChannelFactory()
+        MessageFactory(channel=channel)
+        message = MessageFactory(channel=channel, content="Очень длинное сообщение")
+
+        last_message = get_last_message(channel)
+
+        assert last_message == expected_last_message(message, 10)
+        assert list(last_message) == MessageSerializer.Meta.fields
+        assert last_message['content'] == "Очень длин..."
+
+    def test_empty_channel(self) -> None:
+        assert get_last_message(ChannelFactory()) is None
+
+    def test_edit_and_delete_update_snapshot_of_last_message_only(self, settings) -> None:
+        channel = ChannelFactory()
+        first = MessageFactory(channel=channel)
+        last = MessageFactory(channel=channel)
+
+        first.edit("Старое сообщение изменено")
+        assert get_last_message(channel) == expected_last_message(last, settings.CHANNEL_LAST_MESSAGE_MAX_LENGTH)
+
+        last.edit("Изменено")
+        assert get_last_message(channel)['content'] == "Изменено"
+        assert get_last_message(channel)['version'] == 1
+
+        last.soft_delete()
+        assert get_last_message(channel)['content'] == "Сообщение удалено."
+        assert get_last_message(channel)['is_deleted'] is True
+
+    def test_bulk_create_sets_snapshot(self) -> None:
+        channel = ChannelFactory()
+        user = UserFactory()
+        messages = Message.bulk_create_numbered(channel, [Message(user=user, content=str(i)) for i in range(3)])
+
+        assert get_last_message(channel)['uuid'] == str(messages[-1].uuid)
+        assert get_last_message(channel)['user']['id'] == user.pk
+
+    def test_channel_save_keeps_snapshot(self) -> None:
+        channel = ChannelFactory()
+        message = MessageFactory(channel=channel)
+        stale_channel = Channel.objects.get(pk=channel.pk)
+        newer = MessageFactory(channel=channel)
+
+        stale_channel.name = "Новое имя"
+        stale_channel.save()
+
+        channel.refresh_from_db()
+        assert channel.name == "Новое имя"
+        assert channel.last_message_number == 2
+        assert channel.last_message_snapshot['uuid'] == str(newer.uuid) != str(message.uuid)
+
+    def test_rebuild_last_messages(self) -> None:
+        channel = ChannelFactory()
+        message = MessageFactory(channel=channel)
+        empty_channel = ChannelFactory()
+        Channel.objects.filter(pk__in=[channel.pk, empty_channel.pk]).update(
+            last_message_snapshot={'uuid': 'stale'},
+        )
+
+        assert rebuild_last_messages([channel.pk, empty_channel.pk]) == 2
+
+        assert get_last_message(channel)['uuid'] == str(message.uuid)
+        assert get_last_message(empty_channel) is None
+
+    def test_channel_list_does_not_query_messages(self) -> None:
+        user = UserFactory()
+        for _ in range(3):
+            channel = ChannelFactory()
+            ChannelMembershipFactory(user=user, channel=channel)
+            MessageFactory(channel=channel)
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse("channels-list"))
+
+        assert all(item['last_message'] is not None for item in response.data['results'])  # type: ignore
+        assert not any(Message._meta.db_table in query['sql'] for query in queries.captured_queries)
@@ -0,0 +1,34 @@
+import pytest
+
+from text_messages.models import Message
+from text_messages.tasks import compact_deleted_messages
+from text_messages.tests.factories import MessageFactory
+
+
+@pytest.mark.django_db
+class TestCompactDeletedMessages:
+    def test_compacts_only_deleted_messages_in_batches(self, settings) -> None:
+        settings.MESSAGE_COMPACTION_BATCH_SIZE = 2
+        deleted = MessageFactory.create_batch(5)
+        for message in deleted:
+            message.soft_delete()
+        alive = MessageFactory(content="Живое сообщение")
+
+        assert compact_deleted_messages() == 5
+        assert compact_deleted_messages() == 0
+
+        assert set(Message.objects.filter(pk__in=[m.pk for m in deleted]).values_list('content', flat=True)) == {''}
+        assert set(Message.objects.filter(pk__in=[m.pk for m in deleted]).values_list('version', flat=True)) == {1}
+        alive.refresh_from_db()
+        assert alive.content == "Живое сообщение"
+
+    def test_edit_and_soft_delete_bump_version(self) -> None:
+        message = MessageFactory()
+
+        message.edit("Новый текст")
+        message.soft_delete()
+
+        message.refresh_from_db()
+        assert message.content == "Новый текст"
+        assert message.is_deleted
+        assert message.version == 2
@@ -1,13 +1,17 @@
 import logging
 from typing import cast
+from unittest.mock import AsyncMock, patch
 from uuid import UUID
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.test import APIClient
 
+from common.json import loads
 from text_channels.models import Channel, ChannelMembership
 from text_channels.tests.factories import (
     ChannelBanFactory,
@@ -79,13 +83,128 @@ class TestMessageView:
     ) -> None:
         MessageFactory.create_batch(25, channel=channel, user=user)
         url = reverse("channel-messages-list", kwargs={"channel_uuid": channel.uuid})
-        response = cast(Response, authenticated_client.get(url, {"page": 2}))
+        response = cast(Response, authenticated_client.get(url, {"before_number": 5}))
 
         assert response.status_code == status.HTTP_200_OK
         assert response.data["count"] == 25  # type: ignore
         assert len(response.data["results"]) == 5  # type: ignore
+        assert [message["number"] for message in response.data["results"]] == [4, 3, 2, 1, 0]  # type: ignore
         assert response.data["next"] is None  # type: ignore
-        assert response.data["previous"] is not None  # type: ignore
+        assert "after_number=4" in response.data["previous"]  # type: ignore
+
+    def test_list_messages_pagination_follow_next_link(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+    ) -> None:
+        MessageFactory.create_batch(25, channel=channel, user=user)
+        url = reverse("channel-messages-list", kwargs={"channel_uuid": channel.uuid})
+        first_page = cast(Response, authenticated_client.get(url)).data
+        second_page = cast(Response, authenticated_client.get(first_page["next"])).data  # type: ignore
+
+        assert first_page["results"][-1]["number"] == 5  # type: ignore
+        assert [message["number"] for message in second_page["results"]] == [4, 3, 2, 1, 0]  # type: ignore
+        assert second_page["next"] is None  # type: ignore
+
+    def test_list_messages_pagination_after_number(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+    ) -> None:
+        MessageFactory.create_batch(25, channel=channel, user=user)
+        url = reverse("channel-messages-list", kwargs={"channel_uuid": channel.uuid})
+        response = cast(Response, authenticated_client.get(url, {"after_number": 2, "limit": 5}))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [message["number"] for message in response.data["results"]] == [7, 6, 5, 4, 3]  # type: ignore
+        assert "before_number=3" in response.data["next"]  # type: ignore
+        assert "after_number=7" in response.data["previous"]  # type: ignore
+
+    def test_list_messages_pagination_without_count_query(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+    ) -> None:
+        MessageFactory.create_batch(5, channel=channel, user=user)
+        url = reverse("channel-messages-list", kwargs={"channel_uuid": channel.uuid})
+        with CaptureQueriesContext(connection) as queries:
+            response = cast(Response, authenticated_client.get(url, {"before_number": 3}))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert not any("COUNT(" in query["sql"].upper() for query in queries.captured_queries)
+        assert not any("OFFSET" in query["sql"].upper() for query in queries.captured_queries)
+
+    def test_list_messages_invalid_cursor(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+    ) -> None:
+        url = reverse("channel-messages-list", kwargs={"channel_uuid": channel.uuid})
+        response = cast(Response, authenticated_client.get(url, {"before_number": "abc"}))
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.parametrize("page_size", [5, 50])
+    def test_list_messages_query_count_does_not_depend_on_page_size(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+        django_assert_num_queries,
+        page_size: int,
+    ) -> None:
+        for _ in range(page_size):
+            MessageFactory(channel=channel, user=UserFactory())
+        url = reverse("channel-messages-list", kwargs={"channel_uuid": channel.uuid})
+        # канал, членство, страница сообщений с авторами
+        with django_assert_num_queries(3):
+            response = cast(Response, authenticated_client.get(url, {"limit": page_size}))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data["results"]) == page_size  # type: ignore
+
+    def test_list_messages_does_not_load_password(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+    ) -> None:
+        MessageFactory.create_batch(3, channel=channel, user=user)
+        url = reverse("channel-messages-list", kwargs={"channel_uuid": channel.uuid})
+        with CaptureQueriesContext(connection) as queries:
+            response = cast(Response, authenticated_client.get(url))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert not any('"password"' in query["sql"] for query in queries.captured_queries)
+        assert response.data["results"][0] == MessageSerializer(Message.objects.get(number=2)).data  # type: ignore
+
+    def test_retrieve_message_query_count(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+        django_assert_num_queries,
+    ) -> None:
+        message = MessageFactory(channel=channel, user=user)
+        url = reverse(
+            "channel-messages-detail",
+            kwargs={"channel_uuid": channel.uuid, "message_uuid": message.uuid},
+        )
+        with django_assert_num_queries(3):
+            response = cast(Response, authenticated_client.get(url))
+
+        assert response.status_code == status.HTTP_200_OK
 
     def test_create_message_authenticated(
         self,
@@ -104,6 +223,76 @@ class TestMessageView:
         assert message.user == user
         assert message.channel == channel
 
+    def test_batch_create_messages(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+    ) -> None:
+        MessageFactory(channel=channel, user=user)
+        url = reverse("channel-messages-batch", kwargs={"channel_uuid": channel.uuid})
+        data = {"messages": [{"content": f"Message {i}"} for i in range(3)]}
+        with patch("text_messages.views.get_channel_layer") as get_channel_layer:
+            get_channel_layer.return_value.group_send = AsyncMock()
+            response = cast(Response, authenticated_client.post(url, data, format="json"))
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert [message["number"] for message in response.data] == [1, 2, 3]  # type: ignore
+        assert [message["content"] for message in response.data] == ["Message 0", "Message 1", "Message 2"]  # type: ignore
+        assert Message.objects.filter(channel=channel, user=user).count() == 4
+        channel.refresh_from_db()
+        assert channel.last_message_number == 4
+
+        get_channel_layer.return_value.group_send.assert_awaited_once()
+        group_name, event = get_channel_layer.return_value.group_send.await_args.args
+        assert group_name == f"websocket_channel_{channel.pk}"
+        assert event["type"] == "chat_message"
+        data = loads(event["text"])["data"]
+        assert [message["number"] for message in data["messages"]] == [1, 2, 3]
+        assert data["channel"]["last_message_number"] == 4
+
+    def test_batch_create_messages_validates_each_message(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+    ) -> None:
+        url = reverse("channel-messages-batch", kwargs={"channel_uuid": channel.uuid})
+        data = {"messages": [{"content": "Message"}, {"content": ""}]}
+        response = cast(Response, authenticated_client.post(url, data, format="json"))
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not Message.objects.filter(channel=channel).exists()
+
+    def test_batch_create_messages_too_many(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+        settings,
+    ) -> None:
+        url = reverse("channel-messages-batch", kwargs={"channel_uuid": channel.uuid})
+        data = {"messages": [{"content": "Message"}] * (settings.MESSAGE_BATCH_MAX_SIZE + 1)}
+        response = cast(Response, authenticated_client.post(url, data, format="json"))
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not Message.objects.filter(channel=channel).exists()
+
+    def test_batch_create_messages_by_non_member(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+    ) -> None:
+        url = reverse("channel-messages-batch", kwargs={"channel_uuid": channel.uuid})
+        data = {"messages": [{"content": "Message"}]}
+        response = cast(Response, authenticated_client.post(url, data, format="json"))
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
     def test_retrieve_message_authenticated(
         self,
         authenticated_client: APIClient,
@@ -141,6 +330,61 @@ class TestMessageView:
         message.refresh_from_db()
         assert message.content == "Updated message"
 
+    def test_update_message_sends_event(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+    ) -> None:
+        message = MessageFactory(channel=channel, user=user)
+        url = reverse(
+            "channel-messages-detail",
+            kwargs={"channel_uuid": channel.uuid, "message_uuid": message.uuid},
+        )
+        with patch("text_messages.views.get_channel_layer") as get_channel_layer:
+            get_channel_layer.return_value.group_send = AsyncMock()
+            response = cast(Response, authenticated_client.patch(url, {"content": "Updated"}, format="json"))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["version"] == 1  # type: ignore
+        group_name, event = get_channel_layer.return_value.group_send.await_args.args
+        assert group_name == f"websocket_channel_{channel.pk}"
+        assert event["type"] == "message_updated"
+        data = loads(event["text"])["data"]
+        assert data["channel"] == str(channel.uuid)
+        assert data["message"]["number"] == message.number
+        assert data["message"]["version"] == 1
+        assert data["message"]["content"] == "Updated"
+        assert set(data["message"]) == {"number", "version", "content", "updated_at"}
+
+    def test_delete_message_sends_tombstone_event(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+    ) -> None:
+        message = MessageFactory(channel=channel, user=user)
+        url = reverse(
+            "channel-messages-detail",
+            kwargs={"channel_uuid": channel.uuid, "message_uuid": message.uuid},
+        )
+        with patch("text_messages.views.get_channel_layer") as get_channel_layer:
+            get_channel_layer.return_value.group_send = AsyncMock()
+            authenticated_client.delete(url)
+            response = cast(Response, authenticated_client.delete(url))
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        get_channel_layer.return_value.group_send.assert_awaited_once()
+        group_name, event = get_channel_layer.return_value.group_send.await_args.args
+        assert event["type"] == "message_deleted"
+        assert loads(event["text"])["data"]["message"] == {"number": message.number, "version": 1}
+
+        response = cast(Response, authenticated_client.get(url))
+        assert response.data["is_deleted"] is True  # type: ignore
+        assert response.data["content"] == "Сообщение удалено."  # type: ignore
+
     def test_update_message_by_non_author(
         self,
         authenticated_client: APIClient,
@@ -175,7 +419,9 @@ class TestMessageView:
         response = cast(Response, authenticated_client.delete(url))
 
         assert response.status_code == status.HTTP_204_NO_CONTENT
-        assert not Message.objects.filter(uuid=message.uuid).exists()
+        message.refresh_from_db()
+        assert message.is_deleted
+        assert message.version == 1
 
     def test_delete_message_by_admin(
         self,
@@ -193,7 +439,9 @@ class TestMessageView:
         response = cast(Response, authenticated_client.delete(url))
 
         assert response.status_code == status.HTTP_204_NO_CONTENT
-        assert not Message.objects.filter(uuid=message.uuid).exists()
+        message.refresh_from_db()
+        assert message.is_deleted
+        assert message.version == 1
 
     def test_delete_message_by_non_author_non_admin(
         self,
@@ -254,3 +502,199 @@ class TestMessageView:
         response = cast(Response, api_client.get(url))
 
         assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+class TestMessageSearchView:
+    def test_search_in_channel(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+    ) -> None:
+        best = MessageFactory(channel=channel, user=user, content="Кошка, кошка и ещё раз кошка")
+        other = MessageFactory(channel=channel, user=user, content="Кошка спит")
+        MessageFactory(channel=channel, user=user, content="Собака лает")
+        MessageFactory(channel=ChannelFactory(), user=user, content="Кошка в другом канале")
+        url = reverse("channel-messages-search", kwargs={"channel_uuid": channel.uuid})
+        response = cast(Response, authenticated_client.get(url, {"q": "кошка"}))
+
+        assert response.status_code == status.HTTP_200_OK
+        results = response.data["results"]  # type: ignore
+        assert [result["uuid"] for result in results] == [str(best.uuid), str(other.uuid)]
+        assert results[0]["rank"] >= results[1]["rank"]
+        assert results[0]["channel"] == str(channel.uuid)
+        assert response.data["next"] is None  # type: ignore
+
+    def test_search_skips_deleted_messages(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+    ) -> None:
+        MessageFactory(channel=channel, user=user, content="Секретный план", is_deleted=True)
+        url = reverse("channel-messages-search", kwargs={"channel_uuid": channel.uuid})
+        response = cast(Response, authenticated_client.get(url, {"q": "план"}))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["results"] == []  # type: ignore
+
+    def test_search_sees_edited_content(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+    ) -> None:
+        message = MessageFactory(channel=channel, user=user, content="Старый текст")
+        message.content = "Новый заголовок"
+        message.save()
+        url = reverse("channel-messages-search", kwargs={"channel_uuid": channel.uuid})
+        response = cast(Response, authenticated_client.get(url, {"q": "заголовок"}))
+
+        assert [result["uuid"] for result in response.data["results"]] == [str(message.uuid)]  # type: ignore
+
+    def test_search_pagination(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+    ) -> None:
+        messages = [MessageFactory(channel=channel, user=user, content="Погода хорошая") for _ in range(5)]
+        url = reverse("channel-messages-search", kwargs={"channel_uuid": channel.uuid})
+        first_page = cast(Response, authenticated_client.get(url, {"q": "погода", "limit": 3})).data
+        second_page = cast(Response, authenticated_client.get(first_page["next"])).data  # type: ignore
+
+        uuids = [result["uuid"] for result in first_page["results"] + second_page["results"]]  # type: ignore
+        assert uuids == [str(message.uuid) for message in reversed(messages)]
+        assert second_page["next"] is None  # type: ignore
+
+    def test_search_requires_query(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+    ) -> None:
+        url = reverse("channel-messages-search", kwargs={"channel_uuid": channel.uuid})
+        response = cast(Response, authenticated_client.get(url))
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_search_by_non_member(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+    ) -> None:
+        url = reverse("channel-messages-search", kwargs={"channel_uuid": channel.uuid})
+        response = cast(Response, authenticated_client.get(url, {"q": "кошка"}))
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_global_search_respects_membership_and_bans(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+    ) -> None:
+        visible = MessageFactory(channel=channel, content="Встреча завтра")
+        MessageFactory(channel=ChannelFactory(), content="Встреча в чужом канале")
+        banned_channel = ChannelFactory()
+        ChannelMembershipFactory(user=user, channel=banned_channel)
+        ChannelBanFactory(user=user, channel=banned_channel, reason="")
+        MessageFactory(channel=banned_channel, content="Встреча в канале с баном")
+        url = reverse("messages-search")
+        response = cast(Response, authenticated_client.get(url, {"q": "встреча"}))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [result["uuid"] for result in response.data["results"]] == [str(visible.uuid)]  # type: ignore
+
+
+@pytest.mark.django_db
+class TestMessageCatchUpView:
+    def test_catch_up(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        channel: Channel,
+        channel_membership: ChannelMembership,
+        settings,
+    ) -> None:
+        settings.MESSAGE_CATCH_UP_LIMIT = 5
+        messages = MessageFactory.create_batch(4, channel=channel)
+        behind_channel = ChannelFactory()
+        ChannelMembershipFactory(user=user, channel=behind_channel)
+        MessageFactory.create_batch(10, channel=behind_channel)
+        up_to_date_channel = ChannelFactory()
+        ChannelMembershipFactory(user=user, channel=up_to_date_channel)
+        MessageFactory(channel=up_to_date_channel)
+        url = reverse("messages-catch-up")
+        response = cast(Response, authenticated_client.post(url, {"channels": {
+            str(channel.uuid): 1,
+            str(behind_channel.uuid): 2,
+            str(up_to_date_channel.uuid): 0,
+        }}, format="json"))
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.data["channels"]  # type: ignore
+        assert data[str(channel.uuid)]["last_message_number"] == 4
+        assert data[str(channel.uuid)]["too_far_behind"] is False
+        assert [message["uuid"] for message in data[str(channel.uuid)]["messages"]] == [
+            str(message.uuid) for message in messages[2:]
+        ]
+        assert data[str(behind_channel.uuid)]["too_far_behind"] is True
+        assert data[str(behind_channel.uuid)]["messages"] == []
+        assert data[str(up_to_date_channel.uuid)]["messages"] == []
+
+    def test_catch_up_skips_foreign_and_banned_channels(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+    ) -> None:
+        foreign_channel = ChannelFactory()
+        MessageFactory(channel=foreign_channel)
+        banned_channel = ChannelFactory()
+        ChannelMembershipFactory(user=user, channel=banned_channel)
+        ChannelBanFactory(user=user, channel=banned_channel, reason="")
+        MessageFactory(channel=banned_channel)
+        url = reverse("messages-catch-up")
+        response = cast(Response, authenticated_client.post(url, {"channels": {
+            str(foreign_channel.uuid): -1,
+            str(banned_channel.uuid): -1,
+        }}, format="json"))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["channels"] == {}  # type: ignore
+
+    def test_catch_up_query_count(
+        self,
+        authenticated_client: APIClient,
+        user: UserFactory,
+        django_assert_num_queries,
+    ) -> None:
+        last_seen = {}
+        for _ in range(5):
+            channel = ChannelFactory()
+            ChannelMembershipFactory(user=user, channel=channel)
+            MessageFactory.create_batch(3, channel=channel)
+            last_seen[str(channel.uuid)] = 0
+        url = reverse("messages-catch-up")
+
+        with django_assert_num_queries(2):
+            response = cast(Response, authenticated_client.post(url, {"channels": last_seen}, format="json"))
+
+        assert all(len(item["messages"]) == 2 for item in response.data["channels"].values())  # type: ignore
+
+    def test_catch_up_validation(self, authenticated_client: APIClient) -> None:
+        url = reverse("messages-catch-up")
+
+        response = cast(Response, authenticated_client.post(url, {"channels": {"not-uuid": 1}}, format="json"))
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = cast(Response, authenticated_client.post(url, {"channels": {}}, format="json"))
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
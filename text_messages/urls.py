@@ -1,7 +1,7 @@
 from django.urls import path, re_path
 from rest_framework.routers import DefaultRouter
 
-from .views import MessageView
+from .views import GlobalMessageSearchView, MessageCatchUpView, MessageView
 
 urlpatterns = [
     path(
@@ -9,9 +9,29 @@ urlpatterns = [
         MessageView.as_view({'get': 'list', 'post': 'create'}),
         name='channel-messages-list'
     ),
+    path(
+        'api/channels/<uuid:channel_uuid>/messages/batch/',
+        MessageView.as_view({'post': 'batch_create'}),
+        name='channel-messages-batch'
+    ),
+    path(
+        'api/channels/<uuid:channel_uuid>/messages/search/',
+        MessageView.as_view({'get': 'search'}),
+        name='channel-messages-search'
+    ),
     path(
         'api/channels/<uuid:channel_uuid>/messages/<uuid:message_uuid>/',
         MessageView.as_view({'get': 'retrieve', 'patch': 'update', 'delete': 'destroy'}),
         name='channel-messages-detail'
     ),
+    path(
+        'api/messages/search/',
+        GlobalMessageSearchView.as_view(),
+        name='messages-search'
+    ),
+    path(
+        'api/messages/catch-up/',
+        MessageCatchUpView.as_view(),
+        name='messages-catch-up'
+    ),
 ]
@@ -4,21 +4,103 @@ from typing import cast
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from channels_redis.core import RedisChannelLayer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
-from rest_framework.permissions import IsAuthenticated
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
+from rest_framework import status
+from rest_framework.generics import GenericAPIView
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
-from text_channels.models import Channel
+from common.conditional import ConditionalListMixin
+from common.events import encode_event
+from text_channels.models import Channel, ChannelBan, ChannelMembership
+from text_channels.read_state import get_channel_read_state
 from text_channels.serializers import WebsocketChannelSerializer
+from users.serializers import avatar_path, avatar_url
 
+from . import cache
 from .models import Message
+from .pagination import MessageCursorPagination, MessageSearchPagination
 from .permissions import MessagePermissions
-from .serializers import MessageCreateSerializer, MessageSerializer
+from .search import SEARCH_QUERY_PARAM, get_search_text, search_messages
+from .serializers import (MessageBatchCreateSerializer,
+                          MessageCatchUpResponseSerializer,
+                          MessageCatchUpSerializer, MessageCreateSerializer,
+                          MessageDeletedEventSerializer,
+                          MessageSearchSerializer, MessageSerializer,
+                          MessageUpdatedEventSerializer)
 
 logger = logging.getLogger(__name__)
 
+READ_STATE_QUERY_PARAM = 'read_state'
 
+
+def paginated_search_response(view: GenericAPIView, queryset) -> Response:
+    """Страница результатов поиска: только колонки, нужные MessageSearchSerializer."""
+    queryset = queryset.select_related('user', 'channel').only(
+        *MessageSerializer.get_read_only_columns(), 'channel', 'channel__uuid',
+    )
+    paginator = MessageSearchPagination()
+    page = paginator.paginate_queryset(queryset, view.request, view=view)
+    serializer = MessageSearchSerializer(page, many=True, context=view.get_serializer_context())
+    return paginator.get_paginated_response(serializer.data)
+
+
+class NewestPageCacheMixin:
+    """
+    Первая страница истории из кэша text_messages.cache, без запросов к сообщениям.
+    При промахе страница читается из базы и ею же прогревается кэш.
+    Аватары авторов лежат в кэше без хоста (avatar_path), абсолютными они становятся для каждого запроса.
+    """
+
+    def to_cached(self, payload: dict) -> dict:
+        return {**payload, 'user': avatar_path(payload['user'], self.request)}
+
+    def from_cached(self, payload: dict) -> dict:
+        return {**payload, 'user': avatar_url(payload['user'], self.request)}
+
+    def cache_messages(self, messages: list[Message]) -> None:
+        """Кладёт новые сообщения в кэш после коммита."""
+        payloads = MessageSerializer(messages, many=True, context=self.get_serializer_context()).data
+        payloads = [self.to_cached(payload) for payload in payloads]
+        transaction.on_commit(lambda: cache.push_messages(self.get_channel(), payloads))
+
+    def cache_message_changed(self, message: Message) -> None:
+        """Обновляет закэшированное сообщение после коммита правки или удаления."""
+        payload = self.to_cached(MessageSerializer(message, context=self.get_serializer_context()).data)
+        transaction.on_commit(lambda: cache.patch_message(self.get_channel(), payload))
+
+    def list(self, request: Request, *args, **kwargs):
+        page = self.paginator.paginate_cached(request, self)
+        if page is not None:
+            return self.get_paginated_response([self.from_cached(payload) for payload in page])
+
+        response = super().list(request, *args, **kwargs)
+        if self.paginator.cache_generation is not None:
+            page = [self.to_cached(payload) for payload in response.data['results']]
+            cache.fill_cache(self.get_channel(), page, self.paginator.cache_generation)
+        return response
+
+
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                READ_STATE_QUERY_PARAM,
+                bool,
+                description='Добавить в ответ позиции прочтения участников канала (ключ read_state)',
+            ),
+        ],
+    ),
+)
 class MessageView(
+    ConditionalListMixin,
+    NewestPageCacheMixin,
     ModelViewSet,
 ):
     """
@@ -26,6 +108,7 @@ class MessageView(
     """
     permission_classes = (IsAuthenticated, MessagePermissions)
     serializer_class = MessageSerializer
+    pagination_class = MessageCursorPagination
     http_method_names = ['get', 'post', 'patch', 'delete']
     lookup_field = 'uuid'
     lookup_url_kwarg = 'message_uuid'
@@ -35,17 +118,108 @@ class MessageView(
             return MessageCreateSerializer
         return MessageSerializer
 
+    def get_channel(self) -> Channel:
+        """Канал из URL, запрашивается один раз за запрос."""
+        if not hasattr(self, '_channel'):
+            self._channel = get_object_or_404(Channel, uuid=self.kwargs['channel_uuid'])
+        return self._channel
+
     def get_queryset(self):
-        channel_uuid = self.kwargs['channel_uuid']
-        return Message.objects.filter(channel__uuid=channel_uuid)
+        queryset = Message.objects.filter(channel=self.get_channel())
+        if self.request.method in SAFE_METHODS:
+            # Только колонки, которые отдают MessageSerializer/UserSerializer
+            queryset = queryset.select_related('user').only(*MessageSerializer.get_read_only_columns())
+        return queryset
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.request.query_params.get(READ_STATE_QUERY_PARAM) in ('1', 'true'):
+            response.data['read_state'] = get_channel_read_state(self.get_channel())
+        return response
+
+    def get_list_validators(self, request: Request):
+        """
+        Только для первой страницы без read_state: она меняется вместе с last_message_number
+        (новые сообщения) и updated_at канала (правки и удаления, см. Message._update_versioned,
+        изменения профилей участников, см. touch_user_channels). Профиль автора, уже вышедшего из канала,
+        в ETag не входит и обновится у клиента со следующим изменением канала.
+        Все значения уже есть в строке канала, лишних запросов нет.
+        """
+        params = request.query_params
+        if any(params.get(param) for param in (
+            self.paginator.before_query_param, self.paginator.after_query_param, READ_STATE_QUERY_PARAM,
+        )):
+            return None
+
+        channel = self.get_channel()
+        return (
+            channel.pk,
+            channel.last_message_number,
+            channel.updated_at,
+            self.paginator.get_page_size(request),
+        )
+
+    @extend_schema(
+        parameters=[OpenApiParameter(SEARCH_QUERY_PARAM, str, required=True, description='Поисковый запрос')],
+        responses=MessageSearchSerializer(many=True),
+    )
+    def search(self, request: Request, *args, **kwargs):
+        """Полнотекстовый поиск по сообщениям канала."""
+        queryset = search_messages(
+            Message.objects.filter(channel=self.get_channel()),
+            get_search_text(request),
+        )
+        return paginated_search_response(self, queryset)
 
     def perform_create(self, serializer: MessageCreateSerializer):
-        channel_uuid = self.kwargs['channel_uuid']
-        channel = get_object_or_404(Channel, uuid=channel_uuid)
+        channel = self.get_channel()
         user = self.request.user
         message = serializer.save(channel=channel, user=user)
+        self.cache_messages([message])
         self._send_ws_message(message)
 
+    def perform_update(self, serializer: MessageCreateSerializer):
+        message: Message = serializer.instance
+        content = serializer.validated_data.get('content')
+        if content is None or content == message.content:
+            return
+        message.edit(content)
+        self.cache_message_changed(message)
+        self._send_ws_event(message, "message_updated", MessageUpdatedEventSerializer(message).data)
+
+    def perform_destroy(self, instance: Message):
+        if instance.is_deleted:
+            return
+        instance.soft_delete()
+        self.cache_message_changed(instance)
+        self._send_ws_event(instance, "message_deleted", MessageDeletedEventSerializer(instance).data)
+
+    @extend_schema(
+        request=MessageBatchCreateSerializer,
+        responses={201: MessageSerializer(many=True)},
+    )
+    def batch_create(self, request: Request, *args, **kwargs):
+        """
+        Создание пачки сообщений одним запросом.
+        Номера резервируются одним диапазоном, рассылка по вебсокету - одним событием.
+        """
+        serializer = MessageBatchCreateSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        messages = self.perform_batch_create(serializer)
+        data = MessageSerializer(messages, many=True, context=self.get_serializer_context()).data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    def perform_batch_create(self, serializer: MessageBatchCreateSerializer) -> list[Message]:
+        channel = self.get_channel()
+        user = self.request.user
+        messages = Message.bulk_create_numbered(
+            channel,
+            [Message(user=user, **item) for item in serializer.validated_data['messages']],
+        )
+        self.cache_messages(messages)
+        self._send_ws_messages(messages)
+        return messages
+
     def _send_ws_message(self, message: Message) -> None:
         channel_layer = cast(RedisChannelLayer, get_channel_layer())
         if not channel_layer:
@@ -58,9 +232,133 @@ class MessageView(
 
         async_to_sync(channel_layer.group_send)(
             group_name,
-            {
-                "type": "chat_message",
+            encode_event("chat_message", {
                 "message": serialized_message,
                 "channel": serialized_channel,
-            }
+            }),
+        )
+
+    def _send_ws_messages(self, messages: list[Message]) -> None:
+        """Одно событие chat_message на всю пачку сообщений одного канала."""
+        channel_layer = cast(RedisChannelLayer, get_channel_layer())
+        if not channel_layer:
+            logger.error("Channel layer is not configured")
+            return
+
+        channel = messages[0].channel
+        serialized_messages = MessageSerializer(messages, many=True).data
+        serialized_channel = WebsocketChannelSerializer(channel).data
+        group_name = f"websocket_channel_{channel.pk}"
+
+        async_to_sync(channel_layer.group_send)(
+            group_name,
+            encode_event("chat_message", {
+                "messages": serialized_messages,
+                "channel": serialized_channel,
+            }),
+        )
+
+    def _send_ws_event(self, message: Message, event_type: str, data: dict) -> None:
+        """Компактное событие об изменении сообщения: только uuid канала, номер, версия и изменённые поля."""
+        channel_layer = cast(RedisChannelLayer, get_channel_layer())
+        if not channel_layer:
+            logger.error("Channel layer is not configured")
+            return
+
+        async_to_sync(channel_layer.group_send)(
+            f"websocket_channel_{message.channel_id}",
+            encode_event(event_type, {
+                "channel": str(self.get_channel().uuid),
+                "message": data,
+            }),
+        )
+
+
+class GlobalMessageSearchView(GenericAPIView):
+    """
+    Полнотекстовый поиск по сообщениям всех каналов пользователя
+    """
+    permission_classes = (IsAuthenticated, )
+    serializer_class = MessageSearchSerializer
+    pagination_class = MessageSearchPagination
+
+    def get_queryset(self):
+        user = self.request.user
+        return Message.objects.filter(
+            channel_id__in=ChannelMembership.objects.filter(user=user).values('channel_id'),
+        ).exclude(
+            channel_id__in=ChannelBan.objects.filter(user=user).values('channel_id'),
         )
+
+    @extend_schema(
+        parameters=[OpenApiParameter(SEARCH_QUERY_PARAM, str, required=True, description='Поисковый запрос')],
+        responses=MessageSearchSerializer(many=True),
+    )
+    def get(self, request: Request, *args, **kwargs):
+        queryset = search_messages(self.get_queryset(), get_search_text(request))
+        return paginated_search_response(self, queryset)
+
+
+class MessageCatchUpView(GenericAPIView):
+    """
+    Догрузка пропущенных сообщений после переподключения к вебсокету.
+
+    Клиент передаёт `channel_uuid -> last_seen_number`, в ответ по каждому доступному каналу
+    приходят сообщения с номерами больше last_seen_number (по возрастанию номера) или признак
+    `too_far_behind`, если пропущено больше MESSAGE_CATCH_UP_LIMIT сообщений - тогда канал
+    нужно перезагрузить постранично. Недоступные каналы в ответ не попадают.
+    Всегда два запроса: каналы и одна выборка сообщений по индексу (channel, number).
+    """
+    permission_classes = (IsAuthenticated, )
+    serializer_class = MessageCatchUpSerializer
+
+    @extend_schema(
+        request=MessageCatchUpSerializer,
+        responses=MessageCatchUpResponseSerializer,
+    )
+    def post(self, request: Request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        last_seen = serializer.validated_data['channels']
+        limit = settings.MESSAGE_CATCH_UP_LIMIT
+
+        user = request.user
+        channels = Channel.objects.filter(
+            uuid__in=last_seen.keys(),
+            memberships__user=user,
+        ).exclude(
+            pk__in=ChannelBan.objects.filter(user=user).values('channel_id'),
+        ).only('uuid', 'last_message_number')
+
+        result = {}
+        ranges = Q()
+        channels_by_id = {}
+        for channel in channels:
+            last_seen_number = last_seen[channel.uuid]
+            missing = channel.last_message_number - 1 - last_seen_number
+            result[channel.uuid] = {
+                'last_message_number': channel.last_message_number,
+                'too_far_behind': missing > limit,
+                'messages': [],
+            }
+            if 0 < missing <= limit:
+                ranges |= Q(
+                    channel_id=channel.pk,
+                    number__gt=last_seen_number,
+                    number__lt=channel.last_message_number,
+                )
+                channels_by_id[channel.pk] = channel
+
+        if channels_by_id:
+            messages = (
+                Message.objects
+                .filter(ranges)
+                .select_related('user')
+                .only(*MessageSerializer.get_read_only_columns(), 'channel')
+                .order_by('channel_id', 'number')
+            )
+            for message in messages:
+                result[channels_by_id[message.channel_id].uuid]['messages'].append(message)
+
+        data = MessageCatchUpResponseSerializer({'channels': result}, context=self.get_serializer_context()).data
+        return Response(data)
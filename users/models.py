@@ -11,6 +11,9 @@ from .managers import CustomUserManager
 class User(AbstractBaseUser, Timestamped, PermissionsMixin):
     """Основная модель пользователя"""
 
+    # Поля UserSerializer: встроены в сообщения и каналы, их изменение сбрасывает кэши и ETag каналов
+    PROFILE_FIELDS = ('username', 'is_staff', 'avatar')
+
     email = models.EmailField(unique=True)
     username = models.CharField(max_length=100, unique=True)
     is_active = models.BooleanField(default=True)
@@ -39,3 +42,39 @@ class User(AbstractBaseUser, Timestamped, PermissionsMixin):
 
     def __str__(self):
         return f'<User {self.username}>'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_profile = instance._get_profile()
+        return instance
+
+    def _get_profile(self) -> dict[str, str]:
+        """Загруженные поля PROFILE_FIELDS в виде строк (у аватара - имя файла)."""
+        deferred = self.get_deferred_fields()
+        return {
+            name: self._meta.get_field(name).value_to_string(self)
+            for name in self.PROFILE_FIELDS if name not in deferred
+        }
+
+    def _is_profile_changed(self, update_fields) -> bool:
+        """Сохраняемые поля профиля отличаются от базы. Не загруженные из базы значения дочитываются одним запросом."""
+        names = [name for name in self.PROFILE_FIELDS if update_fields is None or name in update_fields]
+        if not names:
+            return False
+        loaded = getattr(self, '_loaded_profile', {})
+        missing = [name for name in names if name not in loaded]
+        if missing:
+            stored = User.objects.filter(pk=self.pk).only(*missing).first()
+            loaded = {**loaded, **(stored._loaded_profile if stored else {})}
+        current = self._get_profile()
+        return any(name in current and current[name] != loaded.get(name) for name in names)
+
+    def save(self, *args, **kwargs):
+        from text_channels.models import touch_user_channels
+
+        profile_changed = not self._state.adding and self._is_profile_changed(kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
+        self._loaded_profile = self._get_profile()
+        if profile_changed:
+            touch_user_channels(self.pk)
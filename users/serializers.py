@@ -1,10 +1,32 @@
-from rest_framework import serializers
+from rest_framework.request import Request
+
+from common.serializers import FastModelSerializer
 
 from .models import User
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(FastModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'is_staff', 'avatar']
         read_only_fields = fields
+
+
+def avatar_path(user: dict | None, request: Request) -> dict | None:
+    """
+    Представление UserSerializer для общих кэшей: URL аватара без схемы и хоста запроса, которым его отрендерили,
+    иначе из кэша он достанется другим хостам. Обратно - `avatar_url`.
+    """
+    if not user or not user.get('avatar'):
+        return user
+    root = request.build_absolute_uri('/')
+    if not user['avatar'].startswith(root):
+        return user
+    return {**user, 'avatar': '/' + user['avatar'][len(root):]}
+
+
+def avatar_url(user: dict | None, request: Request) -> dict | None:
+    """Аватар из `avatar_path` - абсолютный URL текущего запроса, как у UserSerializer с request в контексте."""
+    if not user or not user.get('avatar'):
+        return user
+    return {**user, 'avatar': request.build_absolute_uri(user['avatar'])}